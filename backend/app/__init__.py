@@ -4,6 +4,10 @@ from flask_migrate import Migrate
 from flask_cors import CORS
 from flask_jwt_extended import JWTManager # Import JWTManager
 import os # Import os module
+from .compression import init_compression
+from .instrumentation import init_instrumentation
+from .query_detector import init_query_detector
+from .passwords import PasswordHasherBusy
 
 # Initialize extensions
 db = SQLAlchemy()
@@ -46,6 +50,50 @@ def create_app(test_config=None):
     elif not app.config['AIRTABLE_API_KEY'] and flask_env != 'production':
         app.logger.warning("Airtable API Key is not set. Airtable integration will not work.")
 
+    # Response compression (gzip, or brotli when the brotli package is installed)
+    app.config['COMPRESSION_ENABLED'] = os.environ.get('COMPRESSION_ENABLED', 'true').lower() == 'true'
+    app.config['COMPRESSION_MIN_SIZE'] = int(os.environ.get('COMPRESSION_MIN_SIZE', 1024)) # Bytes
+    app.config['COMPRESSION_LEVEL'] = int(os.environ.get('COMPRESSION_LEVEL', 6)) # gzip 1-9
+    app.config['COMPRESSION_BROTLI_QUALITY'] = int(os.environ.get('COMPRESSION_BROTLI_QUALITY', 4)) # brotli 0-11
+
+    # Request timing: Server-Timing header and Prometheus metrics on /metrics (off by default)
+    app.config['METRICS_ENABLED'] = os.environ.get('METRICS_ENABLED', 'false').lower() == 'true'
+    app.config['METRICS_SERVER_TIMING'] = os.environ.get('METRICS_SERVER_TIMING', 'true').lower() == 'true'
+
+    # Live user status for the permission decorators (see user_status.py)
+    app.config['USER_STATUS_CHECK'] = os.environ.get('USER_STATUS_CHECK', 'true').lower() == 'true'
+    app.config['USER_STATUS_CACHE_TTL'] = int(os.environ.get('USER_STATUS_CACHE_TTL', 30)) # Seconds
+    app.config['SPEND_CACHE_TTL'] = int(os.environ.get('SPEND_CACHE_TTL', 300)) # Seconds; /api/projects/<id>/spend
+    app.config['REFERENCE_CACHE_TTL'] = int(os.environ.get('REFERENCE_CACHE_TTL', 300)) # Seconds; machine/post-process names
+
+    # Per-worker caches re-read their shared version at most this often (see cache.py)
+    app.config['CACHE_VERSION_CHECK_INTERVAL'] = float(os.environ.get('CACHE_VERSION_CHECK_INTERVAL', 2)) # Seconds
+
+    # Request threads per worker process (gunicorn --threads; 1 for the default sync worker)
+    app.config['SERVER_THREADS'] = int(os.environ.get('SERVER_THREADS', 1))
+
+    # Password hashing (see passwords.py); werkzeug method strings, e.g. 'scrypt' or 'pbkdf2:sha256:600000'
+    app.config['PASSWORD_HASH_METHOD'] = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt')
+    app.config['PASSWORD_HASH_WORKERS'] = int(os.environ.get('PASSWORD_HASH_WORKERS', 2)) # Hashing threads per process
+    # Running + waiting hashes; unset means half of SERVER_THREADS, so logins can't hold every request thread
+    app.config['PASSWORD_HASH_MAX_PENDING'] = os.environ.get('PASSWORD_HASH_MAX_PENDING')
+    app.config['PASSWORD_HASH_WAIT_TIMEOUT'] = float(os.environ.get('PASSWORD_HASH_WAIT_TIMEOUT', 5)) # Seconds before 503
+
+    # Rate limits for login/registration, checked before any password hashing (see rate_limit.py)
+    app.config['RATE_LIMIT_ENABLED'] = os.environ.get('RATE_LIMIT_ENABLED', 'true').lower() == 'true'
+    app.config['RATE_LIMIT_BACKEND'] = os.environ.get('RATE_LIMIT_BACKEND', 'memory') # 'memory' or 'sql'
+    app.config['RATE_LIMIT_STORAGE_URI'] = os.environ.get('RATE_LIMIT_STORAGE_URI') # Optional DB for the 'sql' backend
+    app.config['RATE_LIMIT_TRUSTED_PROXIES'] = int(os.environ.get('RATE_LIMIT_TRUSTED_PROXIES', 0)) # e.g. 1 behind nginx
+    app.config['RATE_LIMIT_LOGIN_PER_IP'] = os.environ.get('RATE_LIMIT_LOGIN_PER_IP', '20/60') # requests/seconds
+    app.config['RATE_LIMIT_LOGIN_PER_EMAIL'] = os.environ.get('RATE_LIMIT_LOGIN_PER_EMAIL', '5/60')
+    app.config['RATE_LIMIT_REGISTER_PER_IP'] = os.environ.get('RATE_LIMIT_REGISTER_PER_IP', '10/600')
+    app.config['RATE_LIMIT_REGISTER_PER_EMAIL'] = os.environ.get('RATE_LIMIT_REGISTER_PER_EMAIL', '3/600')
+
+    # N+1 detection: flag statement shapes repeated within one request (on by default in development)
+    app.config['NPLUSONE_ENABLED'] = os.environ.get('NPLUSONE_ENABLED', str(flask_env == 'development')).lower() == 'true'
+    app.config['NPLUSONE_THRESHOLD'] = int(os.environ.get('NPLUSONE_THRESHOLD', 10)) # Allowed repeats per request
+    app.config['NPLUSONE_RAISE'] = os.environ.get('NPLUSONE_RAISE', 'false').lower() == 'true' # Raise instead of warn
+
     # Initialize extensions with the app
     db.init_app(app)
     migrate.init_app(app, db)
@@ -61,6 +109,7 @@ def create_app(test_config=None):
     
     CORS(app, resources={r"/api/*": {"origins": origins}})
     jwt = JWTManager(app) # Initialize JWTManager
+    init_compression(app)
 
     # Configure logging
     if not app.debug:
@@ -85,6 +134,13 @@ def create_app(test_config=None):
         """Handle bad request errors, including JSON parsing errors."""
         return jsonify(message="Error: Malformed request"), 400
     
+    @app.errorhandler(PasswordHasherBusy)
+    def handle_password_hasher_busy(e):
+        """Too many concurrent logins/registrations hashing passwords."""
+        response = jsonify(message="Error: Server busy, please retry shortly")
+        response.headers['Retry-After'] = '1'
+        return response, 503
+
     @app.errorhandler(404)
     def handle_not_found(e):
         """Handle not found errors with JSON response."""
@@ -99,11 +155,25 @@ def create_app(test_config=None):
     if test_config:
         app.config.update(test_config)
 
+    # Installs hooks only when enabled, so it must run once the config is final
+    init_instrumentation(app)
+    init_query_detector(app)
+
     with app.app_context():
         from . import routes
         from . import models # Import models here to ensure they are registered with SQLAlchemy
+        from .user_status import init_user_status_cache
+        from .auth_tokens import init_token_blocklist
+        from .rate_limit import init_rate_limiter
+        from .services.spend_service import init_spend_cache
+        from .reference_data import init_reference_cache
+        init_user_status_cache(app)
+        init_spend_cache(app)
+        init_reference_cache(app)
+        init_token_blocklist(jwt)
+        init_rate_limiter(app)
 
-        # Register blueprints if you decide to use them later
-        # app.register_blueprint(routes.main_bp)
+        # Routes live on a blueprint so every app instance (e.g. one per test) gets them
+        app.register_blueprint(routes.main_bp)
 
     return app
@@ -0,0 +1,77 @@
+"""
+Access/refresh token issuance, rotation and revocation.
+
+Login hands out a short-lived access token plus a long-lived refresh token.
+``POST /api/token/refresh`` trades a refresh token for a new pair without a
+password hash: the old refresh token's jti is written to ``revoked_tokens``
+so it can be used once only. Only refresh tokens are checked against that
+table, so ordinary API requests do not pay for a lookup.
+"""
+import datetime
+
+from flask_jwt_extended import create_access_token, create_refresh_token
+from sqlalchemy import delete, exists, select
+from sqlalchemy.exc import IntegrityError
+
+from .models import db, RevokedToken
+
+
+class TokenAlreadyRevoked(Exception):
+    """The refresh token was revoked concurrently (e.g. two refreshes raced)."""
+
+
+def user_claims(user):
+    return {
+        "username": user.username,
+        "permission": user.permission,
+        "enabled": user.enabled,
+        "is_approved": user.is_approved
+    }
+
+
+def issue_tokens(user):
+    """Return (access_token, refresh_token) for ``user``."""
+    identity = str(user.id)
+    access_token = create_access_token(identity=identity, additional_claims=user_claims(user))
+    refresh_token = create_refresh_token(identity=identity)
+    return access_token, refresh_token
+
+
+def init_token_blocklist(jwt):
+    @jwt.token_in_blocklist_loader
+    def _check_if_token_revoked(jwt_header, jwt_payload):
+        if jwt_payload.get('type') != 'refresh':
+            return False
+        return is_token_revoked(jwt_payload['jti'])
+
+
+def is_token_revoked(jti):
+    return db.session.execute(select(exists().where(RevokedToken.jti == jti))).scalar()
+
+
+def revoke_token(jwt_payload):
+    """Add the token to the revocation table and commit.
+
+    Raises TokenAlreadyRevoked if another request revoked it first, which is how
+    a refresh token presented twice at the same time is used only once.
+    """
+    revoked = RevokedToken(
+        jti=jwt_payload['jti'],
+        token_type=jwt_payload.get('type', 'refresh'),
+        user_id=int(jwt_payload['sub']) if str(jwt_payload.get('sub', '')).isdigit() else None,
+        expires_at=datetime.datetime.utcfromtimestamp(jwt_payload['exp']),
+    )
+    db.session.add(revoked)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        raise TokenAlreadyRevoked(jwt_payload['jti'])
+
+
+def prune_revoked_tokens(now=None):
+    """Delete revocations for tokens that have expired anyway. Returns the row count."""
+    now = now or datetime.datetime.utcnow()
+    result = db.session.execute(delete(RevokedToken).where(RevokedToken.expires_at < now))
+    db.session.commit()
+    return result.rowcount
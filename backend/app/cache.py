@@ -0,0 +1,99 @@
+"""
+Small per-worker caches kept coherent across gunicorn workers.
+
+Each cache has a name and a row in ``cache_versions``. Code that changes the
+underlying data calls ``bump_cache_version(name)`` before committing; every
+worker re-reads the version at most once per ``CACHE_VERSION_CHECK_INTERVAL``
+seconds and drops its entries when it moved. Entries also expire after their
+own TTL, so a missed bump is bounded too.
+
+Caches live in ``app.extensions`` so every app instance (e.g. one per test)
+gets its own.
+"""
+import threading
+import time
+
+from flask import current_app
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
+
+from .models import db, CacheVersion
+
+
+def get_cache_version(name):
+    version = db.session.execute(select(CacheVersion.version).where(CacheVersion.name == name)).scalar()
+    return version or 0
+
+
+def bump_cache_version(name):
+    """Increment the version for ``name`` in the current transaction."""
+    result = db.session.execute(
+        update(CacheVersion).where(CacheVersion.name == name).values(version=CacheVersion.version + 1)
+    )
+    if result.rowcount:
+        return
+    try:
+        with db.session.begin_nested():
+            db.session.add(CacheVersion(name=name, version=1))
+    except IntegrityError:
+        # Another worker created the row first
+        db.session.execute(
+            update(CacheVersion).where(CacheVersion.name == name).values(version=CacheVersion.version + 1)
+        )
+
+
+class VersionedCache:
+    """Thread-safe key/value cache with per-entry TTL and a shared version counter."""
+
+    def __init__(self, name, ttl, check_interval):
+        self.name = name
+        self.ttl = ttl
+        self.check_interval = check_interval
+        self._entries = {}
+        self._version = None
+        self._checked_at = None
+        self._lock = threading.Lock()
+
+    def _sync_version(self, now):
+        if self._checked_at is not None and now - self._checked_at < self.check_interval:
+            return
+        version = get_cache_version(self.name)
+        with self._lock:
+            if version != self._version:
+                self._entries.clear()
+                self._version = version
+            self._checked_at = now
+
+    def get(self, key, loader):
+        """Return the cached value for ``key``, calling ``loader(key)`` on a miss."""
+        now = time.monotonic()
+        self._sync_version(now)
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] > now:
+            return entry[1]
+        value = loader(key)
+        with self._lock:
+            self._entries[key] = (now + self.ttl, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            # Re-read the version on next access so entries loaded before the
+            # writer's commit are dropped again once it lands
+            self._checked_at = None
+
+    def invalidate(self):
+        """Bump the shared version (caller commits) and clear this worker's entries."""
+        bump_cache_version(self.name)
+        self.clear()
+
+
+def get_cache(name):
+    return current_app.extensions['versioned_caches'][name]
+
+
+def register_cache(app, name, ttl):
+    caches = app.extensions.setdefault('versioned_caches', {})
+    caches[name] = VersionedCache(name, ttl, app.config.get('CACHE_VERSION_CHECK_INTERVAL', 2))
+    return caches[name]
@@ -0,0 +1,132 @@
+"""
+Compact columnar representation for large part lists and trees.
+
+Clients opt in with an Accept header:
+    application/vnd.broncoparts.columnar+json
+    application/vnd.broncoparts.columnar+msgpack   (needs the msgpack package)
+
+Instead of a list of row objects that repeat every key, the payload holds one
+array per column. Low-cardinality string columns (status, machine,
+raw_material) are dictionary-encoded: the column holds indexes into
+``dictionaries[<column>]`` and ``null`` stays ``null``. Trees are sent as rows in
+depth-first order with a ``parent`` column holding the index of the parent row
+(-1 for top-level nodes).
+
+    {
+        "format": "columnar", "version": 1, "row_count": 3,
+        "columns": {"id": [1, 2, 3], "status": [0, 0, 1], ...},
+        "dictionaries": {"status": ["In Design", "Done"], ...}
+    }
+"""
+from flask import Response, current_app, request
+
+try:
+    import msgpack
+except ImportError:  # msgpack is optional; only the +json variant is offered without it
+    msgpack = None
+
+COLUMNAR_JSON_MIMETYPE = 'application/vnd.broncoparts.columnar+json'
+COLUMNAR_MSGPACK_MIMETYPE = 'application/vnd.broncoparts.columnar+msgpack'
+FORMAT_VERSION = 1
+
+
+def negotiated_columnar_mimetype():
+    """Return the columnar mimetype explicitly requested by the client, or None.
+
+    Wildcards (``*/*``) never select a columnar format, so existing clients keep
+    getting the row-oriented JSON they expect.
+    """
+    offered = [COLUMNAR_JSON_MIMETYPE]
+    if msgpack is not None:
+        offered.append(COLUMNAR_MSGPACK_MIMETYPE)
+
+    best, best_quality = None, 0
+    for mimetype, quality in request.accept_mimetypes:
+        if mimetype in offered and quality > best_quality:
+            best, best_quality = mimetype, quality
+    return best
+
+
+def encode_columns(rows, columns, dictionary_columns=()):
+    """Turn a sequence of row tuples into the columnar payload.
+
+    Args:
+        rows: iterable of tuples, one value per entry in ``columns``.
+        columns: column names, in tuple order.
+        dictionary_columns: names of columns to dictionary-encode.
+    """
+    arrays = {name: [] for name in columns}
+    dictionaries = {name: [] for name in dictionary_columns}
+    lookups = {name: {} for name in dictionary_columns}
+    appenders = [arrays[name].append for name in columns]
+    encoders = [lookups.get(name) for name in columns]
+
+    row_count = 0
+    for row in rows:
+        row_count += 1
+        for append, lookup, name, value in zip(appenders, encoders, columns, row):
+            if lookup is not None and value is not None:
+                index = lookup.get(value)
+                if index is None:
+                    index = lookup[value] = len(dictionaries[name])
+                    dictionaries[name].append(value)
+                value = index
+            append(value)
+
+    return {
+        'format': 'columnar',
+        'version': FORMAT_VERSION,
+        'row_count': row_count,
+        'columns': arrays,
+        'dictionaries': dictionaries,
+    }
+
+
+def encode_tree(nodes, columns, dictionary_columns=(), sort_key=None):
+    """Encode a forest as depth-first rows with a ``parent`` index column.
+
+    Args:
+        nodes: iterable of tuples whose first two values are (id, parent_id),
+            followed by the values for ``columns``.
+        columns: names of the columns after id/parent_id.
+        sort_key: optional key applied to sibling tuples (e.g. by name).
+
+    Nodes whose parent is not among ``nodes`` are treated as roots. Cycles are
+    broken by visiting each id at most once.
+    """
+    children = {}
+    by_id = {}
+    for node in nodes:
+        by_id[node[0]] = node
+        children.setdefault(node[1], []).append(node)
+    roots = [node for node in by_id.values() if node[1] is None or node[1] not in by_id]
+    if sort_key is not None:
+        roots.sort(key=sort_key)
+        for siblings in children.values():
+            siblings.sort(key=sort_key)
+
+    def depth_first():
+        visited = set()
+        stack = [(node, -1) for node in reversed(roots)]
+        index = 0
+        while stack:
+            node, parent_index = stack.pop()
+            if node[0] in visited:
+                continue
+            visited.add(node[0])
+            yield (parent_index, node[0]) + tuple(node[2:])
+            for child in reversed(children.get(node[0], ())):
+                stack.append((child, index))
+            index += 1
+
+    return encode_columns(depth_first(), ('parent', 'id') + tuple(columns), dictionary_columns)
+
+
+def columnar_response(payload, mimetype):
+    if mimetype == COLUMNAR_MSGPACK_MIMETYPE:
+        body = msgpack.packb(payload, use_bin_type=True)
+    else:
+        body = current_app.json.dumps(payload)
+    response = Response(body, mimetype=mimetype)
+    response.vary.add('Accept')
+    return response
@@ -0,0 +1,150 @@
+"""
+Negotiated response compression for the JSON API.
+
+Part lists and trees repeat the same keys and values thousands of times, so
+they compress extremely well. Responses are compressed in-process (rather than
+relying on the nginx /api proxy) with brotli when the optional ``brotli``
+package is installed and the client accepts it, otherwise with gzip.
+
+Configuration (see create_app):
+    COMPRESSION_ENABLED         Turn the after_request hook on/off.
+    COMPRESSION_MIN_SIZE        Bodies smaller than this (bytes) are sent as-is.
+    COMPRESSION_LEVEL           gzip level, 1 (fast) .. 9 (small).
+    COMPRESSION_BROTLI_QUALITY  brotli quality, 0 (fast) .. 11 (small).
+    COMPRESSION_MIMETYPES       Extra mimetypes to compress besides the defaults.
+
+Streamed responses (generators, e.g. exports) are compressed chunk by chunk,
+flushing after every chunk so clients keep receiving data as it is produced.
+"""
+import zlib
+
+from flask import current_app, request
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; fall back to gzip only
+    brotli = None
+
+DEFAULT_COMPRESSIBLE_MIMETYPES = frozenset([
+    'application/json',
+    'application/javascript',
+    'application/x-ndjson',
+    'application/msgpack',
+    'application/x-msgpack',
+    'text/html',
+    'text/plain',
+    'text/csv',
+    'text/css',
+])
+
+
+def init_compression(app):
+    """Register the compression hook on the Flask app."""
+    app.config.setdefault('COMPRESSION_ENABLED', True)
+    app.config.setdefault('COMPRESSION_MIN_SIZE', 1024)
+    app.config.setdefault('COMPRESSION_LEVEL', 6)
+    app.config.setdefault('COMPRESSION_BROTLI_QUALITY', 4)
+    app.config.setdefault('COMPRESSION_MIMETYPES', [])
+    app.after_request(compress_response)
+
+
+def is_compressible_mimetype(mimetype):
+    if not mimetype:
+        return False
+    if mimetype in DEFAULT_COMPRESSIBLE_MIMETYPES or mimetype in current_app.config['COMPRESSION_MIMETYPES']:
+        return True
+    # Vendor types such as application/vnd.broncoparts.columnar+json
+    return mimetype.endswith('+json') or mimetype.endswith('+msgpack')
+
+
+def negotiate_encoding(accept_encodings):
+    """Pick 'br', 'gzip' or None from a werkzeug Accept-Encoding header object."""
+    gzip_q = accept_encodings.quality('gzip')
+    br_q = accept_encodings.quality('br') if brotli is not None else 0
+    if br_q > 0 and br_q >= gzip_q:
+        return 'br'
+    if gzip_q > 0:
+        return 'gzip'
+    return None
+
+
+def _gzip_compressor(level):
+    # wbits=31 selects the gzip container (16) with a 32K window (15)
+    return zlib.compressobj(level, zlib.DEFLATED, 31)
+
+
+def compress_bytes(data, encoding, level=6, brotli_quality=4):
+    if encoding == 'br':
+        return brotli.compress(data, quality=brotli_quality)
+    compressor = _gzip_compressor(level)
+    return compressor.compress(data) + compressor.flush()
+
+
+def _stream_compress(iterable, encoding, level, brotli_quality):
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=brotli_quality)
+        compress, sync_flush, finish = compressor.process, compressor.flush, compressor.finish
+    else:
+        compressor = _gzip_compressor(level)
+        compress = compressor.compress
+        sync_flush = lambda: compressor.flush(zlib.Z_SYNC_FLUSH)
+        finish = compressor.flush
+
+    try:
+        for chunk in iterable:
+            if isinstance(chunk, str):
+                chunk = chunk.encode('utf-8')
+            if not chunk:
+                continue
+            out = compress(chunk) + sync_flush()
+            if out:
+                yield out
+        tail = finish()
+        if tail:
+            yield tail
+    finally:
+        close = getattr(iterable, 'close', None)
+        if close is not None:
+            close()
+
+
+def compress_response(response):
+    config = current_app.config
+    if not config.get('COMPRESSION_ENABLED', True):
+        return response
+
+    if not is_compressible_mimetype(response.mimetype):
+        return response
+
+    # Cache keys must account for negotiation even when this response ends up uncompressed
+    response.vary.add('Accept-Encoding')
+
+    if (response.status_code < 200 or response.status_code in (204, 304)
+            or 'Content-Encoding' in response.headers
+            or response.direct_passthrough):
+        return response
+
+    encoding = negotiate_encoding(request.accept_encodings)
+    if encoding is None:
+        return response
+
+    level = config.get('COMPRESSION_LEVEL', 6)
+    brotli_quality = config.get('COMPRESSION_BROTLI_QUALITY', 4)
+
+    if response.is_streamed:
+        response.response = _stream_compress(response.response, encoding, level, brotli_quality)
+        response.headers.pop('Content-Length', None)
+        response.headers['Content-Encoding'] = encoding
+        return response
+
+    data = response.get_data()
+    if len(data) < config.get('COMPRESSION_MIN_SIZE', 1024):
+        return response
+
+    response.set_data(compress_bytes(data, encoding, level, brotli_quality))
+    response.headers['Content-Encoding'] = encoding
+    if response.headers.get('ETag'):
+        # The representation changed, so a strong validator no longer matches byte-for-byte
+        etag, weak = response.get_etag()
+        response.set_etag(etag, weak=True)
+    return response
@@ -0,0 +1,246 @@
+"""
+Per-request timing and query-count instrumentation.
+
+When METRICS_ENABLED is set, every request records:
+    - wall time
+    - number of DB statements and time spent in them (SQLAlchemy engine events)
+    - number of Airtable calls and time spent in them
+    - time spent serializing JSON
+
+The numbers are returned to the caller as a ``Server-Timing`` header (visible
+in the browser dev tools) and aggregated per endpoint into Prometheus counters
+and histograms served as text on ``/metrics``. Metrics are kept in-process, so
+with several gunicorn workers each worker reports its own share.
+
+When METRICS_ENABLED is off nothing is registered at all: no hooks, no engine
+listeners, and the Airtable wrappers reduce to one attribute check on ``g``.
+"""
+import bisect
+import threading
+import time
+from functools import wraps
+
+from flask import Response, current_app, g, has_app_context, request
+from flask.json.provider import DefaultJSONProvider
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+DURATION_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_engine_listeners_installed = False
+_engine_listeners_lock = threading.Lock()
+
+
+class MetricsRegistry:
+    """Minimal thread-safe store for counters and histograms, rendered in the
+    Prometheus text exposition format."""
+
+    def __init__(self, buckets=DURATION_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+        self._help = {}
+
+    def describe(self, name, kind, help_text):
+        self._help[name] = (kind, help_text)
+
+    def inc(self, name, labels, value=1):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, labels, value):
+        key = (name, tuple(sorted(labels.items())))
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [[0] * len(self.buckets), 0.0, 0]
+            if index < len(self.buckets):
+                histogram[0][index] += 1
+            histogram[1] += value
+            histogram[2] += 1
+
+    def counter_value(self, name, **labels):
+        return self._counters.get((name, tuple(sorted(labels.items()))), 0)
+
+    def render(self):
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {key: (list(h[0]), h[1], h[2]) for key, h in self._histograms.items()}
+
+        lines = []
+        described = set()
+
+        def header(name):
+            if name in described or name not in self._help:
+                return
+            described.add(name)
+            kind, help_text = self._help[name]
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+
+        for (name, labels), value in sorted(counters.items()):
+            header(name)
+            lines.append(f'{name}{_format_labels(labels)} {value}')
+
+        for (name, labels), (bucket_counts, total, count) in sorted(histograms.items()):
+            header(name)
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, bucket_counts):
+                cumulative += bucket_count
+                lines.append(f'{name}_bucket{_format_labels(labels + (("le", repr(bound)),))} {cumulative}')
+            lines.append(f'{name}_bucket{_format_labels(labels + (("le", "+Inf"),))} {count}')
+            lines.append(f'{name}_sum{_format_labels(labels)} {total}')
+            lines.append(f'{name}_count{_format_labels(labels)} {count}')
+
+        return '\n'.join(lines) + '\n'
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    parts = []
+    for key, value in labels:
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        parts.append(f'{key}="{value}"')
+    return '{' + ','.join(parts) + '}'
+
+
+class RequestTiming:
+    __slots__ = ('start', 'db_count', 'db_time', 'airtable_count', 'airtable_time',
+                 'airtable_depth', 'serialize_time')
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.db_count = 0
+        self.db_time = 0.0
+        self.airtable_count = 0
+        self.airtable_time = 0.0
+        self.airtable_depth = 0
+        self.serialize_time = 0.0
+
+
+class TimedJSONProvider(DefaultJSONProvider):
+    """JSON provider that adds the time spent in dumps() to the current request."""
+
+    def dumps(self, obj, **kwargs):
+        timing = current_request_timing()
+        if timing is None:
+            return super().dumps(obj, **kwargs)
+        start = time.perf_counter()
+        try:
+            return super().dumps(obj, **kwargs)
+        finally:
+            timing.serialize_time += time.perf_counter() - start
+
+
+def current_request_timing():
+    if not has_app_context():
+        return None
+    return g.get('request_timing')
+
+
+def init_instrumentation(app):
+    """Register the hooks if METRICS_ENABLED is set. Call after config is final."""
+    if not app.config.get('METRICS_ENABLED'):
+        return
+
+    registry = MetricsRegistry()
+    registry.describe('broncoparts_http_requests_total', 'counter', 'HTTP requests by endpoint, method and status.')
+    registry.describe('broncoparts_http_request_duration_seconds', 'histogram', 'Wall time per request.')
+    registry.describe('broncoparts_db_queries_total', 'counter', 'DB statements executed.')
+    registry.describe('broncoparts_db_duration_seconds', 'histogram', 'DB time per request.')
+    registry.describe('broncoparts_airtable_calls_total', 'counter', 'Airtable API calls made.')
+    registry.describe('broncoparts_airtable_duration_seconds', 'histogram', 'Airtable time per request.')
+    registry.describe('broncoparts_serialization_duration_seconds', 'histogram', 'JSON serialization time per request.')
+    app.extensions['metrics'] = registry
+
+    app.json = TimedJSONProvider(app)
+    app.before_request(_start_request_timing)
+    app.after_request(_finish_request_timing)
+    app.add_url_rule('/metrics', 'metrics', _metrics_view)
+    _install_engine_listeners()
+
+
+def _install_engine_listeners():
+    global _engine_listeners_installed
+    with _engine_listeners_lock:
+        if _engine_listeners_installed:
+            return
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        _engine_listeners_installed = True
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if current_request_timing() is not None:
+        conn.info.setdefault('query_start_time', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    timing = current_request_timing()
+    starts = conn.info.get('query_start_time')
+    if timing is None or not starts:
+        return
+    timing.db_count += 1
+    timing.db_time += time.perf_counter() - starts.pop()
+
+
+def timed_airtable_call(fn):
+    """Decorator for Airtable service functions. Nested calls (e.g. a sync that
+    fetches select options) are counted once, at the outermost call."""
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        timing = current_request_timing()
+        if timing is None:
+            return fn(*args, **kwargs)
+        timing.airtable_depth += 1
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            timing.airtable_depth -= 1
+            if timing.airtable_depth == 0:
+                timing.airtable_count += 1
+                timing.airtable_time += time.perf_counter() - start
+    return wrapper
+
+
+def _start_request_timing():
+    g.request_timing = RequestTiming()
+
+
+def _finish_request_timing(response):
+    timing = g.pop('request_timing', None)
+    if timing is None:
+        return response
+    total = time.perf_counter() - timing.start
+
+    if current_app.config.get('METRICS_SERVER_TIMING', True):
+        response.headers['Server-Timing'] = ', '.join([
+            f'db;dur={timing.db_time * 1000:.2f};desc="{timing.db_count} queries"',
+            f'airtable;dur={timing.airtable_time * 1000:.2f};desc="{timing.airtable_count} calls"',
+            f'serialize;dur={timing.serialize_time * 1000:.2f}',
+            f'total;dur={total * 1000:.2f}',
+        ])
+
+    registry = current_app.extensions['metrics']
+    endpoint = request.endpoint or 'unmatched'
+    labels = {'endpoint': endpoint}
+    registry.inc('broncoparts_http_requests_total',
+                 {'endpoint': endpoint, 'method': request.method, 'status': str(response.status_code)})
+    registry.observe('broncoparts_http_request_duration_seconds', labels, total)
+    registry.inc('broncoparts_db_queries_total', labels, timing.db_count)
+    registry.observe('broncoparts_db_duration_seconds', labels, timing.db_time)
+    if timing.airtable_count:
+        registry.inc('broncoparts_airtable_calls_total', labels, timing.airtable_count)
+        registry.observe('broncoparts_airtable_duration_seconds', labels, timing.airtable_time)
+    registry.observe('broncoparts_serialization_duration_seconds', labels, timing.serialize_time)
+    return response
+
+
+def _metrics_view():
+    registry = current_app.extensions['metrics']
+    return Response(registry.render(), mimetype='text/plain; version=0.0.4')
@@ -1,8 +1,10 @@
 from . import db
 from datetime import datetime
-from werkzeug.security import generate_password_hash, check_password_hash
+from .passwords import hash_password, verify_password, needs_rehash
+import re
 import secrets
 import datetime
+from sqlalchemy import and_, case, literal, or_, select, union_all, update
 from sqlalchemy.orm import validates
 
 # Association table for Part and PostProcess
@@ -31,11 +33,20 @@ class User(db.Model):
     # Relationships
     registration_link = db.relationship('RegistrationLink', foreign_keys=[registered_via_link_id], backref=db.backref('registered_users', lazy='dynamic'))
 
+    __table_args__ = (
+        db.Index('ix_users_is_approved_requested_at', 'is_approved', 'requested_at'), # Pending-approval queue
+        db.Index('ix_users_permission_enabled', 'permission', 'enabled'), # Admin list filters
+    )
+
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = hash_password(password)
 
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return verify_password(self.password_hash, password)
+
+    def password_needs_rehash(self):
+        """True if the stored hash predates the current PASSWORD_HASH_METHOD."""
+        return needs_rehash(self.password_hash)
 
     def to_dict(self):
         return {
@@ -56,6 +67,8 @@ class User(db.Model):
     def __repr__(self):
         return f'<User {self.username} ({self.permission}){" Enabled" if self.enabled else " Disabled"}{" Approved" if self.is_approved else " Pending Approval"}>'
 
+CUSTOM_PATH_PATTERN = re.compile(r'^[A-Za-z0-9_-]+$')
+
 class RegistrationLink(db.Model):
     __tablename__ = 'registration_links'
 
@@ -82,19 +95,16 @@ class RegistrationLink(db.Model):
 
     creator = db.relationship('User', foreign_keys=[created_by_user_id], backref=db.backref('created_registration_links', lazy='dynamic'))
 
+    __table_args__ = (
+        db.Index('ix_registration_links_is_active_created_at', 'is_active', 'created_at'), # Admin list filter/order
+    )
+
     @validates('custom_path')
     def validate_custom_path(self, key, custom_path):
-        if custom_path:
-            if not custom_path.isalnum() and '_' not in custom_path and '-' not in custom_path:
-                raise ValueError("Custom path can only contain alphanumeric characters, underscores, and hyphens.")
-            # Check for uniqueness against other active links if it's being set/changed
-            # Ensure self.id exists for updates, otherwise it's a new record
-            query = RegistrationLink.query.filter(RegistrationLink.custom_path == custom_path, RegistrationLink.is_active == True)
-            if hasattr(self, 'id') and self.id is not None:
-                query = query.filter(RegistrationLink.id != self.id)
-            existing = query.first()
-            if existing:
-                raise ValueError(f"Custom path '{custom_path}' is already in use by an active link.")
+        # Format only. Uniqueness is enforced by the unique index; routes turn the
+        # IntegrityError into a 409 (and pre-check with custom_path_taken).
+        if custom_path and not CUSTOM_PATH_PATTERN.match(custom_path):
+            raise ValueError("Custom path can only contain alphanumeric characters, underscores, and hyphens.")
         return custom_path
 
     @property
@@ -102,17 +112,69 @@ class RegistrationLink(db.Model):
         """The part of the URL that identifies this link, to be used like /register/link/{this_value}"""
         return self.custom_path if self.custom_path else self.token
 
-    def is_currently_valid_for_registration(self):
+    def is_currently_valid_for_registration(self, now=None):
         """Checks if the link can be used for a new registration right now. Returns (bool, message_string)."""
         if not self.is_active:
             return False, "Link is not active."
-        if self.expires_at and datetime.datetime.utcnow() > self.expires_at:
+        if self.expires_at and (now or datetime.datetime.utcnow()) > self.expires_at:
             return False, "Link has expired."
         if self.max_uses != -1 and self.current_uses >= self.max_uses: # -1 means unlimited
             return False, "Link has reached its maximum number of uses."
         return True, "Link is valid for registration."
 
-    def to_dict(self):
+    @classmethod
+    def custom_path_taken(cls, custom_path, exclude_link_id=None):
+        """True if another link already uses ``custom_path`` (one unique-index lookup)."""
+        stmt = select(cls.id).where(cls.custom_path == custom_path)
+        if exclude_link_id is not None:
+            stmt = stmt.where(cls.id != exclude_link_id)
+        return db.session.execute(stmt.limit(1)).first() is not None
+
+    @classmethod
+    def find_by_identifier(cls, identifier):
+        """Look a link up by token or custom_path in one query.
+
+        ``token = x OR custom_path = x`` spans two columns, which databases often
+        answer with a full scan. A UNION ALL of two selects lets each branch use
+        its own unique index. A token match wins over a custom_path match.
+        """
+        matches = union_all(
+            select(cls.id.label('id'), literal(0).label('priority')).where(cls.token == identifier),
+            select(cls.id.label('id'), literal(1).label('priority')).where(cls.custom_path == identifier),
+        ).subquery()
+        stmt = select(cls).join(matches, cls.id == matches.c.id).order_by(matches.c.priority).limit(1)
+        return db.session.execute(stmt).scalars().first()
+
+    @classmethod
+    def claim_use(cls, link_id, now=None):
+        """Atomically take one use of the link. Returns True if a use was claimed.
+
+        Validity is re-checked in the UPDATE's WHERE clause, so concurrent
+        registrations can never push current_uses past max_uses. The link is
+        deactivated by the same statement when this was its last use. The row
+        stays locked until the caller commits or rolls back, so do slow work
+        (password hashing) before calling this.
+        """
+        now = now or datetime.datetime.utcnow()
+        exhausted = and_(cls.max_uses != -1, cls.current_uses + 1 >= cls.max_uses)
+        result = db.session.execute(
+            update(cls)
+            .where(
+                cls.id == link_id,
+                cls.is_active == True,
+                or_(cls.expires_at.is_(None), cls.expires_at >= now),
+                or_(cls.max_uses == -1, cls.current_uses < cls.max_uses),
+            )
+            # is_active first: MySQL evaluates SET assignments left to right using updated values
+            .ordered_values(
+                (cls.is_active, case((exhausted, False), else_=cls.is_active)),
+                (cls.current_uses, cls.current_uses + 1),
+            )
+            .execution_options(synchronize_session=False)
+        )
+        return result.rowcount == 1
+
+    def to_dict(self, now=None):
         return {
             'id': self.id,
             'token': self.token, # Internal token
@@ -129,7 +191,7 @@ class RegistrationLink(db.Model):
             'creator_username': self.creator.username if self.creator else None, # Added for convenience
             'created_at': self.created_at.isoformat(),
             'is_active': self.is_active,
-            'is_currently_valid': self.is_currently_valid_for_registration() # Dynamic status
+            'is_currently_valid': self.is_currently_valid_for_registration(now)[0] # Dynamic status
         }
 
 class Project(db.Model):
@@ -190,7 +252,7 @@ class Part(db.Model):
     
     # Type and hierarchy for part numbering
     type = db.Column(db.String(10), nullable=False)  # 'assembly' or 'part'
-    parent_id = db.Column(db.Integer, db.ForeignKey('parts.id'), nullable=True)
+    parent_id = db.Column(db.Integer, db.ForeignKey('parts.id'), nullable=True, index=True)
     children = db.relationship('Part',
                                foreign_keys=[parent_id], # Specify the foreign key for the self-referential relationship
                                backref=db.backref('parent', remote_side=[id]),
@@ -250,13 +312,19 @@ class Order(db.Model):
 
     items = db.relationship('OrderItem', backref='order', lazy=True, cascade="all, delete-orphan")
 
+    __table_args__ = (
+        db.Index('ix_orders_order_date_id', 'order_date', 'id'), # Keyset pagination order
+        db.Index('ix_orders_project_id_order_date', 'project_id', 'order_date'), # Per-project listing
+        db.Index('ix_orders_status_order_date', 'status', 'order_date'), # Status filter
+    )
+
     def __repr__(self):
         return f'<Order {self.order_number}>'
 
 class OrderItem(db.Model):
     __tablename__ = 'order_items'
     id = db.Column(db.Integer, primary_key=True)
-    order_id = db.Column(db.Integer, db.ForeignKey('orders.id'), nullable=False)
+    order_id = db.Column(db.Integer, db.ForeignKey('orders.id'), nullable=False, index=True)
     part_id = db.Column(db.Integer, db.ForeignKey('parts.id'), nullable=False)
     quantity = db.Column(db.Integer, nullable=False, default=1)
     unit_price = db.Column(db.Numeric(10, 2), nullable=False) # Price at the time of order
@@ -265,3 +333,65 @@ class OrderItem(db.Model):
 
     def __repr__(self):
         return f'<OrderItem OrderID:{self.order_id} PartID:{self.part_id} Qty:{self.quantity}>'
+
+class CacheVersion(db.Model):
+    """Version counter per named in-process cache. Writers bump the counter in
+    the same transaction as their change; every worker compares it with the
+    version its cache was filled at and drops the cache when it moved."""
+    __tablename__ = 'cache_versions'
+    name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<CacheVersion {self.name}={self.version}>'
+
+class RevokedToken(db.Model):
+    """Refresh tokens that may no longer be used (rotated away or logged out).
+    Rows can be pruned once expires_at has passed, since the token signature
+    check rejects them from then on anyway."""
+    __tablename__ = 'revoked_tokens'
+    id = db.Column(db.Integer, primary_key=True)
+    jti = db.Column(db.String(36), unique=True, nullable=False, index=True)
+    token_type = db.Column(db.String(10), nullable=False, default='refresh')
+    user_id = db.Column(db.Integer, nullable=True)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+    revoked_at = db.Column(db.DateTime, default=datetime.datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        return f'<RevokedToken {self.jti} user:{self.user_id}>'
+
+class RateLimitBucket(db.Model):
+    """Token bucket state for the shared (multi-worker) rate limiter backend."""
+    __tablename__ = 'rate_limit_buckets'
+    key = db.Column(db.String(255), primary_key=True)
+    # Double precision: a single-precision FLOAT (MySQL's default) only resolves
+    # a Unix timestamp to about two minutes
+    tokens = db.Column(db.Double, nullable=False)
+    updated_at = db.Column(db.Double, nullable=False) # Unix time of the last refill calculation
+
+    def __repr__(self):
+        return f'<RateLimitBucket {self.key}={self.tokens:.2f}>'
+
+class AssemblyRollup(db.Model):
+    """Counters over the descendant parts (type 'part', any depth) of one
+    assembly, kept in step by rollups.py whenever a part is created, deleted,
+    moved or changes have_material/drawing_created/status."""
+    __tablename__ = 'assembly_rollups'
+    assembly_id = db.Column(db.Integer, db.ForeignKey('parts.id', ondelete='CASCADE'), primary_key=True)
+    project_id = db.Column(db.Integer, db.ForeignKey('projects.id'), nullable=False, index=True)
+    part_count = db.Column(db.Integer, nullable=False, default=0)
+    have_material_count = db.Column(db.Integer, nullable=False, default=0)
+    drawing_created_count = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<AssemblyRollup {self.assembly_id} parts:{self.part_count}>'
+
+class AssemblyStatusRollup(db.Model):
+    """Descendant part count per status for one assembly (see AssemblyRollup)."""
+    __tablename__ = 'assembly_status_rollups'
+    assembly_id = db.Column(db.Integer, db.ForeignKey('parts.id', ondelete='CASCADE'), primary_key=True)
+    status = db.Column(db.String(50), primary_key=True)
+    part_count = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<AssemblyStatusRollup {self.assembly_id} {self.status}={self.part_count}>'
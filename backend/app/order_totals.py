@@ -0,0 +1,110 @@
+"""
+Incrementally maintained ``Order.total_amount``.
+
+Item routes never recompute a total from the order's lines. They apply the
+Decimal difference their change makes with one ``UPDATE orders SET
+total_amount = total_amount + :delta`` in the same transaction as the item
+write, so concurrent edits to different lines of one order cannot overwrite
+each other's contribution and reports can read the column directly.
+
+``find_total_drift`` / ``reconcile_order_totals`` compare every order with
+the sum of its lines in one grouped query and repair drift (rows edited by
+hand, imports, bugs) with set-based UPDATEs. Run them from the CLI:
+
+    flask reconcile-order-totals [--fix]
+"""
+from decimal import Decimal
+
+from sqlalchemy import select, update
+
+from .models import db, Order, OrderItem
+
+CENTS = Decimal('0.01')
+RECONCILE_CHUNK_SIZE = 500
+
+
+def line_total(quantity, unit_price):
+    return (Decimal(str(unit_price)) * quantity).quantize(CENTS)
+
+
+def apply_total_delta(order_id, delta):
+    """Add ``delta`` to the order's total in SQL and return the new total.
+
+    ROUND keeps SQLite, which stores NUMERIC as floating point, from
+    accumulating binary fractions; on PostgreSQL it is a no-op.
+
+    The caller commits. Uses UPDATE .. RETURNING where the dialect supports
+    it, otherwise reads the column back with one query.
+    """
+    stmt = (
+        update(Order)
+        .where(Order.id == order_id)
+        .values(total_amount=db.func.round(db.func.coalesce(Order.total_amount, 0) + Decimal(delta).quantize(CENTS), 2))
+        .execution_options(synchronize_session=False)
+    )
+    if db.session.get_bind().dialect.update_returning:
+        new_total = db.session.execute(stmt.returning(Order.total_amount)).scalar_one()
+    else:
+        db.session.execute(stmt)
+        new_total = db.session.scalar(select(Order.total_amount).where(Order.id == order_id))
+    # The UPDATE bypassed the identity map; make a loaded Order see the new value
+    order = db.session.identity_map.get(db.session.identity_key(Order, (order_id,)))
+    if order is not None:
+        db.session.expire(order, ['total_amount', 'updated_at'])
+    return Decimal(str(new_total)).quantize(CENTS)
+
+
+def _computed_totals():
+    return (
+        select(
+            OrderItem.order_id.label('order_id'),
+            db.func.sum(OrderItem.quantity * OrderItem.unit_price).label('items_total'),
+        )
+        .group_by(OrderItem.order_id)
+        .subquery()
+    )
+
+
+def find_total_drift():
+    """Return ``[(order_id, stored_total, computed_total), ...]`` for every order
+    whose stored total differs from the sum of its items, in one query."""
+    computed = _computed_totals()
+    rows = db.session.execute(
+        select(Order.id, Order.total_amount, computed.c.items_total)
+        .outerjoin(computed, computed.c.order_id == Order.id)
+        .order_by(Order.id)
+    )
+    drift = []
+    for order_id, stored, items_total in rows:
+        stored = Decimal(str(stored if stored is not None else 0)).quantize(CENTS)
+        expected = Decimal(str(items_total if items_total is not None else 0)).quantize(CENTS)
+        if stored != expected:
+            drift.append((order_id, stored, expected))
+    return drift
+
+
+def reconcile_order_totals(fix=False):
+    """Find drifted totals and, with ``fix``, reset them from the items.
+
+    Fixes are applied with one correlated UPDATE per chunk of order ids and
+    committed here. Returns the drift list found before fixing.
+    """
+    drift = find_total_drift()
+    if not fix or not drift:
+        return drift
+    items_total = (
+        select(db.func.coalesce(db.func.sum(OrderItem.quantity * OrderItem.unit_price), 0))
+        .where(OrderItem.order_id == Order.id)
+        .scalar_subquery()
+    )
+    order_ids = [order_id for order_id, _, _ in drift]
+    for start in range(0, len(order_ids), RECONCILE_CHUNK_SIZE):
+        chunk = order_ids[start:start + RECONCILE_CHUNK_SIZE]
+        db.session.execute(
+            update(Order)
+            .where(Order.id.in_(chunk))
+            .values(total_amount=items_total)
+            .execution_options(synchronize_session=False)
+        )
+    db.session.commit()
+    return drift
@@ -0,0 +1,117 @@
+"""
+Helpers for list endpoints: boolean filter args and opt-in pagination.
+
+List endpoints return every row when the client sends neither ``page`` nor
+``per_page`` (what the existing frontend expects). With either argument they
+return one page plus a ``pagination`` object:
+
+    {"page": 2, "per_page": 50, "total": 420, "pages": 9}
+
+Endpoints over tables that keep growing (orders) use keyset pagination
+instead: ``limit`` plus an opaque ``cursor`` taken from the previous page's
+``next_cursor``. Each page is an index range scan, however deep the client
+pages, and no COUNT(*) runs.
+"""
+import base64
+import json
+from datetime import datetime, timedelta
+
+from flask import request
+
+DEFAULT_PER_PAGE = 50
+MAX_PER_PAGE = 200
+
+_TRUE = ('1', 'true', 'yes')
+_FALSE = ('0', 'false', 'no')
+
+
+def bool_arg(name):
+    """Parse a true/false query argument. Returns None when absent; raises ValueError if malformed."""
+    value = request.args.get(name)
+    if value is None or value == '':
+        return None
+    value = value.lower()
+    if value in _TRUE:
+        return True
+    if value in _FALSE:
+        return False
+    raise ValueError(f"Invalid value for '{name}'. Use true or false.")
+
+
+def int_arg(name, default=None, minimum=None, maximum=None):
+    value = request.args.get(name)
+    if value is None or value == '':
+        return default
+    try:
+        value = int(value)
+    except ValueError:
+        raise ValueError(f"Invalid value for '{name}'. Must be an integer.")
+    if minimum is not None and value < minimum:
+        raise ValueError(f"Invalid value for '{name}'. Must be at least {minimum}.")
+    if maximum is not None:
+        value = min(value, maximum)
+    return value
+
+
+def datetime_arg(name, end_of_day=False):
+    """Parse an ISO 8601 date or datetime query argument. Returns None when absent.
+
+    With ``end_of_day`` a bare date (``2026-03-01``) becomes the start of the
+    following day, so callers can filter with ``<`` and include the whole day.
+    """
+    value = request.args.get(name)
+    if value is None or value == '':
+        return None
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"Invalid value for '{name}'. Use an ISO 8601 date or datetime.")
+    if end_of_day and 'T' not in value and ' ' not in value:
+        parsed += timedelta(days=1)
+    return parsed
+
+
+def like_prefix(text):
+    """Escape LIKE wildcards so user input only matches as a literal prefix."""
+    return text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+
+
+def paginate_query(query):
+    """Return (items, pagination) where pagination is None when not requested."""
+    if 'page' not in request.args and 'per_page' not in request.args:
+        return query.all(), None
+    page = int_arg('page', default=1, minimum=1)
+    per_page = int_arg('per_page', default=DEFAULT_PER_PAGE, minimum=1, maximum=MAX_PER_PAGE)
+    result = query.paginate(page=page, per_page=per_page, error_out=False)
+    return result.items, {
+        'page': result.page,
+        'per_page': result.per_page,
+        'total': result.total,
+        'pages': result.pages,
+    }
+
+
+def encode_cursor(*values):
+    return base64.urlsafe_b64encode(json.dumps(values, separators=(',', ':')).encode()).decode().rstrip('=')
+
+
+def keyset_args():
+    """Return (limit, cursor_values) for a keyset-paginated endpoint.
+
+    limit is None when the client asked for neither ``limit`` nor ``cursor``
+    (unpaginated). cursor_values is the list given to encode_cursor for the
+    last row of the previous page, or None for the first page.
+    """
+    if 'limit' not in request.args and 'cursor' not in request.args:
+        return None, None
+    limit = int_arg('limit', default=DEFAULT_PER_PAGE, minimum=1, maximum=MAX_PER_PAGE)
+    token = request.args.get('cursor')
+    if not token:
+        return limit, None
+    try:
+        values = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+    except ValueError:
+        raise ValueError("Invalid value for 'cursor'.")
+    if not isinstance(values, list):
+        raise ValueError("Invalid value for 'cursor'.")
+    return limit, values
@@ -0,0 +1,106 @@
+"""
+Part hierarchy loading for the tree endpoints.
+
+The full project tree is built from one flat query. Depth-limited trees
+(``?depth=N`` on /tree and /api/parts/<id>/subtree) walk at most N levels with
+one recursive CTE and fetch the child count of every returned node with one
+grouped query, so the frontend can show an expander on nodes whose children
+were not sent and lazy-load them through /subtree.
+
+Only assemblies are expanded, and a node is never visited twice, so corrupt
+parent cycles cannot loop.
+"""
+from collections import namedtuple
+
+from sqlalchemy import literal, select
+from sqlalchemy.orm import aliased
+
+from .models import db, Part
+
+TreeRow = namedtuple('TreeRow', 'id parent_id name type part_number')
+
+
+def load_project_rows(project_id):
+    rows = db.session.execute(
+        select(Part.id, Part.parent_id, Part.name, Part.type, Part.part_number).where(Part.project_id == project_id)
+    )
+    return [TreeRow(*row) for row in rows]
+
+
+def load_levels(start, depth):
+    """Rows matching the ``start`` condition (level 1) plus ``depth - 1`` levels
+    of children below the assemblies among them, in one recursive CTE."""
+    levels = (
+        select(Part.id, Part.parent_id, Part.name, Part.type, Part.part_number, literal(1).label('level'))
+        .where(start)
+        .cte('tree_levels', recursive=True)
+    )
+    child = aliased(Part)
+    levels = levels.union_all(
+        select(child.id, child.parent_id, child.name, child.type, child.part_number, levels.c.level + 1)
+        .join(levels, child.parent_id == levels.c.id)
+        .where(levels.c.level < depth, db.func.lower(levels.c.type) == 'assembly')
+    )
+    rows = db.session.execute(
+        select(levels.c.id, levels.c.parent_id, levels.c.name, levels.c.type, levels.c.part_number)
+        .order_by(levels.c.level)
+    )
+    # A cycle within the depth bound repeats ids; keep the shallowest occurrence
+    seen, unique = set(), []
+    for row in rows:
+        if row[0] not in seen:
+            seen.add(row[0])
+            unique.append(TreeRow(*row))
+    return unique
+
+
+def child_counts(part_ids):
+    """Map part id -> number of direct children, with one grouped query."""
+    if not part_ids:
+        return {}
+    rows = db.session.execute(
+        select(Part.parent_id, db.func.count(Part.id))
+        .where(Part.parent_id.in_(part_ids))
+        .group_by(Part.parent_id)
+    )
+    return dict(rows.all())
+
+
+def tree_node(row, child_count=None):
+    node = {
+        "name": row.name,
+        "id": str(row.id),
+        "type": row.type.lower(), # Ensure type is lowercase
+        "attributes": {
+            "part_number": row.part_number,
+        }
+    }
+    if child_count is not None:
+        node["attributes"]["child_count"] = child_count
+    return node
+
+
+def assemble_tree(rows, roots, counts=None):
+    """Nest ``rows`` below ``roots`` as react-d3-tree nodes, siblings by name.
+
+    With ``counts`` (see child_counts) every node carries ``child_count``, which
+    tells the client whether an assembly without ``children`` can be expanded.
+    """
+    children = {}
+    for row in rows:
+        children.setdefault(row.parent_id, []).append(row)
+    for siblings in children.values():
+        siblings.sort(key=lambda row: row.name)
+
+    visited = set()
+
+    def build(row):
+        visited.add(row.id)
+        node = tree_node(row, counts.get(row.id, 0) if counts is not None else None)
+        if row.type.lower() == 'assembly':
+            child_nodes = [build(child) for child in children.get(row.id, ()) if child.id not in visited]
+            if child_nodes: # Only add children key if there are processed children
+                node["children"] = child_nodes
+        return node
+
+    return [build(root) for root in sorted(roots, key=lambda row: row.name) if root.id not in visited]
@@ -0,0 +1,108 @@
+"""
+Password hashing with a configurable scheme and a bounded worker pool.
+
+PASSWORD_HASH_METHOD takes werkzeug method strings, e.g. "scrypt",
+"scrypt:16384:8:1" or "pbkdf2:sha256:600000". Hashes made with other
+parameters keep verifying, and ``User.check_password`` flags them for a
+rehash with the current method after a successful login.
+
+Hashing is deliberately slow, so it runs on a small thread pool
+(PASSWORD_HASH_WORKERS threads per process), which caps how many hashes
+compete for the CPU at once. The calling request thread still waits for
+its hash to finish, so what keeps threads free for cheap requests is the
+bound on hashes running or waiting: PASSWORD_HASH_MAX_PENDING, by default
+half of the server's request threads (SERVER_THREADS, at least one). A
+caller that finds no free slot within PASSWORD_HASH_WAIT_TIMEOUT seconds
+gets PasswordHasherBusy, which create_app turns into a 503.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app, has_app_context
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS, check_password_hash, generate_password_hash
+
+DEFAULTS = {
+    'PASSWORD_HASH_METHOD': 'scrypt',
+    'PASSWORD_HASH_WORKERS': 2,
+    'PASSWORD_HASH_MAX_PENDING': None,  # Half of SERVER_THREADS
+    'SERVER_THREADS': 1,
+    'PASSWORD_HASH_WAIT_TIMEOUT': 5.0,
+}
+
+_pool = None
+_pool_slots = None
+_pool_lock = threading.Lock()
+
+
+class PasswordHasherBusy(Exception):
+    """Too many password hashes are queued; the client should retry shortly."""
+
+
+def _config(name):
+    if has_app_context():
+        return current_app.config.get(name, DEFAULTS[name])
+    return DEFAULTS[name]
+
+
+def normalize_method(method):
+    """Spell out werkzeug's defaults so "scrypt" compares equal to "scrypt:32768:8:1"."""
+    name, *args = method.split(':')
+    if name == 'scrypt' and not args:
+        return 'scrypt:32768:8:1'
+    if name == 'pbkdf2':
+        if not args:
+            return f'pbkdf2:sha256:{DEFAULT_PBKDF2_ITERATIONS}'
+        if len(args) == 1:
+            return f'pbkdf2:{args[0]}:{DEFAULT_PBKDF2_ITERATIONS}'
+    return method
+
+
+def needs_rehash(pwhash, method=None):
+    """True if ``pwhash`` was not made with the configured method and cost."""
+    method = method or _config('PASSWORD_HASH_METHOD')
+    return pwhash.split('$', 1)[0] != normalize_method(method)
+
+
+def max_pending():
+    """How many hashes may be running or waiting in this process."""
+    configured = _config('PASSWORD_HASH_MAX_PENDING')
+    if configured not in (None, ''):
+        return max(1, int(configured))
+    return max(1, int(_config('SERVER_THREADS')) // 2)
+
+
+def _get_pool():
+    global _pool, _pool_slots
+    with _pool_lock:
+        if _pool is None:
+            workers = int(_config('PASSWORD_HASH_WORKERS'))
+            _pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hash')
+            _pool_slots = threading.BoundedSemaphore(max_pending())
+        return _pool, _pool_slots
+
+
+def _run_in_pool(fn, *args):
+    pool, slots = _get_pool()
+    if not slots.acquire(timeout=float(_config('PASSWORD_HASH_WAIT_TIMEOUT'))):
+        raise PasswordHasherBusy()
+    try:
+        return pool.submit(fn, *args).result()
+    finally:
+        slots.release()
+
+
+def hash_password(password, method=None):
+    return _run_in_pool(generate_password_hash, password, method or _config('PASSWORD_HASH_METHOD'))
+
+
+def verify_password(pwhash, password):
+    return _run_in_pool(check_password_hash, pwhash, password)
+
+
+def reset_pool():
+    """Shut the pool down so the next hash picks up changed pool settings."""
+    global _pool, _pool_slots
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=True)
+        _pool, _pool_slots = None, None
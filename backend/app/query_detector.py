@@ -0,0 +1,145 @@
+"""
+N+1 query detection for development and tests.
+
+Every SQL statement executed while a ``QueryRecorder`` is active is reduced to
+a fingerprint: literals and bind parameters become ``?`` and ``IN (...)``
+lists collapse to a single placeholder. A loop that lazy-loads one row at a
+time (``item.part`` for every order item, ``Part.query.get(part.parent_id)``
+for every part) therefore shows up as one fingerprint with a high count.
+
+Configuration (see create_app):
+    NPLUSONE_ENABLED    Record statements for every request.
+    NPLUSONE_THRESHOLD  A fingerprint may run this many times per request.
+    NPLUSONE_RAISE      Raise NPlusOneError instead of logging a warning.
+
+Tests use the ``assert_max_queries`` fixture from tests/conftest.py, which is
+built on ``QueryRecorder`` and works whether or not the request hook is on.
+"""
+import re
+import threading
+from collections import Counter
+from contextvars import ContextVar
+
+from flask import current_app, g, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+_active_recorders = ContextVar('active_query_recorders', default=())
+
+_listener_installed = False
+_listener_lock = threading.Lock()
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r'\b\d+(?:\.\d+)?\b')
+_BIND_PARAM = re.compile(r'%\(\w+\)s|%s|:\w+|\?')
+_IN_LIST = re.compile(r'\bIN\s*\(\s*(?:\?\s*,\s*)*\?\s*\)', re.IGNORECASE)
+_POSTCOMPILE = re.compile(r'\(?__\[POSTCOMPILE_\w+\]\)?')
+_WHITESPACE = re.compile(r'\s+')
+
+
+class NPlusOneError(Exception):
+    """Raised when a statement shape repeats more often than allowed."""
+
+
+def fingerprint(statement):
+    """Normalize a SQL statement so repeats that differ only in values match."""
+    statement = _STRING_LITERAL.sub('?', statement)
+    statement = _POSTCOMPILE.sub('(?)', statement)
+    statement = _BIND_PARAM.sub('?', statement)
+    statement = _NUMBER_LITERAL.sub('?', statement)
+    statement = _IN_LIST.sub('IN (?)', statement)
+    return _WHITESPACE.sub(' ', statement).strip()
+
+
+class QueryRecorder:
+    """Collects the SQL statements executed in the current context.
+
+    Usage::
+
+        with QueryRecorder() as recorder:
+            client.get('/api/orders/1')
+        recorder.count, recorder.repeated(threshold=5)
+    """
+
+    def __init__(self):
+        self.statements = []
+        self._token = None
+
+    def __enter__(self):
+        install_listener()
+        self._token = _active_recorders.set(_active_recorders.get() + (self,))
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _active_recorders.reset(self._token)
+        self._token = None
+        return False
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+    def fingerprints(self):
+        return Counter(fingerprint(statement) for statement in self.statements)
+
+    def repeated(self, threshold):
+        """Return ``[(fingerprint, count), ...]`` for shapes run more than ``threshold`` times."""
+        return [(shape, count) for shape, count in self.fingerprints().most_common() if count > threshold]
+
+    def report(self, limit=10):
+        lines = [f'{self.count} statements executed']
+        for shape, count in self.fingerprints().most_common(limit):
+            lines.append(f'  {count:>4} x {shape}')
+        return '\n'.join(lines)
+
+
+def install_listener():
+    global _listener_installed
+    with _listener_lock:
+        if _listener_installed:
+            return
+        event.listen(Engine, 'before_cursor_execute', _record_statement)
+        _listener_installed = True
+
+
+def _record_statement(conn, cursor, statement, parameters, context, executemany):
+    for recorder in _active_recorders.get():
+        recorder.statements.append(statement)
+
+
+def init_query_detector(app):
+    """Register the per-request detector if NPLUSONE_ENABLED is set. Call after config is final."""
+    if not app.config.get('NPLUSONE_ENABLED'):
+        return
+    app.before_request(_start_recording)
+    app.after_request(_check_recording)
+    app.teardown_request(_stop_recording)
+
+
+def _start_recording():
+    recorder = QueryRecorder()
+    recorder.__enter__()
+    g.query_recorder = recorder
+
+
+def _stop_recording(exc=None):
+    recorder = g.pop('query_recorder', None)
+    if recorder is not None and recorder._token is not None:
+        recorder.__exit__(None, None, None)
+
+
+def _check_recording(response):
+    recorder = g.get('query_recorder')
+    if recorder is None:
+        return response
+    threshold = int(current_app.config.get('NPLUSONE_THRESHOLD', 10))
+    repeated = recorder.repeated(threshold)
+    if not repeated:
+        return response
+
+    details = '; '.join(f'{count} x {shape}' for shape, count in repeated)
+    message = f"Possible N+1 in {request.method} {request.path} ({request.endpoint}): {details}"
+    if current_app.config.get('NPLUSONE_RAISE'):
+        raise NPlusOneError(message)
+    current_app.logger.warning(message)
+    return response
@@ -0,0 +1,186 @@
+"""
+Token-bucket rate limiting for the unauthenticated, password-hashing endpoints.
+
+Each limit is written "<requests>/<seconds>", e.g. "10/60": a bucket holds up
+to 10 tokens and refills at 10 tokens per 60 seconds. ``rate_limited(scope)``
+checks one bucket per client IP and, when the JSON body has an ``email``, one
+per email address. It responds 429 with Retry-After before the view (and so
+before any password hashing) runs.
+
+Backends (RATE_LIMIT_BACKEND):
+    memory  Per-process buckets. Each gunicorn worker enforces the limit on
+            its own, so the effective limit is multiplied by the worker count.
+    sql     Buckets in the ``rate_limit_buckets`` table, shared by all
+            workers. Uses the app database, or RATE_LIMIT_STORAGE_URI (e.g. a
+            local SQLite file) when set.
+"""
+import math
+import threading
+import time
+from functools import wraps
+
+from flask import current_app, jsonify, request
+from sqlalchemy import create_engine, insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+from .models import db, RateLimitBucket
+
+MAX_MEMORY_BUCKETS = 10000
+
+
+def parse_limit(limit):
+    """'10/60' -> (capacity 10.0, refill 10/60 tokens per second)."""
+    count, _, seconds = str(limit).partition('/')
+    capacity = float(count)
+    period = float(seconds or 1)
+    if capacity <= 0 or period <= 0:
+        raise ValueError(f"Invalid rate limit '{limit}'")
+    return capacity, capacity / period
+
+
+def _refill(tokens, updated_at, now, capacity, rate):
+    return min(capacity, tokens + max(0.0, now - updated_at) * rate)
+
+
+def _retry_after(tokens, rate, cost):
+    return max(1, math.ceil((cost - tokens) / rate))
+
+
+class MemoryBackend:
+    def __init__(self, max_buckets=MAX_MEMORY_BUCKETS):
+        self.max_buckets = max_buckets
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def consume(self, key, capacity, rate, cost=1, now=None):
+        """Take ``cost`` tokens. Returns (allowed, retry_after_seconds)."""
+        now = time.time() if now is None else now
+        with self._lock:
+            tokens, updated_at = self._buckets.get(key, (capacity, now))
+            tokens = _refill(tokens, updated_at, now, capacity, rate)
+            if tokens >= cost:
+                self._buckets[key] = (tokens - cost, now)
+                allowed, retry_after = True, 0
+            else:
+                self._buckets[key] = (tokens, now)
+                allowed, retry_after = False, _retry_after(tokens, rate, cost)
+            if len(self._buckets) > self.max_buckets:
+                self._evict(now)
+        return allowed, retry_after
+
+    def _evict(self, now):
+        # Drop the least recently touched half; they are the most likely to be full again
+        by_age = sorted(self._buckets.items(), key=lambda item: item[1][1])
+        for key, _ in by_age[:len(by_age) // 2]:
+            del self._buckets[key]
+
+    def reset(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+class SQLBackend:
+    """Shared buckets with optimistic concurrency: a bucket row is only written
+    if ``updated_at`` still holds the value that was read, otherwise retried."""
+
+    MAX_ATTEMPTS = 5
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.table = RateLimitBucket.__table__
+
+    def consume(self, key, capacity, rate, cost=1, now=None):
+        for _ in range(self.MAX_ATTEMPTS):
+            try:
+                result = self._try_consume(key, capacity, rate, cost, time.time() if now is None else now)
+            except IntegrityError:
+                result = None  # Another worker created the bucket first
+            if result is not None:
+                return result
+        # Heavy contention on one key is itself a sign of abuse
+        return False, 1
+
+    def _try_consume(self, key, capacity, rate, cost, now):
+        table = self.table
+        with self.engine.begin() as conn:
+            row = conn.execute(select(table.c.tokens, table.c.updated_at).where(table.c.key == key)).first()
+            if row is None:
+                allowed = capacity >= cost
+                conn.execute(insert(table).values(
+                    key=key, tokens=capacity - cost if allowed else capacity, updated_at=now))
+                return allowed, 0 if allowed else _retry_after(capacity, rate, cost)
+
+            tokens = _refill(row.tokens, row.updated_at, now, capacity, rate)
+            allowed = tokens >= cost
+            result = conn.execute(
+                update(table)
+                .where(table.c.key == key, table.c.updated_at == row.updated_at)
+                .values(tokens=tokens - cost if allowed else tokens, updated_at=max(now, row.updated_at))
+            )
+            if result.rowcount != 1:
+                return None
+            return allowed, 0 if allowed else _retry_after(tokens, rate, cost)
+
+    def reset(self):
+        with self.engine.begin() as conn:
+            conn.execute(self.table.delete())
+
+
+def init_rate_limiter(app):
+    """Create the configured backend. Call inside an app context once config is final."""
+    backend = app.config.get('RATE_LIMIT_BACKEND', 'memory')
+    if backend == 'memory':
+        app.extensions['rate_limiter'] = MemoryBackend()
+    elif backend == 'sql':
+        uri = app.config.get('RATE_LIMIT_STORAGE_URI')
+        if uri:
+            engine = create_engine(uri)
+            RateLimitBucket.__table__.create(engine, checkfirst=True)
+        else:
+            engine = db.engine
+        app.extensions['rate_limiter'] = SQLBackend(engine)
+    else:
+        raise ValueError(f"Unknown RATE_LIMIT_BACKEND '{backend}'")
+
+
+def client_ip():
+    """Client address, honouring X-Forwarded-For for RATE_LIMIT_TRUSTED_PROXIES hops."""
+    proxies = current_app.config.get('RATE_LIMIT_TRUSTED_PROXIES', 0)
+    route = request.access_route
+    if proxies and len(route) >= proxies:
+        return route[-proxies]
+    return request.remote_addr or 'unknown'
+
+
+def rate_limited(scope):
+    """Limit a view with the RATE_LIMIT_<SCOPE>_PER_IP / _PER_EMAIL config values."""
+    prefix = f'RATE_LIMIT_{scope.upper()}'
+
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            config = current_app.config
+            if not config.get('RATE_LIMIT_ENABLED', True):
+                return fn(*args, **kwargs)
+
+            backend = current_app.extensions['rate_limiter']
+            checks = []
+            ip_limit = config.get(f'{prefix}_PER_IP')
+            if ip_limit:
+                checks.append((f'{scope}:ip:{client_ip()}', ip_limit))
+            email_limit = config.get(f'{prefix}_PER_EMAIL')
+            data = request.get_json(silent=True)
+            email = data.get('email') if isinstance(data, dict) else None
+            if email_limit and isinstance(email, str) and email:
+                checks.append((f'{scope}:email:{email.strip().lower()}', email_limit))
+
+            for key, limit in checks:
+                allowed, retry_after = backend.consume(key, *parse_limit(limit))
+                if not allowed:
+                    current_app.logger.warning(f"Rate limit hit for {key} on {request.path}")
+                    response = jsonify(message="Error: Too many requests. Please try again later.")
+                    response.headers['Retry-After'] = str(retry_after)
+                    return response, 429
+            return fn(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,41 @@
+"""
+Per-worker lookup of machines and post-processes by name.
+
+Bulk writers (the BOM import) validate thousands of machine and post-process
+names; they resolve them through these maps instead of one query per row.
+Names are matched case-insensitively. Routes that add, rename or remove a
+machine or post-process call ``invalidate_reference_data()`` before
+committing; other workers notice through the ``reference_data`` cache
+version (see cache.py).
+"""
+from sqlalchemy import select
+
+from .cache import get_cache, register_cache
+from .models import db, Machine, PostProcess
+
+REFERENCE_CACHE = 'reference_data'
+_MODELS = {'machines': Machine, 'post_processes': PostProcess}
+
+
+def init_reference_cache(app):
+    register_cache(app, REFERENCE_CACHE, app.config.get('REFERENCE_CACHE_TTL', 300))
+
+
+def _load_ids_by_name(kind):
+    model = _MODELS[kind]
+    return {name.strip().lower(): model_id for model_id, name in db.session.execute(select(model.id, model.name))}
+
+
+def machine_ids():
+    """Map lowercased machine name -> id. Treat as read-only."""
+    return get_cache(REFERENCE_CACHE).get('machines', _load_ids_by_name)
+
+
+def post_process_ids():
+    """Map lowercased post-process name -> id. Treat as read-only."""
+    return get_cache(REFERENCE_CACHE).get('post_processes', _load_ids_by_name)
+
+
+def invalidate_reference_data():
+    """Call before committing a change to machines or post-processes."""
+    get_cache(REFERENCE_CACHE).invalidate()
@@ -0,0 +1,331 @@
+"""
+Per-assembly rollup counters over descendant parts.
+
+For every assembly, ``assembly_rollups`` holds the number of parts (type
+'part') anywhere below it and how many of those have material / a drawing;
+``assembly_status_rollups`` holds the same count per status. Assembly pages
+read one row instead of walking the subtree.
+
+The counters are maintained incrementally in the writer's transaction. A
+part's *contribution* is what its subtree adds to every ancestor: for a part,
+itself; for an assembly, its own rollup. Creating, deleting, moving or
+editing a part applies the difference in contributions to the ancestor path,
+found with one recursive CTE, using set-based UPDATEs.
+
+``rebuild_rollups`` recomputes everything from the parts table and
+``check_rollups`` reports drift without changing anything:
+
+    flask rebuild-rollups [--project-id N]
+    flask check-rollups [--project-id N]
+"""
+from sqlalchemy import and_, case, delete, insert, literal, select, update
+from sqlalchemy.orm import aliased
+
+from .models import db, AssemblyRollup, AssemblyStatusRollup, Part
+
+COUNTER_FIELDS = ('part_count', 'have_material_count', 'drawing_created_count')
+
+
+class Contribution:
+    """Counter deltas a subtree adds to each of its ancestors."""
+    __slots__ = ('part_count', 'have_material_count', 'drawing_created_count', 'statuses')
+
+    def __init__(self, part_count=0, have_material_count=0, drawing_created_count=0, statuses=None):
+        self.part_count = part_count
+        self.have_material_count = have_material_count
+        self.drawing_created_count = drawing_created_count
+        self.statuses = {status: count for status, count in (statuses or {}).items() if count}
+
+    def __sub__(self, other):
+        statuses = dict(self.statuses)
+        for status, count in other.statuses.items():
+            statuses[status] = statuses.get(status, 0) - count
+        return Contribution(*(getattr(self, f) - getattr(other, f) for f in COUNTER_FIELDS), statuses)
+
+    def __neg__(self):
+        return Contribution() - self
+
+    def __bool__(self):
+        return any(getattr(self, f) for f in COUNTER_FIELDS) or bool(self.statuses)
+
+    def __repr__(self):
+        return f'<Contribution {self.part_count}/{self.have_material_count}/{self.drawing_created_count} {self.statuses}>'
+
+
+def part_contribution(part):
+    """What ``part``'s subtree contributes to each of its ancestors."""
+    if part.type == 'part':
+        return Contribution(1, int(bool(part.have_material)), int(bool(part.drawing_created)), {part.status: 1})
+    if part.id is None:
+        return Contribution()
+    # Column reads, not ORM objects: apply_contribution updates these rows behind the identity map
+    counters = _stored_counters(part.id)
+    if counters is None:
+        return Contribution()
+    statuses = dict(db.session.execute(
+        select(AssemblyStatusRollup.status, AssemblyStatusRollup.part_count)
+        .where(AssemblyStatusRollup.assembly_id == part.id)
+    ).all())
+    return Contribution(*counters, statuses)
+
+
+def _stored_counters(assembly_id):
+    return db.session.execute(
+        select(*(getattr(AssemblyRollup, f) for f in COUNTER_FIELDS)).where(AssemblyRollup.assembly_id == assembly_id)
+    ).first()
+
+
+def ancestor_assembly_ids(part_id):
+    """Ids of ``part_id`` and all of its ancestors that are assemblies, in one
+    query. UNION (not UNION ALL) stops the recursion on corrupt parent cycles."""
+    path = (
+        select(Part.id.label('id'), Part.parent_id.label('parent_id'), Part.type.label('type'))
+        .where(Part.id == part_id)
+        .cte('ancestor_path', recursive=True)
+    )
+    parent = aliased(Part)
+    path = path.union(
+        select(parent.id, parent.parent_id, parent.type).join(path, parent.id == path.c.parent_id)
+    )
+    return db.session.scalars(select(path.c.id).where(path.c.type == 'assembly')).all()
+
+
+def apply_contribution(parent_id, contribution):
+    """Add ``contribution`` (which may be negative) to ``parent_id`` and every
+    assembly above it. The caller commits."""
+    if parent_id is None or not contribution:
+        return
+    assembly_ids = ancestor_assembly_ids(parent_id)
+    if not assembly_ids:
+        return
+
+    if any(getattr(contribution, f) for f in COUNTER_FIELDS):
+        db.session.execute(
+            update(AssemblyRollup)
+            .where(AssemblyRollup.assembly_id.in_(assembly_ids))
+            .values({getattr(AssemblyRollup, f): getattr(AssemblyRollup, f) + getattr(contribution, f)
+                     for f in COUNTER_FIELDS})
+            .execution_options(synchronize_session=False)
+        )
+
+    for status, delta in contribution.statuses.items():
+        matches = and_(AssemblyStatusRollup.assembly_id.in_(assembly_ids), AssemblyStatusRollup.status == status)
+        updated = db.session.execute(
+            update(AssemblyStatusRollup).where(matches)
+            .values(part_count=AssemblyStatusRollup.part_count + delta)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if delta > 0 and updated < len(assembly_ids):
+            existing = select(AssemblyStatusRollup.assembly_id).where(matches)
+            db.session.execute(
+                insert(AssemblyStatusRollup).from_select(
+                    ['assembly_id', 'status', 'part_count'],
+                    select(Part.id, literal(status), literal(delta))
+                    .where(Part.id.in_(assembly_ids), Part.id.not_in(existing))
+                )
+            )
+        elif delta < 0:
+            db.session.execute(
+                delete(AssemblyStatusRollup).where(matches, AssemblyStatusRollup.part_count <= 0)
+                .execution_options(synchronize_session=False)
+            )
+
+
+def record_part_created(part):
+    """Call after flushing a new part (so it has an id)."""
+    if part.type == 'assembly':
+        db.session.add(AssemblyRollup(assembly_id=part.id, project_id=part.project_id))
+    apply_contribution(part.parent_id, part_contribution(part))
+
+
+def record_part_deleted(part):
+    """Call before deleting ``part``; its own rollup rows go with it."""
+    apply_contribution(part.parent_id, -part_contribution(part))
+    if part.type == 'assembly':
+        db.session.execute(delete(AssemblyStatusRollup).where(AssemblyStatusRollup.assembly_id == part.id))
+        db.session.execute(delete(AssemblyRollup).where(AssemblyRollup.assembly_id == part.id))
+
+
+def record_subtree_created(nodes, parent_id):
+    """Call after bulk-inserting a new subtree below ``parent_id`` (None for
+    top level). ``nodes`` are ``(id, parent_id, type, status, have_material,
+    drawing_created)`` for every inserted row, the subtree root first.
+
+    The new assemblies' rollups are computed in memory and inserted in bulk;
+    the subtree's total is then added to the existing ancestors."""
+    parents = {node[0]: node[1] for node in nodes}
+    counters = {node[0]: [0, 0, 0] for node in nodes if node[2] == 'assembly'}
+    statuses = {}
+    for node_id, node_parent_id, node_type, status, have_material, drawing_created in nodes:
+        if node_type != 'part':
+            continue
+        ancestor_id = node_parent_id
+        while ancestor_id in parents:
+            totals = counters[ancestor_id]
+            totals[0] += 1
+            totals[1] += int(bool(have_material))
+            totals[2] += int(bool(drawing_created))
+            statuses[ancestor_id, status] = statuses.get((ancestor_id, status), 0) + 1
+            ancestor_id = parents[ancestor_id]
+
+    if counters:
+        project_id = db.session.scalar(select(Part.project_id).where(Part.id == nodes[0][0]))
+        db.session.execute(insert(AssemblyRollup), [
+            dict(assembly_id=assembly_id, project_id=project_id, **dict(zip(COUNTER_FIELDS, totals)))
+            for assembly_id, totals in counters.items()
+        ])
+    if statuses:
+        db.session.execute(insert(AssemblyStatusRollup), [
+            dict(assembly_id=assembly_id, status=status, part_count=count)
+            for (assembly_id, status), count in statuses.items()
+        ])
+
+    root_id, _, root_type, root_status, root_have_material, root_drawing_created = nodes[0]
+    if root_type == 'part':
+        contribution = Contribution(1, int(bool(root_have_material)), int(bool(root_drawing_created)), {root_status: 1})
+    else:
+        contribution = Contribution(*counters[root_id], {status: count for (assembly_id, status), count
+                                                         in statuses.items() if assembly_id == root_id})
+    apply_contribution(parent_id, contribution)
+
+
+def record_part_changed(part, old_parent_id, old_contribution):
+    """Call after changing parent_id, status, have_material or drawing_created,
+    with the parent and ``part_contribution`` captured before the change."""
+    new_contribution = part_contribution(part)
+    if old_parent_id == part.parent_id:
+        apply_contribution(part.parent_id, new_contribution - old_contribution)
+    else:
+        apply_contribution(old_parent_id, -old_contribution)
+        apply_contribution(part.parent_id, new_contribution)
+
+
+def _descendant_lines(project_id):
+    """Subquery of (assembly_id, status, have_material, drawing_created), one
+    row per (assembly, descendant part) pair."""
+    closure = select(Part.id.label('part_id'), Part.parent_id.label('ancestor_id')) \
+        .where(Part.type == 'part', Part.parent_id.is_not(None))
+    if project_id is not None:
+        closure = closure.where(Part.project_id == project_id)
+    closure = closure.cte('part_closure', recursive=True)
+    parent = aliased(Part)
+    closure = closure.union(
+        select(closure.c.part_id, parent.parent_id)
+        .join(parent, parent.id == closure.c.ancestor_id)
+        .where(parent.parent_id.is_not(None))
+    )
+    descendant = aliased(Part)
+    return (
+        select(closure.c.ancestor_id.label('assembly_id'), descendant.status,
+               descendant.have_material, descendant.drawing_created)
+        .join(descendant, descendant.id == closure.c.part_id)
+        .subquery('descendant_lines')
+    )
+
+
+def _expected_rollups(project_id, lines):
+    assembly = aliased(Part)
+    query = (
+        select(
+            assembly.id, assembly.project_id,
+            db.func.count(lines.c.assembly_id),
+            db.func.coalesce(db.func.sum(case((lines.c.have_material, 1), else_=0)), 0),
+            db.func.coalesce(db.func.sum(case((lines.c.drawing_created, 1), else_=0)), 0),
+        )
+        .outerjoin(lines, lines.c.assembly_id == assembly.id)
+        .where(assembly.type == 'assembly')
+        .group_by(assembly.id, assembly.project_id)
+    )
+    if project_id is not None:
+        query = query.where(assembly.project_id == project_id)
+    return query
+
+
+def _expected_statuses(project_id, lines):
+    assembly = aliased(Part)
+    query = (
+        select(lines.c.assembly_id, lines.c.status, db.func.count())
+        .join(assembly, and_(assembly.id == lines.c.assembly_id, assembly.type == 'assembly'))
+        .group_by(lines.c.assembly_id, lines.c.status)
+    )
+    if project_id is not None:
+        query = query.where(assembly.project_id == project_id)
+    return query
+
+
+def _scoped_assembly_ids(project_id):
+    return select(Part.id).where(Part.project_id == project_id, Part.type == 'assembly')
+
+
+def rebuild_rollups(project_id=None):
+    """Recompute all rollup rows (for one project, or everything) with two
+    INSERT .. SELECT statements and commit. Returns the number of assemblies."""
+    status_scope, rollup_scope = delete(AssemblyStatusRollup), delete(AssemblyRollup)
+    if project_id is not None:
+        status_scope = status_scope.where(AssemblyStatusRollup.assembly_id.in_(_scoped_assembly_ids(project_id)))
+        rollup_scope = rollup_scope.where(AssemblyRollup.project_id == project_id)
+    db.session.execute(status_scope.execution_options(synchronize_session=False))
+    db.session.execute(rollup_scope.execution_options(synchronize_session=False))
+
+    lines = _descendant_lines(project_id)
+    db.session.execute(insert(AssemblyRollup).from_select(
+        ['assembly_id', 'project_id', *COUNTER_FIELDS], _expected_rollups(project_id, lines)))
+    db.session.execute(insert(AssemblyStatusRollup).from_select(
+        ['assembly_id', 'status', 'part_count'], _expected_statuses(project_id, lines)))
+    count = select(db.func.count()).select_from(AssemblyRollup)
+    if project_id is not None:
+        count = count.where(AssemblyRollup.project_id == project_id)
+    rebuilt = db.session.scalar(count)
+    db.session.commit()
+    return rebuilt
+
+
+def check_rollups(project_id=None):
+    """Compare stored rollups with a fresh computation. Returns a list of
+    ``(assembly_id, field, stored, expected)``; empty when consistent."""
+    lines = _descendant_lines(project_id)
+    expected = {row[0]: tuple(row[2:]) for row in db.session.execute(_expected_rollups(project_id, lines))}
+    expected_statuses = {(row[0], row[1]): row[2] for row in db.session.execute(_expected_statuses(project_id, lines))}
+
+    stored_query = select(AssemblyRollup.assembly_id, *(getattr(AssemblyRollup, f) for f in COUNTER_FIELDS))
+    status_query = select(AssemblyStatusRollup.assembly_id, AssemblyStatusRollup.status, AssemblyStatusRollup.part_count) \
+        .where(AssemblyStatusRollup.part_count != 0)
+    if project_id is not None:
+        stored_query = stored_query.where(AssemblyRollup.project_id == project_id)
+        status_query = status_query.where(AssemblyStatusRollup.assembly_id.in_(_scoped_assembly_ids(project_id)))
+    stored = {row[0]: tuple(row[1:]) for row in db.session.execute(stored_query)}
+    stored_statuses = {(row[0], row[1]): row[2] for row in db.session.execute(status_query)}
+
+    problems = []
+    for assembly_id in sorted(expected.keys() | stored.keys()):
+        if assembly_id not in stored:
+            problems.append((assembly_id, 'row', None, 'missing'))
+            continue
+        if assembly_id not in expected:
+            problems.append((assembly_id, 'row', 'orphaned', None))
+            continue
+        for field, have, want in zip(COUNTER_FIELDS, stored[assembly_id], expected[assembly_id]):
+            if have != want:
+                problems.append((assembly_id, field, have, want))
+    for assembly_id, status in sorted(expected_statuses.keys() | stored_statuses.keys(), key=str):
+        have, want = stored_statuses.get((assembly_id, status), 0), expected_statuses.get((assembly_id, status), 0)
+        if have != want:
+            problems.append((assembly_id, f'status:{status}', have, want))
+    return problems
+
+
+def rollup_for(assembly_id):
+    """The stored rollup of one assembly as a dict, or None when there is no row."""
+    counters = _stored_counters(assembly_id)
+    if counters is None:
+        return None
+    statuses = db.session.execute(
+        select(AssemblyStatusRollup.status, AssemblyStatusRollup.part_count)
+        .where(AssemblyStatusRollup.assembly_id == assembly_id, AssemblyStatusRollup.part_count != 0)
+        .order_by(AssemblyStatusRollup.status)
+    ).all()
+    return {
+        'assembly_id': assembly_id,
+        **dict(zip(COUNTER_FIELDS, counters)),
+        'by_status': {status: count for status, count in statuses},
+    }
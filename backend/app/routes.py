@@ -1,21 +1,43 @@
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, Response, jsonify, request, send_file, stream_with_context
 from flask import current_app as app
 from .models import db, Project, Part, User, Order, OrderItem, RegistrationLink, Machine, PostProcess # Added Machine, PostProcess
+import csv
 from decimal import Decimal
-from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity, get_jwt # Import JWT functions
+from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt # Import JWT functions
+from .auth_tokens import issue_tokens, revoke_token, TokenAlreadyRevoked
 from .decorators import admin_required, editor_or_admin_required, readonly_or_higher_required
 from datetime import datetime
+from sqlalchemy import and_, insert, or_
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from sqlalchemy.orm import joinedload, selectinload
 from .services.airtable_service import sync_part_to_airtable, add_option_to_airtable_subsystem_field, get_airtable_table, get_airtable_select_options, add_option_via_typecast, AIRTABLE_MACHINE, AIRTABLE_POST_PROCESS # Import the Airtable service and functions
 import uuid # Ensure uuid is imported at the top if not already fully present
-
-@app.route('/api/hello')
+from .user_status import invalidate_user_status
+from .rate_limit import rate_limited
+from .order_totals import apply_total_delta, line_total
+from .services.bom_service import explode_bom
+from .services.import_service import import_bom
+from .services.export_service import EXPORT_MIMETYPES, export_formats, export_rows, stream_csv, stream_ndjson, write_xlsx
+from .services.spend_service import get_project_spend, invalidate_project_spend
+from .rollups import part_contribution, record_part_changed, record_part_created, record_part_deleted, rollup_for
+from .reference_data import invalidate_reference_data
+from .pagination import bool_arg, datetime_arg, encode_cursor, int_arg, keyset_args, like_prefix, paginate_query
+from .services.deletion_service import delete_project as delete_project_rows
+from .services.clone_service import CloneError, clone_project, clone_subtree
+from .services.hierarchy_service import MoveError, move_part
+from .part_tree import assemble_tree, child_counts, load_levels, load_project_rows
+from .columnar import negotiated_columnar_mimetype, encode_columns, encode_tree, columnar_response
+
+main_bp = Blueprint('main', __name__)
+
+@main_bp.route('/api/hello')
 @readonly_or_higher_required
 def hello_world():
     return jsonify(message="Hello from Flask Backend!")
 
 # --- Project Routes ---
 
-@app.route('/api/projects', methods=['POST'])
+@main_bp.route('/api/projects', methods=['POST'])
 @editor_or_admin_required
 def create_project():
     data = request.json
@@ -40,7 +62,7 @@ def create_project():
         'updated_at': new_project.updated_at.isoformat()
     }), 201
 
-@app.route('/api/projects', methods=['GET'])
+@main_bp.route('/api/projects', methods=['GET'])
 @readonly_or_higher_required
 def get_projects():
     projects = Project.query.all()
@@ -58,7 +80,7 @@ def get_projects():
         output.append(project_data)
     return jsonify(projects=output)
 
-@app.route('/api/projects/<int:project_id>', methods=['GET'])
+@main_bp.route('/api/projects/<int:project_id>', methods=['GET'])
 @readonly_or_higher_required
 def get_project(project_id):
     project = Project.query.get_or_404(project_id)
@@ -72,7 +94,7 @@ def get_project(project_id):
         'updated_at': project.updated_at.isoformat()
     })
 
-@app.route('/api/projects/<int:project_id>', methods=['PUT'])
+@main_bp.route('/api/projects/<int:project_id>', methods=['PUT'])
 @editor_or_admin_required
 def update_project(project_id):
     project = Project.query.get_or_404(project_id)
@@ -95,63 +117,74 @@ def update_project(project_id):
         'updated_at': project.updated_at.isoformat()
     })
 
-@app.route('/api/projects/<int:project_id>', methods=['DELETE'])
+@main_bp.route('/api/projects/<int:project_id>', methods=['DELETE'])
 @admin_required
 def delete_project(project_id):
-    project = Project.query.get_or_404(project_id)
-    db.session.delete(project)
-    db.session.commit()
-    return jsonify(message="Project deleted successfully")
+    # Parts, orders and everything referencing them go too, in committed chunks
+    Project.query.get_or_404(project_id)
+    deleted = delete_project_rows(project_id)
+    return jsonify(message="Project deleted successfully", deleted=deleted)
+
+@main_bp.route('/api/projects/<int:project_id>/clone', methods=['POST'])
+@editor_or_admin_required
+def clone_project_route(project_id):
+    """Season rollover: copy the project and all of its parts under a new
+    prefix (see services/clone_service.py). Also ``flask clone-project``."""
+    source = Project.query.get_or_404(project_id)
+    data = request.json
+    if not data or not data.get('name') or not data.get('prefix'):
+        return jsonify(message="Error: Missing name or prefix"), 400
+    if Project.query.filter_by(prefix=data['prefix']).first():
+        return jsonify(message=f"Error: Prefix {data['prefix']} is already in use"), 409
+    try:
+        project = clone_project(source, data['name'], data['prefix'], description=data.get('description'),
+                                reset_status=bool(data.get('reset_status')),
+                                reset_quantities=bool(data.get('reset_quantities')))
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify(message="Error: Generated part numbers conflict with existing parts."), 409
+    part_count = db.session.scalar(db.select(db.func.count(Part.id)).where(Part.project_id == project.id))
+    return jsonify(message="Project cloned successfully", project={
+        'id': project.id,
+        'name': project.name,
+        'prefix': project.prefix,
+        'description': project.description,
+        'hide_dashboards': project.hide_dashboards,
+        'created_at': project.created_at.isoformat(),
+        'updated_at': project.updated_at.isoformat()
+    }, part_count=part_count), 201
 
-@app.route('/api/projects/<int:project_id>/tree', methods=['GET'])
+@main_bp.route('/api/projects/<int:project_id>/tree', methods=['GET'])
 @readonly_or_higher_required
 def get_project_tree(project_id):
+    # Optional ?depth=N: only N levels below the project, each node with a child_count
     project = Project.query.get_or_404(project_id)
+    try:
+        depth = int_arg('depth', minimum=1)
+    except ValueError as e:
+        return jsonify(message=f"Error: {e}"), 400
 
-    memo = {} # Memoization cache for part nodes
-
-    def format_part_node(part):
-        if part.id in memo:
-            return memo[part.id]
-
-        node = {
-            "name": part.name,
-            "id": str(part.id),
-            "type": part.type.lower(), # Ensure type is lowercase
-            "attributes": {
-                "part_number": part.part_number,
-                # Add other relevant part attributes if needed
-                # "description": part.description,
-                # "status": part.status,
-            }
-        }
-
-        if part.type.lower() == 'assembly':
-            children_parts = part.children.order_by(Part.name).all() # Fetch and order children
-            if children_parts:
-                children_nodes = []
-                for child_part in children_parts:
-                    # Basic cycle detection: if child is already being processed higher up, skip
-                    # This simple check might not cover all complex cycle scenarios in data
-                    # but helps prevent infinite recursion for direct parent-child cycles.
-                    # For robust cycle detection, a path tracking mechanism would be needed.
-                    # However, react-d3-tree itself might have issues with cyclic data.
-                    # For now, we assume data is mostly tree-like.
-                    if child_part.id not in memo: # Check if child is not already processed (simple cycle check)
-                         children_nodes.append(format_part_node(child_part))
-                if children_nodes: # Only add children key if there are processed children
-                    node["children"] = children_nodes
-
-        memo[part.id] = node
-        return node
-
-    # Fetch top-level parts/assemblies for the project (those with no parent_id)
-    # Order them by name for consistent tree structure
-    top_level_parts = Part.query.filter_by(project_id=project.id, parent_id=None).order_by(Part.name).all()
-
-    tree_children = []
-    for p in top_level_parts:
-        tree_children.append(format_part_node(p))
+    if depth is None:
+        rows = load_project_rows(project.id)
+        counts = None
+    else:
+        rows = load_levels(and_(Part.project_id == project.id, Part.parent_id.is_(None)), depth)
+        counts = child_counts([row.id for row in rows])
+
+    columnar_mimetype = negotiated_columnar_mimetype()
+    if columnar_mimetype:
+        columns = ('name', 'type', 'part_number')
+        nodes = rows
+        if counts is not None:
+            columns += ('child_count',)
+            nodes = [tuple(row) + (counts.get(row.id, 0),) for row in rows]
+        payload = encode_tree(nodes, columns, dictionary_columns=('type',), sort_key=lambda node: node[2])
+        payload['project'] = {'id': project.id, 'name': project.name, 'prefix': project.prefix,
+                              'description': project.description}
+        return columnar_response(payload, columnar_mimetype)
+
+    # Top-level parts/assemblies for the project are those with no parent_id
+    top_level_rows = [row for row in rows if row.parent_id is None]
 
     return jsonify({
         "name": project.name,
@@ -162,12 +195,77 @@ def get_project_tree(project_id):
             "description": project.description,
             # "created_at": project.created_at.isoformat() # Example of another attribute
         },
-        "children": tree_children
+        "children": assemble_tree(rows, top_level_rows, counts)
     })
 
+@main_bp.route('/api/projects/<int:project_id>/spend', methods=['GET'])
+@admin_required # Same audience as the order list
+def get_project_spend_summary(project_id):
+    """Order spend for the project's parts by month and by assembly (rolled up),
+    split by reimbursed. See services/spend_service.py."""
+    Project.query.get_or_404(project_id)
+    return jsonify(get_project_spend(project_id))
+
+@main_bp.route('/api/projects/<int:project_id>/bom', methods=['GET'])
+@readonly_or_higher_required
+def get_project_bom(project_id):
+    """Exploded BOM: quantity to make of every part for one robot, plus totals
+    per machine and raw material. See services/bom_service.py."""
+    Project.query.get_or_404(project_id)
+    return jsonify(explode_bom(project_id))
+
+@main_bp.route('/api/projects/<int:project_id>/export', methods=['GET'])
+@readonly_or_higher_required
+def export_project(project_id):
+    """Download every part with breadcrumb, machine, post-processes and exploded
+    quantity. ?format=csv (default), ndjson or xlsx; see services/export_service.py."""
+    project = Project.query.get_or_404(project_id)
+    export_format = request.args.get('format', 'csv').lower()
+    if export_format not in export_formats():
+        return jsonify(message=f"Error: Unsupported format '{export_format}'. Use one of: {', '.join(export_formats())}"), 400
+    download_name = f"{project.prefix or project.id}-bom.{export_format}"
+    mimetype = EXPORT_MIMETYPES[export_format]
+    if export_format == 'xlsx':
+        return send_file(write_xlsx(export_rows(project_id), title=project.name), mimetype=mimetype,
+                         as_attachment=True, download_name=download_name)
+    stream = stream_csv if export_format == 'csv' else stream_ndjson
+    response = Response(stream_with_context(stream(export_rows(project_id))), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename="{download_name}"'
+    return response
+
+@main_bp.route('/api/projects/<int:project_id>/import', methods=['POST'])
+@editor_or_admin_required
+def import_project_bom(project_id):
+    """Import a CSV BOM (our export or an Onshape BOM) uploaded as ``file``.
+    ?dry_run=true validates without writing. Bad rows are reported and
+    skipped; see services/import_service.py."""
+    project = Project.query.get_or_404(project_id)
+    try:
+        dry_run = bool_arg('dry_run') or False
+    except ValueError as e:
+        return jsonify(message=f"Error: {e}"), 400
+    upload = request.files.get('file')
+    if upload is None:
+        return jsonify(message="Error: Upload the BOM as a 'file' form field"), 400
+    try:
+        report = import_bom(project, upload.stream, dry_run=dry_run)
+    except (UnicodeDecodeError, csv.Error):
+        db.session.rollback()
+        return jsonify(message="Error: The file is not UTF-8 encoded CSV"), 400
+    except IntegrityError:
+        # A concurrent create_part or import took one of the generated part numbers
+        db.session.rollback()
+        return jsonify(message="Error: Generated part numbers conflict with existing parts. Nothing was imported; "
+                               "try again."), 409
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        app.logger.error(f"BOM import into project {project_id} failed: {e}", exc_info=True)
+        return jsonify(message="Error: The import failed. Nothing was imported."), 500
+    return jsonify(report=report), 200 if dry_run else 201
+
 # --- Part Routes ---
 
-@app.route('/api/parts', methods=['POST'])
+@main_bp.route('/api/parts', methods=['POST'])
 @editor_or_admin_required
 def create_part():
     data = request.json
@@ -428,6 +526,8 @@ def create_part():
             new_part.post_processes.append(pp)
 
     db.session.add(new_part)
+    db.session.flush()
+    record_part_created(new_part)
     db.session.commit()
 
     # Logic for adding certain assembly names to Airtable "Subsystem" field options
@@ -517,13 +617,13 @@ def create_part():
     return jsonify(message="Part created successfully", part=part_data_response), 201
 
 # --- Machine Routes ---
-@app.route('/api/machines', methods=['GET'])
+@main_bp.route('/api/machines', methods=['GET'])
 @readonly_or_higher_required
 def get_machines():
     machines = Machine.query.all()
     return jsonify(machines=[{'id': m.id, 'name': m.name} for m in machines])
 
-@app.route('/api/machines/airtable-options', methods=['GET'])
+@main_bp.route('/api/machines/airtable-options', methods=['GET'])
 @readonly_or_higher_required
 def get_machine_airtable_options():
     """Get machine options from Airtable"""
@@ -538,7 +638,7 @@ def get_machine_airtable_options():
         app.logger.error(f"Error fetching machine options from Airtable: {e}")
         return jsonify(message=f"Error: {str(e)}", options=[]), 500
 
-@app.route('/api/machines', methods=['POST'])
+@main_bp.route('/api/machines', methods=['POST'])
 @editor_or_admin_required
 def create_machine():
     data = request.get_json()
@@ -559,6 +659,7 @@ def create_machine():
     db.session.add(new_machine)
 
     try:
+        invalidate_reference_data()
         db.session.commit()
         return jsonify(message="Machine created successfully", machine={'id': new_machine.id, 'name': new_machine.name}), 201
     except Exception as e:
@@ -566,7 +667,7 @@ def create_machine():
         app.logger.error(f"Error creating machine: {str(e)}")
         return jsonify(message=f"Error creating machine: {str(e)}"), 500
 
-@app.route('/api/machines/<int:machine_id>', methods=['DELETE'])
+@main_bp.route('/api/machines/<int:machine_id>', methods=['DELETE'])
 @editor_or_admin_required
 def delete_machine(machine_id):
     machine = Machine.query.get_or_404(machine_id)
@@ -577,6 +678,7 @@ def delete_machine(machine_id):
 
     try:
         db.session.delete(machine)
+        invalidate_reference_data()
         db.session.commit()
         return jsonify(message=f"Machine '{machine.name}' deleted successfully"), 200
     except Exception as e:
@@ -584,7 +686,7 @@ def delete_machine(machine_id):
         app.logger.error(f"Error deleting machine: {str(e)}")
         return jsonify(message=f"Error deleting machine: {str(e)}"), 500
 
-@app.route('/api/machines/sync-with-airtable', methods=['POST'])
+@main_bp.route('/api/machines/sync-with-airtable', methods=['POST'])
 @editor_or_admin_required
 def sync_machines_with_airtable():
     """Sync machine options between Airtable and the database"""
@@ -617,6 +719,8 @@ def sync_machines_with_airtable():
                 if result:
                     new_airtable_options.append(machine.name)
 
+        if new_machines:
+            invalidate_reference_data()
         db.session.commit()
 
         return jsonify(
@@ -630,13 +734,13 @@ def sync_machines_with_airtable():
         return jsonify(message=f"Error: {str(e)}"), 500
 
 # --- PostProcess Routes ---
-@app.route('/api/post-processes', methods=['GET'])
+@main_bp.route('/api/post-processes', methods=['GET'])
 @readonly_or_higher_required
 def get_post_processes():
     post_processes = PostProcess.query.all()
     return jsonify(post_processes=[{'id': p.id, 'name': p.name} for p in post_processes])
 
-@app.route('/api/post-processes/airtable-options', methods=['GET'])
+@main_bp.route('/api/post-processes/airtable-options', methods=['GET'])
 @readonly_or_higher_required
 def get_post_process_airtable_options():
     """Get post process options from Airtable"""
@@ -651,7 +755,7 @@ def get_post_process_airtable_options():
         app.logger.error(f"Error fetching post process options from Airtable: {e}")
         return jsonify(message=f"Error: {str(e)}", options=[]), 500
 
-@app.route('/api/post-processes', methods=['POST'])
+@main_bp.route('/api/post-processes', methods=['POST'])
 @editor_or_admin_required
 def create_post_process():
     data = request.get_json()
@@ -672,6 +776,7 @@ def create_post_process():
     db.session.add(new_post_process)
 
     try:
+        invalidate_reference_data()
         db.session.commit()
         return jsonify(message="Post process created successfully", post_process={'id': new_post_process.id, 'name': new_post_process.name}), 201
     except Exception as e:
@@ -679,7 +784,7 @@ def create_post_process():
         app.logger.error(f"Error creating post process: {str(e)}")
         return jsonify(message=f"Error creating post process: {str(e)}"), 500
 
-@app.route('/api/post-processes/<int:post_process_id>', methods=['DELETE'])
+@main_bp.route('/api/post-processes/<int:post_process_id>', methods=['DELETE'])
 @editor_or_admin_required
 def delete_post_process(post_process_id):
     post_process = PostProcess.query.get_or_404(post_process_id)
@@ -690,6 +795,7 @@ def delete_post_process(post_process_id):
 
     try:
         db.session.delete(post_process)
+        invalidate_reference_data()
         db.session.commit()
         return jsonify(message=f"Post process '{post_process.name}' deleted successfully"), 200
     except Exception as e:
@@ -697,7 +803,7 @@ def delete_post_process(post_process_id):
         app.logger.error(f"Error deleting post process: {str(e)}")
         return jsonify(message=f"Error deleting post process: {str(e)}"), 500
 
-@app.route('/api/post-processes/sync-with-airtable', methods=['POST'])
+@main_bp.route('/api/post-processes/sync-with-airtable', methods=['POST'])
 @editor_or_admin_required
 def sync_post_processes_with_airtable():
     """Sync post process options between Airtable and the database"""
@@ -730,6 +836,8 @@ def sync_post_processes_with_airtable():
                 if result:
                     new_airtable_options.append(post_process.name)
 
+        if new_post_processes:
+            invalidate_reference_data()
         db.session.commit()
 
         return jsonify(
@@ -743,14 +851,14 @@ def sync_post_processes_with_airtable():
         return jsonify(message=f"Error: {str(e)}"), 500
 
 # --- Project Specific Assemblies ---
-@app.route('/api/projects/<int:project_id>/assemblies', methods=['GET'])
+@main_bp.route('/api/projects/<int:project_id>/assemblies', methods=['GET'])
 @readonly_or_higher_required
 def get_project_assemblies(project_id):
     project = Project.query.get_or_404(project_id)
     assemblies = Part.query.filter_by(project_id=project.id, type='assembly').order_by(Part.name).all()
     return jsonify(assemblies=[{'id': a.id, 'name': a.name, 'part_number': a.part_number} for a in assemblies])
 
-@app.route('/api/parts/derived-hierarchy-info', methods=['GET'])
+@main_bp.route('/api/parts/derived-hierarchy-info', methods=['GET'])
 @readonly_or_higher_required
 def get_derived_hierarchy_info():
     parent_assembly_id_str = request.args.get('parent_assembly_id')
@@ -852,7 +960,15 @@ def get_derived_hierarchy_info():
         "derived_subsystem_name": derived_subsystem_name
     }), 200
 
-@app.route('/api/parts', methods=['GET'])
+def _parent_part_numbers(parts):
+    """Map parent_id -> part_number for the given parts with one query."""
+    parent_ids = {part.parent_id for part in parts if part.parent_id}
+    if not parent_ids:
+        return {}
+    rows = db.session.query(Part.id, Part.part_number).filter(Part.id.in_(parent_ids))
+    return {part_id: part_number for part_id, part_number in rows}
+
+@main_bp.route('/api/parts', methods=['GET'])
 @readonly_or_higher_required
 def get_parts():
     query = Part.query
@@ -866,6 +982,7 @@ def get_parts():
             return jsonify(message="Error: Invalid parent_id format. Must be an integer."), 400
 
     parts = query.all()
+    parent_part_numbers = _parent_part_numbers(parts)
     output = []
     for part in parts:
         part_data = {
@@ -892,19 +1009,37 @@ def get_parts():
             'created_at': part.created_at.isoformat(),
             'updated_at': part.updated_at.isoformat()
         }
-        # Optionally, fetch and add parent part number if parent_id exists
+        # Optionally, add parent part number if parent_id exists
         if part.parent_id:
-            parent = Part.query.get(part.parent_id)
-            if parent:
-                part_data['parent_part_number'] = parent.part_number
+            parent_part_number = parent_part_numbers.get(part.parent_id)
+            if parent_part_number:
+                part_data['parent_part_number'] = parent_part_number
         output.append(part_data)
     return jsonify(parts=output)
 
-@app.route('/api/projects/<int:project_id>/parts', methods=['GET'])
+@main_bp.route('/api/projects/<int:project_id>/parts', methods=['GET'])
 @readonly_or_higher_required
 def get_parts_for_project(project_id):
     project = Project.query.get_or_404(project_id)
+
+    columnar_mimetype = negotiated_columnar_mimetype()
+    if columnar_mimetype:
+        rows = db.session.query(
+            Part.id, Part.numeric_id, Part.part_number, Part.name, Part.type, Part.parent_id,
+            Part.status, Part.quantity, Part.priority, Part.have_material, Part.drawing_created,
+            Machine.name, Part.raw_material
+        ).outerjoin(Machine, Part.machine_id == Machine.id) \
+         .filter(Part.project_id == project.id).order_by(Part.id)
+        payload = encode_columns(
+            rows,
+            ('id', 'numeric_id', 'part_number', 'name', 'type', 'parent_id', 'status', 'quantity',
+             'priority', 'have_material', 'drawing_created', 'machine', 'raw_material'),
+            dictionary_columns=('type', 'status', 'machine', 'raw_material')
+        )
+        return columnar_response(payload, columnar_mimetype)
+
     parts = Part.query.filter_by(project_id=project_id).all()
+    parent_part_numbers = _parent_part_numbers(parts)
     output = []
     for part in parts:
         part_data = {
@@ -931,15 +1066,15 @@ def get_parts_for_project(project_id):
             'created_at': part.created_at.isoformat(),
             'updated_at': part.updated_at.isoformat()
         }
-        # Optionally, fetch and add parent part number if parent_id exists
+        # Optionally, add parent part number if parent_id exists
         if part.parent_id:
-            parent = Part.query.get(part.parent_id)
-            if parent:
-                part_data['parent_part_number'] = parent.part_number
+            parent_part_number = parent_part_numbers.get(part.parent_id)
+            if parent_part_number:
+                part_data['parent_part_number'] = parent_part_number
         output.append(part_data)
     return jsonify(parts=output)
 
-@app.route('/api/parts/<int:part_id>', methods=['GET'])
+@main_bp.route('/api/parts/<int:part_id>', methods=['GET'])
 @readonly_or_higher_required
 def get_part(part_id):
     part = Part.query.get_or_404(part_id)
@@ -997,15 +1132,27 @@ def get_part(part_id):
 
     return jsonify(part=part_data_response)
 
-@app.route('/api/parts/<int:part_id>', methods=['PUT'])
+@main_bp.route('/api/parts/<int:part_id>', methods=['PUT'])
 @editor_or_admin_required
 def update_part(part_id):
     part = Part.query.get_or_404(part_id)
     data = request.json
     if not data:
         return jsonify(message="Error: No input data provided"), 400
+    # Reparenting goes through move_part so the subtree's subteam/subsystem follow
+    if 'parent_id' in data and data['parent_id'] != part.parent_id:
+        try:
+            move_part(part, data['parent_id'])
+        except MoveError as e:
+            db.session.rollback()
+            return jsonify(message=e.message), e.status
+        invalidate_project_spend() # Spend by assembly follows the hierarchy
+    # Ancestor rollups change when a part's counted fields change
+    rollup_snapshot = (part.parent_id, part_contribution(part)) if part.type == 'part' else None
 
     # Standard fields
+    if part.type == 'assembly' and data.get('name', part.name) != part.name:
+        invalidate_project_spend() # Spend by assembly carries assembly names
     part.name = data.get('name', part.name)
     part.description = data.get('description', part.description) # Used for Airtable Notes
     part.material = data.get('material', part.material)
@@ -1073,21 +1220,8 @@ def update_part(part_id):
                  return jsonify(message=f"Error: Subsystem part must be an assembly."), 400
             part.subsystem_id = data['subsystem_id']
 
-    # Parent ID change logic (existing)
-    if 'parent_id' in data:
-        new_parent_id = data['parent_id']
-        if new_parent_id is not None:
-            if new_parent_id == part.id: 
-                 return jsonify(message="Error: Part cannot be its own parent."), 400
-            parent_part = Part.query.get(new_parent_id)
-            if not parent_part:
-                return jsonify(message=f"Error: New parent part with id {new_parent_id} not found"), 404
-            if parent_part.project_id != part.project_id:
-                 return jsonify(message="Error: New parent part must belong to the same project."), 400
-            part.parent_id = new_parent_id
-        else: 
-            part.parent_id = None
-
+    if rollup_snapshot is not None:
+        record_part_changed(part, *rollup_snapshot)
     db.session.commit()
 
     # Re-fetch machine and post-processes for the response after commit
@@ -1138,20 +1272,103 @@ def update_part(part_id):
 
     return jsonify(message="Part updated successfully", part=part_data_response)
 
-@app.route('/api/parts/<int:part_id>', methods=['DELETE'])
+@main_bp.route('/api/parts/<int:part_id>/subtree', methods=['GET'])
+@readonly_or_higher_required
+def get_part_subtree(part_id):
+    """Tree node for one part with ?depth=N (default 1) levels of children, for
+    lazily expanding /tree. Every node carries attributes.child_count."""
+    Part.query.get_or_404(part_id)
+    try:
+        depth = int_arg('depth', default=1, minimum=0)
+    except ValueError as e:
+        return jsonify(message=f"Error: {e}"), 400
+    rows = load_levels(Part.id == part_id, depth + 1)
+    counts = child_counts([row.id for row in rows])
+    root = next(row for row in rows if row.id == part_id)
+    return jsonify(assemble_tree(rows, [root], counts)[0])
+
+@main_bp.route('/api/parts/<int:part_id>/move', methods=['POST'])
+@editor_or_admin_required
+def move_part_route(part_id):
+    """Reparent a part and recompute subteam/subsystem for it and everything
+    below it, in one transaction (see services/hierarchy_service.py)."""
+    part = Part.query.get_or_404(part_id)
+    data = request.json
+    if not data or 'parent_id' not in data:
+        return jsonify(message="Error: 'parent_id' is required"), 400
+    new_parent_id = data['parent_id']
+    if new_parent_id is not None and (isinstance(new_parent_id, bool) or not isinstance(new_parent_id, int)):
+        return jsonify(message="Error: 'parent_id' must be an integer or null"), 400
+    try:
+        moved = move_part(part, new_parent_id)
+    except MoveError as e:
+        db.session.rollback()
+        return jsonify(message=e.message), e.status
+    invalidate_project_spend()
+    db.session.commit()
+    return jsonify(
+        message="Part moved successfully",
+        part={'id': part.id, 'parent_id': part.parent_id, 'subteam_id': part.subteam_id, 'subsystem_id': part.subsystem_id},
+        moved_count=moved,
+    ), 200
+
+@main_bp.route('/api/parts/<int:part_id>/clone', methods=['POST'])
+@editor_or_admin_required
+def clone_part_route(part_id):
+    """Copy a part or assembly subtree below another assembly (or to the top
+    level of a project) with fresh part numbers (see services/clone_service.py)."""
+    Part.query.get_or_404(part_id)
+    data = request.json or {}
+    for key in ('parent_id', 'project_id'):
+        value = data.get(key)
+        if value is not None and (isinstance(value, bool) or not isinstance(value, int)):
+            return jsonify(message=f"Error: '{key}' must be an integer or null"), 400
+    try:
+        new_id, cloned = clone_subtree(part_id, data.get('parent_id'), data.get('project_id'))
+    except CloneError as e:
+        db.session.rollback()
+        return jsonify(message=e.message), e.status
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify(message="Error: Generated part numbers conflict with existing parts."), 409
+    db.session.commit()
+    root = db.session.get(Part, new_id)
+    return jsonify(
+        message="Part cloned successfully",
+        part={'id': root.id, 'part_number': root.part_number, 'numeric_id': root.numeric_id,
+              'project_id': root.project_id, 'parent_id': root.parent_id},
+        cloned_count=cloned,
+    ), 201
+
+@main_bp.route('/api/parts/<int:part_id>/rollup', methods=['GET'])
+@readonly_or_higher_required
+def get_part_rollup(part_id):
+    """Counts of the parts anywhere below an assembly, by status and by
+    have_material/drawing_created (maintained in rollups.py)."""
+    part = Part.query.get_or_404(part_id)
+    if part.type != 'assembly':
+        return jsonify(message="Error: Rollups are only kept for assemblies"), 400
+    rollup = rollup_for(part.id)
+    if rollup is None:
+        return jsonify(message="Error: No rollup for this assembly yet. Run 'flask rebuild-rollups'."), 404
+    return jsonify(rollup=rollup)
+
+@main_bp.route('/api/parts/<int:part_id>', methods=['DELETE'])
 @admin_required
 def delete_part(part_id):
     part = Part.query.get_or_404(part_id)
     # Check if the part is an assembly and has children
     if part.type == 'assembly' and part.children.first(): # Assuming 'children' is the backref relationship
         return jsonify(message="Error: Cannot delete assembly that has child parts. Please delete or reassign child parts first."), 400
+    record_part_deleted(part)
     db.session.delete(part)
     db.session.commit()
     return jsonify(message="Part deleted successfully")
 
 # --- User Routes ---
 
-@app.route('/api/register', methods=['POST'])
+@main_bp.route('/api/register', methods=['POST'])
+@rate_limited('register')
 def register_user():
     data = request.json
     required_fields = ['username', 'email', 'password', 'first_name', 'last_name']
@@ -1191,7 +1408,7 @@ def register_user():
     }
     return jsonify(message="User registered successfully. Account is pending admin approval.", user=user_data), 201
 
-@app.route('/api/admin/users', methods=['POST'])
+@main_bp.route('/api/admin/users', methods=['POST'])
 @admin_required
 def admin_create_user():
     data = request.json
@@ -1232,7 +1449,8 @@ def admin_create_user():
     }
     return jsonify(message="User created successfully by admin.", user=user_data), 201
 
-@app.route('/api/login', methods=['POST'])
+@main_bp.route('/api/login', methods=['POST'])
+@rate_limited('login')
 def login():
     app.logger.debug(f"Login attempt: headers: {request.headers}")
     app.logger.debug(f"Login attempt: is_json: {request.is_json}")
@@ -1260,6 +1478,11 @@ def login():
         app.logger.warning(f"Failed login attempt for email: {data['email']}") # Changed to log email
         return jsonify(message="Error: Invalid credentials"), 401
 
+    if user.password_needs_rehash():
+        # Upgrade the stored hash to the configured method/cost while we have the plaintext
+        user.set_password(data['password'])
+        db.session.commit()
+
     if not user.enabled:
         app.logger.warning(f"Login attempt for disabled user with email: {data['email']}") # Changed to log email
         return jsonify(message="Error: Account disabled"), 403
@@ -1268,18 +1491,12 @@ def login():
         app.logger.warning(f"Login attempt for not approved user with email: {data['email']}")
         return jsonify(message="Error: Account not approved"), 403
 
-    # The main identity for the 'sub' claim should be a string (e.g., user.id as string).
-    # Additional user details go into additional_claims.
-    user_claims = {
-        "username": user.username, # Keep user.username here for claims, it might be different from email
-        "permission": user.permission,
-        "enabled": user.enabled,
-        "is_approved": user.is_approved
-    }
-    access_token = create_access_token(identity=str(user.id), additional_claims=user_claims)
+    # The main identity for the 'sub' claim is user.id as a string; user details go into additional claims.
+    # The refresh token lets the client renew via /api/token/refresh without another password hash.
+    access_token, refresh_token = issue_tokens(user)
 
     app.logger.info(f"User with email {data['email']} (username: {user.username}) logged in successfully.") # Enhanced log
-    return jsonify(access_token=access_token, user = {
+    return jsonify(access_token=access_token, refresh_token=refresh_token, user = {
         "id": user.id,
         "username": user.username,
         "first_name": user.first_name,
@@ -1290,30 +1507,104 @@ def login():
         "is_approved": user.is_approved
     }), 200
 
+@main_bp.route('/api/token/refresh', methods=['POST'])
+@jwt_required(refresh=True)
+def refresh_token():
+    jwt_payload = get_jwt()
+    user = db.session.get(User, int(jwt_payload['sub']))
+    if not user:
+        return jsonify(message="Error: User not found"), 401
+    if not user.enabled:
+        return jsonify(message="Error: Account disabled"), 403
+    if not user.is_approved:
+        return jsonify(message="Error: Account not approved"), 403
+
+    # Rotate: the presented refresh token can be used exactly once
+    try:
+        revoke_token(jwt_payload)
+    except TokenAlreadyRevoked:
+        app.logger.warning(f"Refresh token reuse for user id {user.id}")
+        return jsonify(message="Error: Refresh token has already been used"), 401
+
+    access_token, new_refresh_token = issue_tokens(user)
+    return jsonify(access_token=access_token, refresh_token=new_refresh_token), 200
+
+@main_bp.route('/api/logout', methods=['POST'])
+@jwt_required(refresh=True)
+def logout():
+    try:
+        revoke_token(get_jwt())
+    except TokenAlreadyRevoked:
+        pass # Already logged out
+    return jsonify(message="Logged out successfully"), 200
+
 # Basic CRUD for Users (would typically be admin-protected)
-@app.route('/api/users', methods=['GET'])
+def _user_list_item(user):
+    return {
+        'id': user.id,
+        'username': user.username,
+        'email': user.email,
+        'first_name': user.first_name,
+        'last_name': user.last_name,
+        'permission': user.permission,
+        'enabled': user.enabled,
+        'is_approved': user.is_approved, # Add is_approved
+        'requested_at': user.requested_at.isoformat() if user.requested_at else None, # Add requested_at
+        'created_at': user.created_at.isoformat(),
+        'updated_at': user.updated_at.isoformat()
+    }
+
+@main_bp.route('/api/users', methods=['GET'])
 @admin_required
 def get_users():
-    users = User.query.all()
-    output = []
-    for user in users:
-        user_data = {
-            'id': user.id,
-            'username': user.username,
-            'email': user.email,
-            'first_name': user.first_name,
-            'last_name': user.last_name,
-            'permission': user.permission,
-            'enabled': user.enabled,
-            'is_approved': user.is_approved, # Add is_approved
-            'requested_at': user.requested_at.isoformat() if user.requested_at else None, # Add requested_at
-            'created_at': user.created_at.isoformat(),
-            'updated_at': user.updated_at.isoformat()
-        }
-        output.append(user_data)
-    return jsonify(users=output)
+    # Optional filters: is_approved, enabled, permission, q (prefix of username/email/first/last name)
+    # Paginated when page/per_page are given, see pagination.py
+    query = User.query
+    try:
+        is_approved = bool_arg('is_approved')
+        enabled = bool_arg('enabled')
+    except ValueError as e:
+        return jsonify(message=f"Error: {e}"), 400
+    if is_approved is not None:
+        query = query.filter(User.is_approved == is_approved)
+    if enabled is not None:
+        query = query.filter(User.enabled == enabled)
+    if request.args.get('permission'):
+        query = query.filter(User.permission == request.args['permission'])
+    search = request.args.get('q', '').strip()
+    if search:
+        pattern = like_prefix(search)
+        query = query.filter(or_(
+            User.username.like(pattern, escape='\\'),
+            User.email.like(pattern, escape='\\'),
+            User.first_name.like(pattern, escape='\\'),
+            User.last_name.like(pattern, escape='\\'),
+        ))
+
+    try:
+        users, pagination = paginate_query(query.order_by(User.id))
+    except ValueError as e:
+        return jsonify(message=f"Error: {e}"), 400
+    output = [_user_list_item(user) for user in users]
+    if pagination is None:
+        return jsonify(users=output)
+    return jsonify(users=output, pagination=pagination)
+
+@main_bp.route('/api/users/pending', methods=['GET'])
+@admin_required
+def get_pending_users():
+    """Approval queue, oldest request first (served by the is_approved/requested_at index)."""
+    query = User.query.filter(User.is_approved == False).order_by(User.requested_at, User.id)
+    try:
+        users, pagination = paginate_query(query)
+    except ValueError as e:
+        return jsonify(message=f"Error: {e}"), 400
+    output = [_user_list_item(user) for user in users]
+    if pagination is None:
+        return jsonify(users=output)
+    return jsonify(users=output, pagination=pagination)
 
-@app.route('/api/users/<int:user_id>', methods=['GET'])
+@main_bp.route('/api/users/<int:user_id>', methods=['GET'])
 @jwt_required() # Keep @jwt_required for identity, decorator handles specific logic
 def get_user(user_id):
     # current_user_jwt = get_jwt_identity() # Incorrect: returns only the identity (sub)
@@ -1350,7 +1641,7 @@ def get_user(user_id):
     else:
         return jsonify(message="Forbidden: You cannot access this user's information."), 403
 
-@app.route('/api/users/<int:user_id>', methods=['PUT'])
+@main_bp.route('/api/users/<int:user_id>', methods=['PUT'])
 @jwt_required() # Keep @jwt_required for identity, decorator handles specific logic
 def update_user(user_id):
     # current_user_jwt = get_jwt_identity() # Incorrect
@@ -1395,10 +1686,11 @@ def update_user(user_id):
     if 'password' in data and data['password']:
         user_to_update.set_password(data['password'])
 
+    invalidate_user_status()
     db.session.commit()
     return jsonify(message="User updated successfully", user=user_to_update.to_dict()), 200
 
-@app.route('/api/users/<int:user_id>/approve', methods=['POST'])
+@main_bp.route('/api/users/<int:user_id>/approve', methods=['POST'])
 @admin_required
 def approve_user(user_id):
     user_to_approve = User.query.get_or_404(user_id)
@@ -1409,6 +1701,7 @@ def approve_user(user_id):
     user_to_approve.is_approved = True
     user_to_approve.enabled = True # Also enable the user upon approval
     # user_to_approve.requested_at = None # Optionally clear requested_at or leave as is for record
+    invalidate_user_status()
     db.session.commit()
 
     user_data = {
@@ -1422,7 +1715,7 @@ def approve_user(user_id):
     }
     return jsonify(message="User approved successfully.", user=user_data), 200
 
-@app.route('/api/users/<int:user_id>/change-password', methods=['PUT'])
+@main_bp.route('/api/users/<int:user_id>/change-password', methods=['PUT'])
 @jwt_required() # Keep @jwt_required, logic inside handles permissions
 def change_user_password(user_id):
     current_user_jwt = get_jwt_identity()
@@ -1448,7 +1741,7 @@ def change_user_password(user_id):
     db.session.commit()
     return jsonify(message="Password updated successfully")
 
-@app.route('/api/users/<int:user_id>', methods=['DELETE'])
+@main_bp.route('/api/users/<int:user_id>', methods=['DELETE'])
 @admin_required
 def delete_user(user_id):
     current_user_jwt_payload = get_jwt() # Changed to get_jwt() to get the full payload
@@ -1458,12 +1751,13 @@ def delete_user(user_id):
         return jsonify(message="Error: Admin users cannot delete themselves through this endpoint."), 400
 
     db.session.delete(user_to_delete)
+    invalidate_user_status()
     db.session.commit()
     return jsonify(message="User deleted successfully")
 
 # --- Stats Routes ---
 
-@app.route('/api/stats/active-users', methods=['GET'])
+@main_bp.route('/api/stats/active-users', methods=['GET'])
 @readonly_or_higher_required # Or a more specific permission if needed
 def get_active_users_count():
     try:
@@ -1473,7 +1767,7 @@ def get_active_users_count():
         app.logger.error(f"Error fetching active users count: {e}")
         return jsonify(message="Error fetching active users count"), 500
 
-@app.route('/api/stats/projects', methods=['GET'])
+@main_bp.route('/api/stats/projects', methods=['GET'])
 @readonly_or_higher_required # Or a more specific permission if needed
 def get_projects_count():
     try:
@@ -1483,7 +1777,7 @@ def get_projects_count():
         app.logger.error(f"Error fetching projects count: {e}")
         return jsonify(message="Error fetching projects count"), 500
 
-@app.route('/api/stats/parts', methods=['GET'])
+@main_bp.route('/api/stats/parts', methods=['GET'])
 @readonly_or_higher_required # Or a more specific permission if needed
 def get_parts_count():
     try:
@@ -1497,7 +1791,7 @@ def get_parts_count():
 
 # --- Order Routes ---
 
-@app.route('/api/orders', methods=['POST'])
+@main_bp.route('/api/orders', methods=['POST'])
 @jwt_required() # Any authenticated user can create an order
 def create_order():
     # current_user_jwt = get_jwt_identity() # User identity can be used if order needs to be associated with user
@@ -1513,6 +1807,8 @@ def create_order():
     for item_data in data['items']:
         if not all(k in item_data for k in ('part_id', 'quantity', 'unit_price')):
             return jsonify(message="Error: Each item must have part_id, quantity, and unit_price"), 400
+        if not isinstance(item_data['part_id'], int):
+            return jsonify(message="Error: Item part_id must be an integer"), 400
         if not isinstance(item_data['quantity'], int) or item_data['quantity'] <= 0:
             return jsonify(message="Error: Item quantity must be a positive integer"), 400
         try:
@@ -1528,8 +1824,19 @@ def create_order():
         if not project:
             return jsonify(message=f"Error: Project with id {project_id} not found"), 404
 
-    # Calculate total_amount from items
-    total_amount = sum(Decimal(str(item['unit_price'])) * item['quantity'] for item in data['items'])
+    # Validate every part with one IN query before anything is written
+    part_ids = [item['part_id'] for item in data['items']]
+    found_ids = {row[0] for row in db.session.query(Part.id).filter(Part.id.in_(set(part_ids)))}
+    for part_id in part_ids:
+        if part_id not in found_ids:
+            return jsonify(message=f"Error: Part with id {part_id} not found"), 404
+
+    item_rows = [{
+        'part_id': item['part_id'],
+        'quantity': item['quantity'],
+        'unit_price': Decimal(str(item['unit_price'])),
+    } for item in data['items']]
+    total_amount = sum(row['unit_price'] * row['quantity'] for row in item_rows)
 
     new_order = Order(
         order_number=data['order_number'],
@@ -1540,28 +1847,18 @@ def create_order():
         reimbursed=data.get('reimbursed', False)
     )
     db.session.add(new_order)
-    # Must flush to get new_order.id for order items
-    db.session.flush() 
-
-    order_items_list = []
-    for item_data in data['items']:
-        part = Part.query.get(item_data['part_id'])
-        if not part:
-            db.session.rollback() # Rollback if any part is not found
-            return jsonify(message=f"Error: Part with id {item_data['part_id']} not found"), 404
-
-        order_item = OrderItem(
-            order_id=new_order.id,
-            part_id=item_data['part_id'],
-            quantity=item_data['quantity'],
-            unit_price=Decimal(str(item_data['unit_price']))
-        )
-        order_items_list.append(order_item)
-        db.session.add(order_item)
+    try:
+        # Must flush to get new_order.id for order items
+        db.session.flush()
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify(message=f"Error: Order number '{data['order_number']}' already exists"), 409
 
-    db.session.commit()
+    for row in item_rows:
+        row['order_id'] = new_order.id
+    items = _bulk_insert_order_items(new_order.id, item_rows)
 
-    # Prepare response
+    # Built before commit so nothing has to be re-read once the session expires the order
     order_data = {
         'id': new_order.id,
         'order_number': new_order.order_number,
@@ -1574,44 +1871,115 @@ def create_order():
         'created_at': new_order.created_at.isoformat(),
         'updated_at': new_order.updated_at.isoformat(),
         'items': [{
-            'id': oi.id,
-            'part_id': oi.part_id,
-            'quantity': oi.quantity,
-            'unit_price': str(oi.unit_price)
-        } for oi in order_items_list]
+            'id': item.id,
+            'part_id': item.part_id,
+            'quantity': item.quantity,
+            'unit_price': str(item.unit_price)
+        } for item in items]
     }
+    invalidate_project_spend()
+    db.session.commit()
     return jsonify(message="Order created successfully", order=order_data), 201
 
-@app.route('/api/orders', methods=['GET'])
-@jwt_required()
+def _bulk_insert_order_items(order_id, rows):
+    """Insert all rows with one executemany and return (id, part_id, quantity,
+    unit_price) rows in insertion order.
+
+    Uses INSERT .. RETURNING where the dialect supports it for executemany
+    (PostgreSQL, SQLite >= 3.35); otherwise reads the same columns back with
+    one query, which is safe because the order was created in this transaction.
+    """
+    columns = (OrderItem.id, OrderItem.part_id, OrderItem.quantity, OrderItem.unit_price)
+    if db.session.get_bind().dialect.insert_executemany_returning:
+        inserted = db.session.execute(insert(OrderItem).returning(*columns), rows).all()
+        return sorted(inserted, key=lambda item: item.id)
+    db.session.execute(insert(OrderItem), rows)
+    return db.session.execute(
+        db.select(*columns).where(OrderItem.order_id == order_id).order_by(OrderItem.id)).all()
+
+@main_bp.route('/api/orders', methods=['GET'])
+@admin_required
 def get_orders():
-    current_user_jwt = get_jwt_identity()
-    if not current_user_jwt['is_admin']:
-        return jsonify(message="Forbidden: Admin access required to list all orders"), 403
-    # TODO: Add filtering options (e.g., by project_id, status, customer_name)
-    orders = Order.query.all()
+    # Optional filters: project_id, status, reimbursed, date_from, date_to (ISO dates, date_to inclusive)
+    # Newest first. Keyset-paginated when limit/cursor are given, see pagination.py
+    try:
+        project_id = int_arg('project_id')
+        reimbursed = bool_arg('reimbursed')
+        date_from = datetime_arg('date_from')
+        date_to = datetime_arg('date_to', end_of_day=True)
+        limit, cursor = keyset_args()
+    except ValueError as e:
+        return jsonify(message=f"Error: {e}"), 400
+    if cursor is not None:
+        try:
+            cursor_date = datetime.fromisoformat(cursor[0]) if cursor[0] is not None else None
+            cursor_id = int(cursor[1])
+        except (ValueError, TypeError, IndexError):
+            return jsonify(message="Error: Invalid value for 'cursor'."), 400
+
+    # Correlated per-order aggregates (order_items.order_id is indexed), so only
+    # the returned page's items are read rather than grouping the whole table
+    items_count = db.session.query(db.func.count(OrderItem.id)) \
+        .filter(OrderItem.order_id == Order.id).correlate(Order).scalar_subquery()
+    items_total = db.session.query(db.func.sum(OrderItem.quantity * OrderItem.unit_price)) \
+        .filter(OrderItem.order_id == Order.id).correlate(Order).scalar_subquery()
+    query = db.session.query(Order, items_count, items_total)
+
+    if project_id is not None:
+        query = query.filter(Order.project_id == project_id)
+    if request.args.get('status'):
+        query = query.filter(Order.status == request.args['status'])
+    if reimbursed is not None:
+        query = query.filter(Order.reimbursed == reimbursed)
+    if date_from is not None:
+        query = query.filter(Order.order_date >= date_from)
+    if date_to is not None:
+        query = query.filter(Order.order_date < date_to)
+    # Orders without an order_date come after all dated ones
+    if cursor is not None and cursor_date is None:
+        query = query.filter(Order.order_date.is_(None), Order.id < cursor_id)
+    elif cursor is not None:
+        query = query.filter(or_(
+            Order.order_date < cursor_date,
+            and_(Order.order_date == cursor_date, Order.id < cursor_id),
+            Order.order_date.is_(None),
+        ))
+
+    order_date = Order.order_date.desc()
+    if db.session.get_bind().dialect.name == 'postgresql':
+        order_date = order_date.nulls_last()  # MySQL and SQLite already sort NULL lowest
+    query = query.order_by(order_date, Order.id.desc())
+    rows = query.limit(limit + 1).all() if limit is not None else query.all()
+    next_cursor = None
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1][0]
+        next_cursor = encode_cursor(last.order_date.isoformat() if last.order_date else None, last.id)
+
     output = []
-    for order in orders:
-        order_data = {
+    for order, items_count, items_total in rows:
+        output.append({
             'id': order.id,
             'order_number': order.order_number,
             'customer_name': order.customer_name,
             'project_id': order.project_id,
             'status': order.status,
             'total_amount': str(order.total_amount),
-            'order_date': order.order_date.isoformat(),
+            'order_date': order.order_date.isoformat() if order.order_date else None,
             'reimbursed': order.reimbursed,
             'created_at': order.created_at.isoformat(),
             'updated_at': order.updated_at.isoformat(),
-            'items_count': len(order.items) # Optionally add count of items
-        }
-        output.append(order_data)
-    return jsonify(orders=output)
+            'items_count': items_count,
+            'items_total': str(Decimal(str(items_total or 0)).quantize(Decimal('0.01'))),
+        })
+    if limit is None:
+        return jsonify(orders=output)
+    return jsonify(orders=output, next_cursor=next_cursor)
 
-@app.route('/api/orders/<int:order_id>', methods=['GET'])
+@main_bp.route('/api/orders/<int:order_id>', methods=['GET'])
 @jwt_required() # Any authenticated user can view a specific order
 def get_order(order_id):
-    order = Order.query.get_or_404(order_id)
+    order = Order.query.options(selectinload(Order.items).joinedload(OrderItem.part)).get_or_404(order_id)
     order_data = {
         'id': order.id,
         'order_number': order.order_number,
@@ -1634,16 +2002,16 @@ def get_order(order_id):
     }
     return jsonify(order=order_data)
 
-@app.route('/api/orders/<int:order_id>', methods=['PUT'])
-@jwt_required()
+@main_bp.route('/api/orders/<int:order_id>', methods=['PUT'])
+@admin_required
 def update_order(order_id):
-    current_user_jwt = get_jwt_identity()
-    if not current_user_jwt['is_admin']:
-        return jsonify(message="Forbidden: Admin access required"), 403
     order = Order.query.get_or_404(order_id)
     data = request.json
     if not data:
         return jsonify(message="Error: No input data provided"), 400
+    if 'total_amount' in data:
+        # Maintained from the items, see order_totals.py
+        return jsonify(message="Error: total_amount is calculated from the order items and cannot be set"), 400
 
     # Update basic order fields
     order.order_number = data.get('order_number', order.order_number)
@@ -1660,21 +2028,9 @@ def update_order(order_id):
                 return jsonify(message=f"Error: Project with id {data['project_id']} not found"), 404
             order.project_id = data['project_id']
 
-    # Handling order items update is complex:
-    # Options: 1. Replace all items, 2. Add/remove/update individual items.
-    # For simplicity, this example will focus on updating the main order fields.
-    # A more robust implementation would handle item changes carefully.
-    # If 'items' are provided, it could mean replacing them.
-
-    # Recalculate total_amount if items are modified or if total_amount is explicitly provided
-    # For now, we assume total_amount is managed if items are managed separately or not changed here.
-    # If items were being updated, total_amount would need recalculation.
-    if 'total_amount' in data: # Allow manual override if necessary, though usually calculated
-        try:
-            order.total_amount = Decimal(str(data['total_amount']))
-        except:
-            return jsonify(message="Error: Invalid total_amount format"), 400
+    # Items are changed through the /items endpoints, which keep total_amount in step.
 
+    invalidate_project_spend()
     db.session.commit()
 
     updated_order_data = {
@@ -1692,28 +2048,22 @@ def update_order(order_id):
     return jsonify(message="Order updated successfully", order=updated_order_data)
 
 
-@app.route('/api/orders/<int:order_id>', methods=['DELETE'])
-@jwt_required()
+@main_bp.route('/api/orders/<int:order_id>', methods=['DELETE'])
+@admin_required
 def delete_order(order_id):
-    current_user_jwt = get_jwt_identity()
-    if not current_user_jwt['is_admin']:
-        return jsonify(message="Forbidden: Admin access required"), 403
     order = Order.query.get_or_404(order_id)
     # OrderItems are deleted due to cascade="all, delete-orphan" in Order model
     db.session.delete(order)
+    invalidate_project_spend()
     db.session.commit()
     return jsonify(message="Order and associated items deleted successfully")
 
 # --- OrderItem Routes (Optional - for managing items of an existing order if needed) ---
 # These might be useful if you want to add/remove/update items after an order is created.
 
-@app.route('/api/orders/<int:order_id>/items', methods=['POST'])
-@jwt_required()
+@main_bp.route('/api/orders/<int:order_id>/items', methods=['POST'])
+@admin_required # Could be extended to the order owner
 def add_order_item(order_id):
-    current_user_jwt = get_jwt_identity()
-    # For now, only admin can add items to an order. Could be extended to order owner.
-    if not current_user_jwt['is_admin']:
-        return jsonify(message="Forbidden: Admin access required"), 403
     order = Order.query.get_or_404(order_id)
     data = request.json
     required_fields = ['part_id', 'quantity', 'unit_price']
@@ -1729,7 +2079,7 @@ def add_order_item(order_id):
         unit_price = Decimal(str(data['unit_price']))
         if quantity <= 0:
             raise ValueError("Quantity must be positive")
-    except ValueError as e:
+    except (ValueError, ArithmeticError) as e:
         return jsonify(message=f"Error: Invalid quantity or unit price. {e}"), 400
 
     new_item = OrderItem(
@@ -1739,54 +2089,46 @@ def add_order_item(order_id):
         unit_price=unit_price
     )
     db.session.add(new_item)
-
-    # Recalculate order total_amount
-    order.total_amount = sum(Decimal(str(item.unit_price)) * item.quantity for item in order.items) + (unit_price * quantity)
+    db.session.flush()
+    new_total = apply_total_delta(order.id, line_total(quantity, unit_price))
+    invalidate_project_spend()
     db.session.commit()
 
     item_data = {
         'id': new_item.id,
-        'order_id': new_item.order_id,
-        'part_id': new_item.part_id,
-        'quantity': new_item.quantity,
-        'unit_price': str(new_item.unit_price)
+        'order_id': order.id,
+        'part_id': data['part_id'],
+        'quantity': quantity,
+        'unit_price': str(unit_price)
     }
-    return jsonify(message="Order item added successfully", item=item_data, new_total_amount=str(order.total_amount)), 201
+    return jsonify(message="Order item added successfully", item=item_data, new_total_amount=str(new_total)), 201
 
-@app.route('/api/orders/<int:order_id>/items/<int:item_id>', methods=['PUT'])
-@jwt_required()
+@main_bp.route('/api/orders/<int:order_id>/items/<int:item_id>', methods=['PUT'])
+@admin_required # Could be extended to the order owner
 def update_order_item(order_id, item_id):
-    current_user_jwt = get_jwt_identity()
-    # For now, only admin can update items in an order. Could be extended to order owner.
-    if not current_user_jwt['is_admin']:
-        return jsonify(message="Forbidden: Admin access required"), 403
-    order = Order.query.get_or_404(order_id)
-    item = OrderItem.query.filter_by(id=item_id, order_id=order.id).first_or_404()
+    item = OrderItem.query.filter_by(id=item_id, order_id=order_id).first_or_404()
     data = request.json
     if not data:
         return jsonify(message="Error: No input data provided"), 400
 
-    original_item_total = item.unit_price * item.quantity
+    original_line_total = line_total(item.quantity, item.unit_price)
 
     if 'quantity' in data:
         try:
-            item.quantity = int(data['quantity'])
-            if item.quantity <= 0:
-                return jsonify(message="Error: Quantity must be a positive integer"), 400
-        except ValueError:
+            quantity = int(data['quantity'])
+        except (ValueError, TypeError):
             return jsonify(message="Error: Invalid quantity format"), 400
+        if quantity <= 0:
+            return jsonify(message="Error: Quantity must be a positive integer"), 400
+        item.quantity = quantity
 
     if 'unit_price' in data:
         try:
             item.unit_price = Decimal(str(data['unit_price']))
-        except:
+        except ArithmeticError:
             return jsonify(message="Error: Invalid unit_price format"),  400
 
-    # Recalculate order total_amount
-    new_item_total = item.unit_price * item.quantity
-    order.total_amount = (order.total_amount - original_item_total) + new_item_total
-
-    db.session.commit()
+    new_total = apply_total_delta(order_id, line_total(item.quantity, item.unit_price) - original_line_total)
     updated_item_data = {
         'id': item.id,
         'order_id': item.order_id,
@@ -1794,33 +2136,25 @@ def update_order_item(order_id, item_id):
         'quantity': item.quantity,
         'unit_price': str(item.unit_price)
     }
-    return jsonify(message="Order item updated successfully", item=updated_item_data, new_total_amount=str(order.total_amount))
+    invalidate_project_spend()
+    db.session.commit()
+    return jsonify(message="Order item updated successfully", item=updated_item_data, new_total_amount=str(new_total))
 
-@app.route('/api/orders/<int:order_id>/items/<int:item_id>', methods=['DELETE'])
-@jwt_required()
+@main_bp.route('/api/orders/<int:order_id>/items/<int:item_id>', methods=['DELETE'])
+@admin_required # Could be extended to the order owner
 def delete_order_item(order_id, item_id):
-    current_user_jwt = get_jwt() # Corrected to get_jwt()
-    # For now, only admin can delete items from an order. Could be extended to order owner.
-    if current_user_jwt.get('permission') != 'admin': # Corrected to use get('permission')
-        return jsonify(message="Forbidden: Admin access required"), 403
-    order = Order.query.get_or_404(order_id)
-    item = OrderItem.query.filter_by(id=item_id, order_id=order.id).first_or_404()
-
-    item_total_to_remove = item.unit_price * item.quantity
-
+    item = OrderItem.query.filter_by(id=item_id, order_id=order_id).first_or_404()
+    removed_line_total = line_total(item.quantity, item.unit_price)
     db.session.delete(item)
-
-    # Recalculate order total_amount
-    order.total_amount -= item_total_to_remove
-    if order.total_amount < 0: # Should not happen with positive prices/quantities
-        order.total_amount = Decimal('0.00')
-
+    db.session.flush()
+    new_total = apply_total_delta(order_id, -removed_line_total)
+    invalidate_project_spend()
     db.session.commit()
-    return jsonify(message="Order item deleted successfully", new_total_amount=str(order.total_amount))
+    return jsonify(message="Order item deleted successfully", new_total_amount=str(new_total))
 
 # --- Registration Link Routes ---
 
-@app.route('/api/admin/registration-links', methods=['POST'])
+@main_bp.route('/api/admin/registration-links', methods=['POST'])
 @admin_required
 def create_registration_link():
     data = request.json
@@ -1830,6 +2164,10 @@ def create_registration_link():
 
     current_user_id = get_jwt().get('sub') # Get current admin user's ID
 
+    custom_path = data.get('custom_path')
+    if custom_path and RegistrationLink.custom_path_taken(custom_path):
+        return jsonify(message=f"Error creating link: Custom path '{custom_path}' is already in use."), 409
+
     try:
         new_link = RegistrationLink(
             created_by_user_id=current_user_id,
@@ -1850,24 +2188,47 @@ def create_registration_link():
     except ValueError as e:
         db.session.rollback()
         return jsonify(message=f"Error creating link: {str(e)}"), 400
+    except IntegrityError:
+        # Another request took the custom path (or token) between the check and the insert
+        db.session.rollback()
+        return jsonify(message=f"Error creating link: Custom path '{custom_path}' is already in use."), 409
     except Exception as e:
         db.session.rollback()
         app.logger.error(f"Error creating registration link: {e}")
         return jsonify(message="Internal server error creating registration link."), 500
 
-@app.route('/api/admin/registration-links', methods=['GET'])
+@main_bp.route('/api/admin/registration-links', methods=['GET'])
 @admin_required
 def get_registration_links():
-    links = RegistrationLink.query.all()
-    return jsonify(links=[link.to_dict() for link in links])
+    # Optional filters: is_active, q (prefix of custom_path); paginated when page/per_page are given
+    query = RegistrationLink.query.options(joinedload(RegistrationLink.creator))
+    try:
+        is_active = bool_arg('is_active')
+    except ValueError as e:
+        return jsonify(message=f"Error: {e}"), 400
+    if is_active is not None:
+        query = query.filter(RegistrationLink.is_active == is_active)
+    search = request.args.get('q', '').strip()
+    if search:
+        query = query.filter(RegistrationLink.custom_path.like(like_prefix(search), escape='\\'))
 
-@app.route('/api/admin/registration-links/<int:link_id>', methods=['GET'])
+    try:
+        links, pagination = paginate_query(query.order_by(RegistrationLink.created_at.desc(), RegistrationLink.id.desc()))
+    except ValueError as e:
+        return jsonify(message=f"Error: {e}"), 400
+    now = datetime.utcnow() # One timestamp so every link's validity is judged at the same instant
+    output = [link.to_dict(now=now) for link in links]
+    if pagination is None:
+        return jsonify(links=output)
+    return jsonify(links=output, pagination=pagination)
+
+@main_bp.route('/api/admin/registration-links/<int:link_id>', methods=['GET'])
 @admin_required
 def get_registration_link(link_id):
     link = RegistrationLink.query.get_or_404(link_id)
     return jsonify(link=link.to_dict())
 
-@app.route('/api/admin/registration-links/<int:link_id>', methods=['PUT'])
+@main_bp.route('/api/admin/registration-links/<int:link_id>', methods=['PUT'])
 @admin_required
 def update_registration_link(link_id):
     link = RegistrationLink.query.get_or_404(link_id)
@@ -1875,7 +2236,11 @@ def update_registration_link(link_id):
 
     try:
         if 'custom_path' in data: # Allow setting to None/empty to remove custom path
-            link.custom_path = data['custom_path'] if data['custom_path'] else None
+            new_custom_path = data['custom_path'] if data['custom_path'] else None
+            if new_custom_path != link.custom_path:
+                if new_custom_path and RegistrationLink.custom_path_taken(new_custom_path, exclude_link_id=link.id):
+                    return jsonify(message=f"Error updating link: Custom path '{new_custom_path}' is already in use."), 409
+                link.custom_path = new_custom_path
         if 'max_uses' in data:
             link.max_uses = int(data['max_uses'])
             if link.max_uses == 1:
@@ -1902,12 +2267,15 @@ def update_registration_link(link_id):
     except ValueError as e:
         db.session.rollback()
         return jsonify(message=f"Error updating link: {str(e)}"), 400
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify(message=f"Error updating link: Custom path '{data.get('custom_path')}' is already in use."), 409
     except Exception as e:
         db.session.rollback()
         app.logger.error(f"Error updating registration link {link_id}: {e}")
         return jsonify(message="Internal server error updating registration link."), 500
 
-@app.route('/api/admin/registration-links/<int:link_id>', methods=['DELETE'])
+@main_bp.route('/api/admin/registration-links/<int:link_id>', methods=['DELETE'])
 @admin_required
 def delete_registration_link(link_id):
     link = RegistrationLink.query.get_or_404(link_id)
@@ -1925,12 +2293,10 @@ def delete_registration_link(link_id):
         app.logger.error(f"Error deleting registration link {link_id}: {e}")
         return jsonify(message="Internal server error deleting registration link."), 500
 
-@app.route('/api/register/<link_identifier>', methods=['GET'])
+@main_bp.route('/api/register/<link_identifier>', methods=['GET'])
 def get_registration_link_details(link_identifier):
     app.logger.info(f"PUBLIC_LINK_FETCH: Attempting to fetch link with identifier: {link_identifier}")
-    link = RegistrationLink.query.filter(
-        (RegistrationLink.token == link_identifier) | (RegistrationLink.custom_path == link_identifier)
-    ).first()
+    link = RegistrationLink.find_by_identifier(link_identifier)
 
     if not link:
         app.logger.warning(f"PUBLIC_LINK_FETCH: Link not found for identifier: {link_identifier}")
@@ -1969,21 +2335,24 @@ def get_registration_link_details(link_identifier):
     app.logger.info(f"PUBLIC_LINK_FETCH: Link ID {link.id} is valid. Returning: {response_payload}")
     return jsonify(response_payload), 200
 
-@app.route('/api/register/<link_identifier>', methods=['POST'])
+@main_bp.route('/api/register/<link_identifier>', methods=['POST'])
+@rate_limited('register')
 def register_user_via_link(link_identifier):
-    data = request.json # Define data from request.json
-    link = RegistrationLink.query.filter(
-        (RegistrationLink.token == link_identifier) | (RegistrationLink.custom_path == link_identifier)
-    ).first()
+    data = request.json or {}
+    link = RegistrationLink.find_by_identifier(link_identifier)
 
     if not link:
         return jsonify(message="Registration link not found."), 404
 
-    # Corrected method call: is_currently_valid_for_registration returns a tuple (bool, str)
+    # Cheap early rejection with a useful message; the claim below is the authoritative check
     is_valid, message = link.is_currently_valid_for_registration()
     if not is_valid:
         return jsonify(message=message), 403
 
+    # Password must be provided in the request for the new user
+    if 'password' not in data or not data['password']:
+        return jsonify(message="Error: Password is required for the new user."), 400
+
     # Extract user details from the link if max_uses is 1
     if link.max_uses == 1:
         fixed_username = link.fixed_username
@@ -2004,18 +2373,12 @@ def register_user_via_link(link_identifier):
         requested_at=datetime.utcnow(), # Set request time
         registered_via_link_id=link.id # Associate user with the link
     )
-    # Password must be provided in the request for the new user
-    if 'password' not in data or not data['password']:
-        return jsonify(message="Error: Password is required for the new user."), 400
+    # Hash before claiming so the link row is locked only briefly
     new_user.set_password(data['password'])
 
-    db.session.add(new_user)
-    link.current_uses += 1 # Increment current_uses
-    # Deactivate link if uses are exhausted or if it's a single-use link that's now used
-    if link.current_uses >= link.max_uses:
-        link.is_active = False
-
-    db.session.commit()
+    response = _claim_link_and_create_user(link, new_user)
+    if response is not None:
+        return response
 
     user_data = {
         'id': new_user.id,
@@ -2030,64 +2393,71 @@ def register_user_via_link(link_identifier):
     }
     return jsonify(message=f"User {new_user.username} created successfully via registration link.", user=user_data), 201
 
-@app.route('/api/admin/create_user_via_link', methods=['POST'])
+def _claim_link_and_create_user(link, new_user):
+    """Claim one use of ``link`` and insert ``new_user`` in one transaction.
+    Returns an error response, or None on success."""
+    link_id = link.id
+    if not RegistrationLink.claim_use(link_id):
+        db.session.rollback()
+        link = db.session.get(RegistrationLink, link_id)
+        is_valid, message = link.is_currently_valid_for_registration() if link else (False, "Registration link not found.")
+        return jsonify(message=message if not is_valid else "Link has reached its maximum number of uses."), 403
+
+    db.session.add(new_user)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback() # Also releases the claimed use
+        return jsonify(message="Error: Username or email already exists"), 409
+    return None
+
+@main_bp.route('/api/admin/create_user_via_link', methods=['POST'])
 @admin_required # Assuming admin rights are needed to create users this way
 def admin_create_user_via_link():
-    data = request.json # Add this line to define data
+    data = request.json or {}
     link_token = data.get('token')
-    # Ensure 'uuid' is accessible, e.g. by having 'import uuid' at the module level.
-    # If 'fixed_username' or 'fixed_email' can be None, ensure the logic handles it.
-    # Example: username = fixed_username if fixed_username else f"user_{uuid.uuid4().hex[:8]}"
-    # Make sure fixed_username and fixed_email are defined before use.
-    # The original errors indicated 'data' was not defined for lines like:
-    # first_name=data.get('first_name', ''),
-    # last_name=data.get('last_name', ''),
-    # new_user.set_password(data['password'])
-    # This implies 'data' should be sourced from request.json as added above.
-    # The uuid errors should be resolved if 'import uuid' is at the top of the file.
 
     if not link_token:
         return jsonify(message="Error: Registration token is required."), 400
 
     link = RegistrationLink.query.filter_by(token=link_token).first()
+    if not link:
+        return jsonify(message="Error: Invalid or expired registration token. Registration link not found."), 400
 
-    # Corrected method call: is_currently_valid_for_registration returns a tuple (bool, str)
-    is_valid, message = link.is_currently_valid_for_registration() 
-    if not link or not is_valid:
+    is_valid, message = link.is_currently_valid_for_registration()
+    if not is_valid:
         return jsonify(message=f"Error: Invalid or expired registration token. {message}"), 400
 
-    # Use details from the link or generate defaults
-    # Assuming fixed_username and fixed_email might come from the link object or be predefined
-    # For this example, let's assume they might be part of the link's purpose or are passed in request
-    fixed_username = data.get('username', link.default_username) # Or however these are determined
-    fixed_email = data.get('email', link.default_email) # Or however these are determined
+    # Password must be provided in the request for the new user
+    if 'password' not in data or not data['password']:
+        return jsonify(message="Error: Password is required for the new user."), 400
+
+    # Request values win; otherwise use the details fixed on the link
+    username = data.get('username') or link.fixed_username
+    email = data.get('email') or link.fixed_email
 
     # Check for existing user by username or email if they are provided
-    if fixed_username and User.query.filter_by(username=fixed_username).first():
-        return jsonify(message=f"Error: Username '{fixed_username}' already exists"), 409
-    if fixed_email and User.query.filter_by(email=fixed_email).first():
-        return jsonify(message=f"Error: Email '{fixed_email}' already exists"), 409
+    if username and User.query.filter_by(username=username).first():
+        return jsonify(message=f"Error: Username '{username}' already exists"), 409
+    if email and User.query.filter_by(email=email).first():
+        return jsonify(message=f"Error: Email '{email}' already exists"), 409
 
     new_user = User(
-        username=fixed_username or f"user_{uuid.uuid4().hex[:8]}",
-        email=fixed_email or f"email_{uuid.uuid4().hex[:8]}@example.com",
-        first_name=data.get('first_name', link.default_first_name or ''), # Use link defaults if available
-        last_name=data.get('last_name', link.default_last_name or ''),   # Use link defaults if available
+        username=username or f"user_{uuid.uuid4().hex[:8]}",
+        email=email or f"email_{uuid.uuid4().hex[:8]}@example.com",
+        first_name=data.get('first_name', ''),
+        last_name=data.get('last_name', ''),
         permission=link.default_permission or 'readonly', # Use link default or fallback
         enabled=True, 
         is_approved=True, # Users created via admin link are pre-approved
         registered_via_link_id=link.id
     )
-    # Password must be provided in the request for the new user
-    if 'password' not in data or not data['password']:
-        return jsonify(message="Error: Password is required for the new user."), 400
+    # Hash before claiming so the link row is locked only briefly
     new_user.set_password(data['password'])
 
-    db.session.add(new_user)
-    link.current_uses += 1 # Increment current_uses
-    if link.current_uses >= link.max_uses: # Check if uses are exhausted
-        link.is_active = False # Deactivate link if uses are exhausted
-    db.session.commit()
+    response = _claim_link_and_create_user(link, new_user)
+    if response is not None:
+        return response
 
     user_data = {
         'id': new_user.id,
@@ -2,6 +2,7 @@ from pyairtable import Table
 from pyairtable.exceptions import PyAirtableError
 from flask import current_app
 from ..models import Part # Corrected import
+from ..instrumentation import timed_airtable_call
 import requests # Import requests for more specific error handling
 import json
 
@@ -19,6 +20,7 @@ AIRTABLE_NOTES = "Notes"
 # AIRTABLE_PART_NUMBER = "Part Number" # Example, if you decide to sync it despite "disregard" note
 
 # Helper function to update Airtable field choices via Metadata API
+@timed_airtable_call
 def _update_airtable_field_choices(table: Table, field_name_to_update: str, new_choice_name: str) -> bool:
     api_key = current_app.config.get('AIRTABLE_API_KEY')
     base_id = current_app.config.get('AIRTABLE_BASE_ID')
@@ -144,6 +146,7 @@ def _update_airtable_field_choices(table: Table, field_name_to_update: str, new_
         return False
 
 # New public function to be called from routes.py
+@timed_airtable_call
 def add_option_to_airtable_subsystem_field(new_option_name: str) -> bool:
     """
     Attempts to add a new option to the Airtable Subsystem field.
@@ -187,6 +190,7 @@ def add_option_to_airtable_subsystem_field(new_option_name: str) -> bool:
         return False
 
 
+@timed_airtable_call
 def add_option_via_typecast(option_value: str, field_name: str, primary_field_value: str = None) -> bool:
     """
     Adds a new option to an Airtable select field using the proven approach from airtable_new_option.py.
@@ -304,6 +308,7 @@ def add_option_to_subsystem_field_improved(new_option_name: str) -> bool:
     return add_option_via_typecast(new_option_name, AIRTABLE_SUBSYSTEM)
 
 
+@timed_airtable_call
 def get_airtable_select_options(table: Table, field_name: str) -> list[str]:
     """
     Fetches the available choices for a single select or multiple select field from Airtable.
@@ -355,6 +360,7 @@ def get_airtable_table():
         current_app.logger.error(f"Failed to initialize Airtable table: {e}")
         return None
 
+@timed_airtable_call
 def sync_part_to_airtable(part: Part):
     """
     Synchronizes a Part object's data to Airtable.
@@ -513,6 +519,7 @@ def log_manual_airtable_instructions(new_option_name: str, field_name: str = "Su
     current_app.logger.info("will be able to sync properly to Airtable with the correct subsystem value.")
     current_app.logger.info("=" * 80)
 
+@timed_airtable_call
 def update_record_with_subsystem(record_id: str, subsystem_name: str) -> bool:
     """
     Update an existing Airtable record with a new subsystem value.
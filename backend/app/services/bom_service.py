@@ -0,0 +1,138 @@
+"""
+Multi-level BOM explosion.
+
+``Part.quantity`` is the quantity per parent assembly, so the number of a
+part to make for one robot is the product of the quantities on the path from
+the part up to its top-level assembly. ``explode_bom`` loads a project's
+hierarchy in one query and computes that product for every node:
+
+    - pure Python: one breadth-first pass from the roots, O(n)
+    - numpy (when installed and the project has at least
+      ``VECTORIZE_MIN_PARTS`` parts): pointer jumping over parent-index
+      arrays, O(n log depth) in a handful of array operations
+
+Parts whose parent chain loops never reach a root; both paths leave them
+out and report their ids in ``excluded_part_ids``. A parent outside the
+project is treated as missing, so the part counts as a top-level node.
+"""
+from sqlalchemy import select
+
+from ..models import db, Machine, Part
+
+try:
+    import numpy
+except ImportError:  # numpy is optional; the pure Python pass gives the same result
+    numpy = None
+
+VECTORIZE_MIN_PARTS = 2000
+
+
+def explode_quantities(parent_index, quantities):
+    """Return the exploded quantity per node, or None for nodes in a cycle.
+
+    Args:
+        parent_index: per node, the position of its parent or -1 for roots.
+        quantities: per node, the quantity per parent.
+    """
+    if numpy is not None and len(quantities) >= VECTORIZE_MIN_PARTS:
+        return _explode_vectorized(parent_index, quantities)
+    return _explode_linear(parent_index, quantities)
+
+
+def _explode_linear(parent_index, quantities):
+    children = [[] for _ in quantities]
+    frontier = []
+    for node, parent in enumerate(parent_index):
+        if parent < 0:
+            frontier.append(node)
+        else:
+            children[parent].append(node)
+
+    totals = [None] * len(quantities)
+    for node in frontier:
+        totals[node] = quantities[node]
+    while frontier:
+        next_frontier = []
+        for node in frontier:
+            total = totals[node]
+            for child in children[node]:
+                totals[child] = total * quantities[child]
+                next_frontier.append(child)
+        frontier = next_frontier
+    return totals
+
+
+def _explode_vectorized(parent_index, quantities):
+    # After k rounds, totals[i] is the product of quantities over the 2**k
+    # nearest ancestors-or-self of i and jump[i] the ancestor 2**k levels up.
+    totals = numpy.asarray(quantities, dtype=numpy.int64).copy()
+    jump = numpy.asarray(parent_index, dtype=numpy.int64).copy()
+    for _ in range(max(1, len(totals)).bit_length() + 1):
+        pending = jump >= 0
+        if not pending.any():
+            break
+        targets = jump[pending]
+        totals[pending] *= totals[targets]
+        jump[pending] = jump[targets]
+    result = totals.tolist()
+    for node in numpy.flatnonzero(jump >= 0).tolist():
+        result[node] = None  # Still climbing after n steps: the chain loops
+    return result
+
+
+def _load_hierarchy(project_id):
+    return db.session.execute(
+        select(Part.id, Part.parent_id, Part.type, Part.quantity, Part.part_number, Part.name,
+               Part.raw_material, Machine.name)
+        .outerjoin(Machine, Machine.id == Part.machine_id)
+        .where(Part.project_id == project_id)
+        .order_by(Part.id)
+    ).all()
+
+
+def _grouped(parts, key):
+    groups = {}
+    for part in parts:
+        value = part[key]
+        group = groups.get(value)
+        if group is None:
+            group = groups[value] = {key: value, 'part_count': 0, 'total_quantity': 0}
+        group['part_count'] += 1
+        group['total_quantity'] += part['total_quantity']
+    return sorted(groups.values(), key=lambda group: (group[key] is None, group[key] or ''))
+
+
+def explode_bom(project_id):
+    """Exploded quantities for every part of the project plus machine and raw
+    material totals over the manufactured parts (type 'part')."""
+    rows = _load_hierarchy(project_id)
+    position = {row[0]: index for index, row in enumerate(rows)}
+    parent_index = [position.get(row[1], -1) if row[1] is not None else -1 for row in rows]
+    quantities = [row[3] if row[3] is not None else 1 for row in rows]
+    totals = explode_quantities(parent_index, quantities)
+
+    parts, excluded = [], []
+    for (part_id, parent_id, part_type, quantity, part_number, name, raw_material, machine), total in zip(rows, totals):
+        if total is None:
+            excluded.append(part_id)
+            continue
+        parts.append({
+            'id': part_id,
+            'parent_id': parent_id,
+            'part_number': part_number,
+            'name': name,
+            'type': part_type,
+            'quantity': quantity,
+            'total_quantity': total,
+            'machine': machine,
+            'raw_material': raw_material,
+        })
+
+    manufactured = [part for part in parts if (part['type'] or '').lower() == 'part']
+    return {
+        'project_id': project_id,
+        'parts': parts,
+        'by_machine': _grouped(manufactured, 'machine'),
+        'by_raw_material': _grouped(manufactured, 'raw_material'),
+        'excluded_part_ids': excluded,
+    }
@@ -0,0 +1,297 @@
+"""
+Copying part subtrees.
+
+``clone_subtree`` duplicates an assembly (or a single part) and everything
+below it under another parent, in the same or another project. The source
+subtree is read with one recursive CTE; the copies are then inserted one
+tree level at a time with a single executemany per level, so a clone costs a
+handful of statements however many parts it has.
+
+New numbers follow the scheme in create_part: every copied assembly takes the
+next free hundred in the target project and its parts are numbered
+``assembly + 1, + 2, ...`` in the order of their source numbers. Part numbers
+are ``<prefix>-A|P-<numeric_id>`` with the target project's prefix. parent_id
+is remapped onto the copies and subteam/subsystem are derived from the new
+position (see hierarchy_service). Post-process links are copied and the
+target's assembly rollups are updated. The caller commits.
+
+``clone_project`` copies a whole project under a new prefix (season
+rollover, ``flask clone-project``). numeric_ids are kept, so only the prefix
+of each part number changes. Source parts are read in keyset pages by id and
+each page is inserted with one executemany; the old -> new id map built
+along the way then remaps parent/subteam/subsystem with executemany UPDATEs
+by primary key. (MySQL can't UPDATE parts from a subquery that reads parts,
+and a streamed result can't stay open while the same connection writes.)
+"""
+from sqlalchemy import bindparam, insert, literal, select, update
+from sqlalchemy.orm import aliased
+
+from ..models import db, Part, Project, part_post_processes
+from ..rollups import rebuild_rollups, record_subtree_created
+from .hierarchy_service import MAX_TREE_DEPTH, ancestor_chain, derived_fields
+
+# Columns assigned by the clone rather than copied from the source row
+GENERATED_COLUMNS = {'id', 'numeric_id', 'part_number', 'project_id', 'parent_id', 'subteam_id', 'subsystem_id',
+                     'created_at', 'updated_at'}
+COPIED_COLUMNS = [column.key for column in Part.__table__.columns if column.key not in GENERATED_COLUMNS]
+MAX_PARTS_PER_ASSEMBLY = 99
+IN_CHUNK_SIZE = 500
+
+
+class CloneError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+def format_part_number(prefix, part_type, numeric_id):
+    return f"{prefix}-{'A' if part_type == 'assembly' else 'P'}-{numeric_id:04d}"
+
+
+def next_assembly_number(project_id):
+    """First free multiple of 100 above every numeric_id in the project."""
+    highest = db.session.scalar(select(db.func.max(Part.numeric_id)).where(Part.project_id == project_id))
+    return 0 if highest is None else (highest // 100 + 1) * 100
+
+
+def next_child_part_number(parent):
+    """Next part number below the assembly ``parent``, as in create_part."""
+    highest = db.session.scalar(
+        select(db.func.max(Part.numeric_id))
+        .where(Part.project_id == parent.project_id, Part.type == 'part', Part.parent_id == parent.id)
+    )
+    return parent.numeric_id + 1 if highest is None else highest + 1
+
+
+def load_subtree(root_id):
+    """Every row below and including ``root_id`` as mappings, parents before
+    children and siblings by numeric_id, with one recursive CTE."""
+    levels = (
+        select(Part.id, literal(0).label('level'))
+        .where(Part.id == root_id)
+        .cte('clone_source', recursive=True)
+    )
+    child = aliased(Part)
+    levels = levels.union_all(
+        select(child.id, levels.c.level + 1)
+        .join(levels, child.parent_id == levels.c.id)
+        .where(levels.c.level < MAX_TREE_DEPTH)
+    )
+    rows = db.session.execute(
+        select(Part.__table__, levels.c.level)
+        .join(levels, levels.c.id == Part.id)
+        .order_by(levels.c.level, Part.numeric_id)
+    ).mappings()
+    seen, unique = set(), []
+    for row in rows:
+        if row['id'] not in seen:
+            seen.add(row['id'])
+            unique.append(row)
+    return unique
+
+
+def insert_parts(rows):
+    """Insert part rows with one executemany and return {numeric_id: new id}.
+
+    numeric_id is unique within a project, so it identifies the inserted rows
+    whether they come back from RETURNING or from one follow-up SELECT."""
+    if not rows:
+        return {}
+    if db.session.get_bind().dialect.insert_executemany_returning:
+        inserted = db.session.execute(insert(Part).returning(Part.numeric_id, Part.id), rows).all()
+        return dict(inserted)
+    db.session.execute(insert(Part), rows)
+    numbers = [row['numeric_id'] for row in rows]
+    return dict(db.session.execute(
+        select(Part.numeric_id, Part.id)
+        .where(Part.project_id == rows[0]['project_id'], Part.numeric_id.in_(numbers))
+    ).all())
+
+
+def copy_post_process_links(id_map):
+    """Give every copy the post-processes of its source part."""
+    source_ids = list(id_map)
+    links = []
+    for start in range(0, len(source_ids), IN_CHUNK_SIZE):
+        links.extend(db.session.execute(
+            select(part_post_processes.c.part_id, part_post_processes.c.post_process_id)
+            .where(part_post_processes.c.part_id.in_(source_ids[start:start + IN_CHUNK_SIZE]))
+        ).all())
+    if links:
+        db.session.execute(insert(part_post_processes), [
+            {'part_id': id_map[part_id], 'post_process_id': post_process_id} for part_id, post_process_id in links
+        ])
+    return len(links)
+
+
+def clone_subtree(source_id, target_parent_id=None, target_project_id=None):
+    """Copy part ``source_id`` and its descendants below ``target_parent_id``
+    (None for top level) in ``target_project_id`` (default: the parent's
+    project, else the source's). Raises CloneError for invalid targets.
+
+    Returns ``(new root id, number of parts copied)``.
+    """
+    source = db.session.get(Part, source_id)
+    if source is None:
+        raise CloneError(f"Error: Part with id {source_id} not found", 404)
+
+    parent = None
+    if target_parent_id is not None:
+        parent = db.session.get(Part, target_parent_id)
+        if parent is None:
+            raise CloneError(f"Error: Parent assembly with id {target_parent_id} not found", 404)
+        if (parent.type or '').lower() != 'assembly':
+            raise CloneError("Error: Parent part must be an assembly.")
+        if target_project_id is not None and target_project_id != parent.project_id:
+            raise CloneError("Error: Parent assembly must belong to the target project.")
+        target_project_id = parent.project_id
+    elif (source.type or '').lower() == 'part':
+        raise CloneError("Error: 'parent_id' is required to clone a part")
+    if target_project_id is None:
+        target_project_id = source.project_id
+    project = db.session.get(Project, target_project_id)
+    if project is None:
+        raise CloneError(f"Error: Project with id {target_project_id} not found", 404)
+
+    rows = load_subtree(source_id)
+    is_assembly = {row['id']: (row['type'] or '').lower() == 'assembly' for row in rows}
+
+    # Allocate every number up front, parents before children
+    numbers = {}
+    next_block = next_assembly_number(project.id)
+    if is_assembly[source_id]:
+        numbers[source_id], next_block = next_block, next_block + 100
+    else:
+        numbers[source_id] = next_child_part_number(parent)
+        if numbers[source_id] % 100 == 0:
+            raise CloneError(f"Error: Cannot assign numeric_id {numbers[source_id]}. "
+                             f"Maximum {MAX_PARTS_PER_ASSEMBLY} parts per assembly allowed.")
+    used_offsets = {}
+    for row in rows[1:]:
+        if not is_assembly[row['parent_id']]:
+            raise CloneError(f"Error: Part {row['parent_id']} has child parts; only assemblies can have children.")
+        if is_assembly[row['id']]:
+            numbers[row['id']], next_block = next_block, next_block + 100
+        else:
+            offset = used_offsets[row['parent_id']] = used_offsets.get(row['parent_id'], 0) + 1
+            if offset > MAX_PARTS_PER_ASSEMBLY:
+                raise CloneError(f"Error: Assembly {row['parent_id']} has more than {MAX_PARTS_PER_ASSEMBLY} parts.")
+            numbers[row['id']] = numbers[row['parent_id']] + offset
+
+    root_breadcrumb = [row.id for row in ancestor_chain(target_parent_id)] if target_parent_id is not None else []
+    id_map, breadcrumbs, nodes = {}, {}, []
+    level_start = 0
+    while level_start < len(rows):
+        level = rows[level_start]['level']
+        level_end = level_start
+        while level_end < len(rows) and rows[level_end]['level'] == level:
+            level_end += 1
+        batch = rows[level_start:level_end]
+
+        inserts = []
+        for row in batch:
+            if row['id'] == source_id:
+                new_parent_id, breadcrumb = target_parent_id, root_breadcrumb
+            else:
+                new_parent_id = id_map[row['parent_id']]
+                breadcrumb = breadcrumbs[row['parent_id']] + [new_parent_id]
+            breadcrumbs[row['id']] = breadcrumb
+            subteam_id, subsystem_id = derived_fields(breadcrumb)
+            part_type = 'assembly' if is_assembly[row['id']] else 'part'
+            inserts.append(dict(
+                {key: row[key] for key in COPIED_COLUMNS},
+                type=part_type,
+                numeric_id=numbers[row['id']],
+                part_number=format_part_number(project.prefix, part_type, numbers[row['id']]),
+                project_id=project.id,
+                parent_id=new_parent_id,
+                subteam_id=subteam_id,
+                subsystem_id=subsystem_id,
+            ))
+        new_ids = insert_parts(inserts)
+        for row, values in zip(batch, inserts):
+            new_id = id_map[row['id']] = new_ids[values['numeric_id']]
+            nodes.append((new_id, values['parent_id'], values['type'], values['status'],
+                          values['have_material'], values['drawing_created']))
+        level_start = level_end
+
+    copy_post_process_links(id_map)
+    record_subtree_created(nodes, target_parent_id)
+    return id_map[source_id], len(rows)
+
+
+PROJECT_CLONE_CHUNK_SIZE = 1000
+DEFAULT_STATUS = 'In Design'
+REFERENCE_COLUMNS = ('parent_id', 'subteam_id', 'subsystem_id')
+
+
+def clone_project(source, name, prefix, description=None, reset_status=False, reset_quantities=False,
+                  progress=None):
+    """Copy project ``source`` and all of its parts into a new project.
+
+    With ``reset_status`` every copy starts as 'In Design' without material or
+    drawing; with ``reset_quantities`` quantity_on_hand/on_order start at 0.
+    ``progress(copied)`` is called after each chunk. Commits and returns the
+    new project.
+    """
+    project = Project(name=name, prefix=prefix,
+                      description=source.description if description is None else description)
+    db.session.add(project)
+    db.session.flush()
+
+    # References are filled in once every row exists (see below)
+    overrides = {'project_id': project.id, 'parent_id': None, 'subteam_id': None, 'subsystem_id': None}
+    if reset_status:
+        overrides.update(status=DEFAULT_STATUS, have_material=False, drawing_created=False)
+    if reset_quantities:
+        overrides.update(quantity_on_hand=0, quantity_on_order=0)
+
+    id_map, references = {}, []
+    copied, last_id = 0, 0
+    while True:
+        chunk = db.session.execute(
+            select(Part.__table__).where(Part.project_id == source.id, Part.id > last_id)
+            .order_by(Part.id).limit(PROJECT_CLONE_CHUNK_SIZE)
+        ).mappings().all()
+        if not chunk:
+            break
+        last_id = chunk[-1]['id']
+        new_ids = insert_parts([
+            dict({key: row[key] for key in COPIED_COLUMNS}, numeric_id=row['numeric_id'],
+                 part_number=format_part_number(prefix, (row['type'] or '').lower(), row['numeric_id']),
+                 **overrides)
+            for row in chunk
+        ])
+        for row in chunk:
+            id_map[row['id']] = new_ids[row['numeric_id']]
+            targets = tuple(row[column] for column in REFERENCE_COLUMNS)
+            if any(target is not None for target in targets):
+                references.append((row['id'], targets))
+        copied += len(chunk)
+        if progress:
+            progress(copied)
+
+    # parent/subteam/subsystem point at the copies; references leaving the
+    # source project are dropped
+    table = Part.__table__
+    remap = update(table).where(table.c.id == bindparam('copy_id')) \
+        .values({column: bindparam(f'new_{column}') for column in REFERENCE_COLUMNS})
+    for start in range(0, len(references), PROJECT_CLONE_CHUNK_SIZE):
+        db.session.execute(remap, [
+            dict({f'new_{column}': id_map.get(target) for column, target in zip(REFERENCE_COLUMNS, targets)},
+                 copy_id=id_map[source_id])
+            for source_id, targets in references[start:start + PROJECT_CLONE_CHUNK_SIZE]
+        ])
+
+    source_part, copy = aliased(Part), aliased(Part)
+    db.session.execute(insert(part_post_processes).from_select(
+        ['part_id', 'post_process_id'],
+        select(copy.id, part_post_processes.c.post_process_id)
+        .join(source_part, source_part.id == part_post_processes.c.part_id)
+        .join(copy, (copy.project_id == project.id) & (copy.numeric_id == source_part.numeric_id))
+        .where(source_part.project_id == source.id)
+    ))
+
+    rebuild_rollups(project.id)  # Commits
+    return project
@@ -0,0 +1,125 @@
+"""
+Deleting a project and everything that hangs off it.
+
+``Project.parts`` has no cascade and parts reference each other (parent,
+subteam, subsystem) and are referenced by order items, post-process links
+and rollups, so ``db.session.delete(project)`` either trips a foreign key or
+loads the whole project into the session. ``delete_project`` instead runs
+ordered, set-based DELETEs over bounded chunks of ids and commits after
+each chunk, so no statement holds locks for long and memory stays flat:
+
+    1. order items of the project's orders, then the orders
+    2. order items of other projects' orders that bought this project's
+       parts (those orders' totals are reduced by the removed lines)
+    3. post-process links, and parent/subteam/subsystem references to the
+       project's parts (nulled so parts can go in any order)
+    4. assembly rollups
+    5. parts, then the project row
+
+Every step only removes rows the later steps no longer need, so an
+interrupted delete can simply be run again. ``flask delete-project`` prints
+progress; the API route runs the same code.
+"""
+from decimal import Decimal
+
+from sqlalchemy import delete, or_, select, update
+
+from ..models import db, AssemblyRollup, AssemblyStatusRollup, Order, OrderItem, Part, Project, part_post_processes
+from ..order_totals import apply_total_delta
+from .spend_service import invalidate_project_spend
+
+PROJECT_DELETE_CHUNK_SIZE = 1000
+
+
+def _delete_by_id(column, id_query, chunk_size, step, counts, progress):
+    """Delete rows whose ``column`` is in ``id_query``, ``chunk_size`` ids per
+    statement and transaction."""
+    while True:
+        ids = db.session.scalars(id_query.limit(chunk_size)).all()
+        if not ids:
+            return
+        db.session.execute(delete(column.table).where(column.in_(ids)).execution_options(synchronize_session=False))
+        db.session.commit()
+        counts[step] += len(ids)
+        if progress:
+            progress(step, counts[step])
+
+
+def _part_id_windows(project_id, chunk_size):
+    """Ids of the project's parts, ``chunk_size`` at a time (keyset paging)."""
+    last_id = 0
+    while True:
+        ids = db.session.scalars(
+            select(Part.id).where(Part.project_id == project_id, Part.id > last_id).order_by(Part.id).limit(chunk_size)
+        ).all()
+        if not ids:
+            return
+        yield ids
+        last_id = ids[-1]
+
+
+def delete_project(project_id, progress=None, chunk_size=None):
+    """Delete project ``project_id`` with all of its parts and orders.
+
+    ``progress(step, deleted)`` is called after each committed chunk. Returns
+    ``{step: rows deleted}``; raises ValueError for an unknown project.
+    """
+    chunk_size = chunk_size or PROJECT_DELETE_CHUNK_SIZE
+    if db.session.get(Project, project_id) is None:
+        raise ValueError(f"Project with id {project_id} not found")
+    counts = dict.fromkeys(('order_items', 'orders', 'shared_order_items', 'post_process_links', 'references',
+                            'rollups', 'parts'), 0)
+    project_parts = select(Part.id).where(Part.project_id == project_id)
+
+    invalidate_project_spend()
+    own_items = select(OrderItem.id).join(Order, Order.id == OrderItem.order_id) \
+        .where(Order.project_id == project_id).order_by(OrderItem.id)
+    _delete_by_id(OrderItem.id, own_items, chunk_size, 'order_items', counts, progress)
+    _delete_by_id(Order.id, select(Order.id).where(Order.project_id == project_id).order_by(Order.id),
+                  chunk_size, 'orders', counts, progress)
+
+    while True:
+        lines = db.session.execute(
+            select(OrderItem.id, OrderItem.order_id, OrderItem.quantity * OrderItem.unit_price)
+            .where(OrderItem.part_id.in_(project_parts)).order_by(OrderItem.id).limit(chunk_size)
+        ).all()
+        if not lines:
+            break
+        removed = {}
+        for _, order_id, amount in lines:
+            removed[order_id] = removed.get(order_id, 0) + Decimal(str(amount or 0))
+        db.session.execute(delete(OrderItem).where(OrderItem.id.in_([line[0] for line in lines]))
+                           .execution_options(synchronize_session=False))
+        for order_id, amount in removed.items():
+            apply_total_delta(order_id, -amount)
+        db.session.commit()
+        counts['shared_order_items'] += len(lines)
+        if progress:
+            progress('shared_order_items', counts['shared_order_items'])
+
+    for ids in _part_id_windows(project_id, chunk_size):
+        counts['post_process_links'] += db.session.execute(
+            delete(part_post_processes).where(part_post_processes.c.part_id.in_(ids))
+        ).rowcount
+        for column in (Part.parent_id, Part.subteam_id, Part.subsystem_id):
+            counts['references'] += db.session.execute(
+                update(Part).where(column.in_(ids)).values({column: None})
+                .execution_options(synchronize_session=False)
+            ).rowcount
+        db.session.commit()
+        if progress:
+            progress('references', counts['references'])
+
+    _delete_by_id(AssemblyStatusRollup.assembly_id,
+                  select(AssemblyStatusRollup.assembly_id.distinct()).where(AssemblyStatusRollup.assembly_id.in_(project_parts)),
+                  chunk_size, 'rollups', counts, progress)
+    _delete_by_id(AssemblyRollup.assembly_id,
+                  select(AssemblyRollup.assembly_id).where(or_(AssemblyRollup.project_id == project_id,
+                                                               AssemblyRollup.assembly_id.in_(project_parts))),
+                  chunk_size, 'rollups', counts, progress)
+    _delete_by_id(Part.id, project_parts.order_by(Part.id), chunk_size, 'parts', counts, progress)
+
+    db.session.execute(delete(Project).where(Project.id == project_id))
+    invalidate_project_spend()
+    db.session.commit()
+    return counts
@@ -0,0 +1,132 @@
+"""
+Streaming BOM export: every part of a project with its breadcrumb path,
+machine, post-processes and exploded quantity (see bom_service), as CSV,
+NDJSON or XLSX.
+
+One query produces the rows: a recursive CTE walks down from the top-level
+assemblies carrying the breadcrumb (``Robot > Drivetrain > Gearbox``) and
+the product of the quantities, and a correlated subquery joins each part's
+post-process names. Rows are fetched with ``yield_per`` and written as they
+arrive, so memory does not grow with the project:
+
+    csv / ndjson  generated straight into the streamed response body
+    xlsx          openpyxl's write-only workbook, saved to a temporary file
+                  that is then sent (openpyxl is optional)
+
+Parts whose parent chain never reaches a top-level assembly are left out,
+as in explode_bom.
+"""
+import csv
+import io
+import json
+import re
+import tempfile
+
+from sqlalchemy import String, cast, literal, literal_column, select
+from sqlalchemy.orm import aliased
+
+from ..models import db, Machine, Part, PostProcess, part_post_processes
+from .hierarchy_service import MAX_TREE_DEPTH
+
+try:
+    from openpyxl import Workbook
+except ImportError:  # openpyxl is optional; xlsx export is unavailable without it
+    Workbook = None
+
+EXPORT_COLUMNS = ('id', 'part_number', 'name', 'type', 'path', 'quantity', 'total_quantity', 'status', 'machine',
+                  'raw_material', 'post_processes', 'have_material', 'drawing_created', 'priority')
+EXPORT_MIMETYPES = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+EXPORT_BATCH_SIZE = 500
+PATH_SEPARATOR = ' > '
+# A recursive CTE's column types come from its anchor row, so the path is
+# cast there to fit the deepest breadcrumb; otherwise MySQL caps it at the
+# width of parts.name
+PATH_TYPE = String((MAX_TREE_DEPTH + 1) * (Part.__table__.c.name.type.length + len(PATH_SEPARATOR)))
+
+
+def export_formats():
+    """Formats this server can produce."""
+    return [name for name in EXPORT_MIMETYPES if name != 'xlsx' or Workbook is not None]
+
+
+def _joined_names(column):
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        return db.func.string_agg(column, literal(', '))
+    if dialect == 'mysql':
+        return db.func.group_concat(column.op('SEPARATOR')(literal_column("', '")))
+    return db.func.group_concat(column, ', ')
+
+
+def export_query(project_id):
+    tree = (
+        select(Part.id, cast(Part.name, PATH_TYPE).label('path'), Part.quantity.label('total_quantity'),
+               literal(0).label('level'))
+        .where(Part.project_id == project_id, Part.parent_id.is_(None))
+        .cte('export_tree', recursive=True)
+    )
+    child = aliased(Part)
+    tree = tree.union_all(
+        select(child.id, cast(tree.c.path + PATH_SEPARATOR + child.name, PATH_TYPE),
+               tree.c.total_quantity * db.func.coalesce(child.quantity, 1), tree.c.level + 1)
+        .join(tree, child.parent_id == tree.c.id)
+        .where(child.project_id == project_id, tree.c.level < MAX_TREE_DEPTH)
+    )
+    post_processes = (
+        select(_joined_names(PostProcess.name))
+        .join(part_post_processes, part_post_processes.c.post_process_id == PostProcess.id)
+        .where(part_post_processes.c.part_id == Part.id)
+        .scalar_subquery()
+    )
+    return (
+        select(Part.id, Part.part_number, Part.name, Part.type, tree.c.path, Part.quantity, tree.c.total_quantity,
+               Part.status, Machine.name, Part.raw_material, post_processes, Part.have_material,
+               Part.drawing_created, Part.priority)
+        .join(tree, tree.c.id == Part.id)
+        .outerjoin(Machine, Machine.id == Part.machine_id)
+        .order_by(tree.c.path, Part.part_number)
+    )
+
+
+def export_rows(project_id):
+    """Yield one tuple per part, in EXPORT_COLUMNS order, sorted by path."""
+    result = db.session.execute(export_query(project_id).execution_options(yield_per=EXPORT_BATCH_SIZE))
+    for row in result:
+        yield tuple(row)
+
+
+def stream_csv(rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    for count, row in enumerate(rows, 1):
+        writer.writerow(row)
+        if count % EXPORT_BATCH_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def stream_ndjson(rows):
+    for row in rows:
+        yield json.dumps(dict(zip(EXPORT_COLUMNS, row))) + '\n'
+
+
+def write_xlsx(rows, title='BOM'):
+    """Write the rows into a temporary .xlsx file and return it, rewound. The
+    file is deleted when closed."""
+    workbook = Workbook(write_only=True)
+    # Sheet names: at most 31 characters, none of []:*?/ or backslash
+    sheet = workbook.create_sheet(title=re.sub(r'[\[\]:*?/\\]', ' ', title)[:31] or 'BOM')
+    sheet.append(EXPORT_COLUMNS)
+    for row in rows:
+        sheet.append(row)
+    output = tempfile.TemporaryFile(suffix='.xlsx')
+    workbook.save(output)
+    output.seek(0)
+    return output
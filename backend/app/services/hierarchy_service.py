@@ -0,0 +1,142 @@
+"""
+Moving parts within the assembly hierarchy.
+
+``subteam_id`` and ``subsystem_id`` are derived from a part's breadcrumb (see
+get_derived_hierarchy_info): with ancestors ``[top, second, third, ...]``,
+the subteam is the second ancestor and the subsystem the third. Moving a
+part changes the breadcrumb of every part below it, so ``move_part``:
+
+    1. loads the new parent's ancestor chain with one recursive CTE and
+       rejects the move if the part itself is on it (a cycle at any depth);
+    2. reparents the part and adjusts the assembly rollups (rollups.py);
+    3. walks the moved subtree with one recursive CTE that derives the new
+       subteam/subsystem per node, then applies them with one UPDATE per
+       distinct (subteam, subsystem) pair.
+
+Everything runs in the caller's transaction; the caller commits.
+"""
+from sqlalchemy import Integer, case, cast, literal, select, update
+from sqlalchemy.orm import aliased
+
+from ..models import db, Part
+from ..rollups import part_contribution, record_part_changed
+
+# Deeper chains are treated as corrupt (a parent cycle above the part)
+MAX_TREE_DEPTH = 100
+UPDATE_CHUNK_SIZE = 500
+
+
+class MoveError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+def ancestor_chain(part_id):
+    """``[(id, parent_id, project_id, type), ...]`` from the top-level
+    assembly down to ``part_id`` itself, with one recursive CTE."""
+    chain = (
+        select(Part.id, Part.parent_id, Part.project_id, Part.type, literal(0).label('level'))
+        .where(Part.id == part_id)
+        .cte('ancestor_chain', recursive=True)
+    )
+    parent = aliased(Part)
+    chain = chain.union_all(
+        select(parent.id, parent.parent_id, parent.project_id, parent.type, chain.c.level + 1)
+        .join(chain, parent.id == chain.c.parent_id)
+        .where(chain.c.level < MAX_TREE_DEPTH)
+    )
+    rows = db.session.execute(
+        select(chain.c.id, chain.c.parent_id, chain.c.project_id, chain.c.type).order_by(chain.c.level.desc())
+    ).all()
+    if len(rows) > MAX_TREE_DEPTH or len({row.id for row in rows}) != len(rows):
+        raise MoveError(f"Error: The hierarchy above part {part_id} contains a cycle", 409)
+    return rows
+
+
+def derived_fields(breadcrumb_ids):
+    """(subteam_id, subsystem_id) for a part whose ancestors, top first, are ``breadcrumb_ids``."""
+    subteam_id = breadcrumb_ids[1] if len(breadcrumb_ids) >= 2 else None
+    subsystem_id = breadcrumb_ids[2] if len(breadcrumb_ids) >= 3 else None
+    return subteam_id, subsystem_id
+
+
+def subtree_fields_query(part_id, breadcrumb_ids):
+    """(id, subteam_id, subsystem_id) for ``part_id`` and everything below it
+    once the part sits below ``breadcrumb_ids`` (top first)."""
+    subteam_id, subsystem_id = derived_fields(breadcrumb_ids)
+    # depth is the length of the node's own breadcrumb, so a child of a node
+    # at depth 1 has that node as its subteam and at depth 2 as its subsystem.
+    # The anchor's columns are cast: a recursive CTE takes its column types
+    # from the anchor, and MySQL types a bare NULL as BINARY(0).
+    subtree = (
+        select(Part.id, cast(literal(len(breadcrumb_ids)), Integer).label('depth'),
+               cast(literal(subteam_id, Integer), Integer).label('subteam_id'),
+               cast(literal(subsystem_id, Integer), Integer).label('subsystem_id'))
+        .where(Part.id == part_id)
+        .cte('moved_subtree', recursive=True)
+    )
+    child = aliased(Part)
+    subtree = subtree.union_all(
+        select(
+            child.id,
+            subtree.c.depth + 1,
+            case((subtree.c.depth == 1, subtree.c.id), else_=subtree.c.subteam_id),
+            case((subtree.c.depth == 2, subtree.c.id), else_=subtree.c.subsystem_id),
+        )
+        .join(subtree, child.parent_id == subtree.c.id)
+        .where(subtree.c.depth < MAX_TREE_DEPTH)
+    )
+    return select(subtree.c.id, subtree.c.subteam_id, subtree.c.subsystem_id)
+
+
+def recompute_subtree_fields(part_id, breadcrumb_ids):
+    """Re-derive subteam_id/subsystem_id for ``part_id`` and everything below
+    it, given the part's ancestors (top first). Returns the number of parts."""
+    rows = db.session.execute(subtree_fields_query(part_id, breadcrumb_ids)).all()
+
+    groups = {}
+    for node_id, node_subteam_id, node_subsystem_id in rows:
+        groups.setdefault((node_subteam_id, node_subsystem_id), []).append(node_id)
+    for (group_subteam_id, group_subsystem_id), ids in groups.items():
+        for start in range(0, len(ids), UPDATE_CHUNK_SIZE):
+            db.session.execute(
+                update(Part)
+                .where(Part.id.in_(ids[start:start + UPDATE_CHUNK_SIZE]))
+                .values(subteam_id=group_subteam_id, subsystem_id=group_subsystem_id)
+                .execution_options(synchronize_session='fetch')
+            )
+    return len(rows)
+
+
+def move_part(part, new_parent_id):
+    """Reparent ``part`` under ``new_parent_id`` (None for top level).
+
+    Raises MoveError for an invalid target. Returns the number of parts whose
+    derived fields were recomputed (the part plus its descendants).
+    """
+    if new_parent_id == part.id:
+        raise MoveError("Error: Part cannot be its own parent.")
+    if new_parent_id is None:
+        if (part.type or '').lower() == 'part':
+            raise MoveError("Error: 'parent_id' is required for type 'part'")
+        breadcrumb_ids = []
+    else:
+        chain = ancestor_chain(new_parent_id)
+        if not chain:
+            raise MoveError(f"Error: New parent part with id {new_parent_id} not found", 404)
+        new_parent = chain[-1]
+        if new_parent.project_id != part.project_id:
+            raise MoveError("Error: New parent part must belong to the same project.")
+        if (new_parent.type or '').lower() != 'assembly':
+            raise MoveError("Error: Parent part must be an assembly.")
+        breadcrumb_ids = [row.id for row in chain]
+        if part.id in breadcrumb_ids:
+            raise MoveError("Error: Cannot move a part below one of its own descendants.")
+
+    old_parent_id, old_contribution = part.parent_id, part_contribution(part)
+    part.parent_id = new_parent_id
+    db.session.flush()
+    record_part_changed(part, old_parent_id, old_contribution)
+    return recompute_subtree_fields(part.id, breadcrumb_ids)
@@ -0,0 +1,299 @@
+"""
+Streaming BOM import from CSV: our own export (see export_service) or an
+Onshape BOM export.
+
+Rows are read one at a time from the uploaded file and validated on their
+own; a bad row is reported with its line number and skipped, the rest of
+the file still goes in. Recognised columns (header case, spaces and
+underscores don't matter):
+
+    name (required), type, quantity, part number, parent, path, item,
+    machine, post processes, raw material, material, description, notes,
+    status
+
+A row's parent assembly is found, in order, from
+    parent  the part number or breadcrumb path (``Robot > Drivetrain``) of
+            an assembly already in the project or earlier in the file
+    path    our export's breadcrumb, which ends with the row itself
+    item    Onshape's indented item number (``1.2`` is below ``1``)
+and without any of them the row is a top-level assembly. Without a type
+column, an Onshape row is an assembly when the next row is its child
+(one row of lookahead); other rows default to 'part'.
+
+Machines and post-processes are matched by name against the cached
+reference data (reference_data.py). New rows are numbered like
+create_part and clone_subtree (assemblies take the next hundred, parts
+count up from their assembly) and inserted in chunks of
+``IMPORT_CHUNK_SIZE`` rows, one executemany per tree level within a chunk.
+With ``dry_run`` nothing is written and the report says what would happen.
+Parts are not synced to Airtable.
+"""
+import csv
+import io
+import re
+from itertools import chain
+
+from sqlalchemy import insert, select
+
+from ..models import db, Part, part_post_processes
+from ..reference_data import machine_ids, post_process_ids
+from ..rollups import rebuild_rollups
+from .clone_service import MAX_PARTS_PER_ASSEMBLY, format_part_number, insert_parts, next_assembly_number
+from .hierarchy_service import derived_fields
+
+IMPORT_CHUNK_SIZE = 1000
+MAX_REPORTED_ERRORS = 1000
+DEFAULT_STATUS = 'In Design'
+
+HEADER_ALIASES = {
+    'name': 'name',
+    'part name': 'name',
+    'type': 'type',
+    'quantity': 'quantity',
+    'qty': 'quantity',
+    'part number': 'part_number',
+    'parent': 'parent',
+    'parent part number': 'parent',
+    'parent path': 'parent',
+    'path': 'path',
+    'breadcrumb': 'path',
+    'item': 'item',
+    'item number': 'item',
+    'machine': 'machine',
+    'post processes': 'post_processes',
+    'post-processes': 'post_processes',
+    'raw material': 'raw_material',
+    'material': 'material',
+    'description': 'description',
+    'notes': 'notes',
+    'status': 'status',
+}
+
+
+def _normalize_header(header):
+    return HEADER_ALIASES.get(re.sub(r'[\s_]+', ' ', (header or '').strip().lower()))
+
+
+def _normalize_path(path):
+    return ' > '.join(segment.strip() for segment in path.split('>') if segment.strip())
+
+
+def read_csv_rows(stream):
+    """Yield ``(line number, {field: value})`` from a binary CSV stream, one
+    row at a time. Unknown columns and empty cells are dropped."""
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    reader = csv.reader(text)
+    fields = [_normalize_header(header) for header in next(reader, [])]
+    for values in reader:
+        row = {field: value.strip() for field, value in zip(fields, values) if field and value and value.strip()}
+        if row:
+            yield reader.line_num, row
+
+
+def _with_next(rows):
+    rows = iter(rows)
+    current = next(rows, None)
+    for upcoming in chain(rows, [None]):
+        yield current, upcoming
+        current = upcoming
+
+
+class RowError(ValueError):
+    pass
+
+
+class BomImporter:
+    """Imports rows into one project. Use ``run(rows)`` once."""
+
+    def __init__(self, project, dry_run=False, chunk_size=None):
+        self.project = project
+        self.dry_run = dry_run
+        self.chunk_size = chunk_size or IMPORT_CHUNK_SIZE
+        self.machines = machine_ids()
+        self.post_processes = post_process_ids()
+        # Assemblies that can be parents, keyed by numeric_id
+        self.breadcrumbs = {}  # numeric_id -> numeric_ids of its ancestors, top first
+        self.ids = {}  # numeric_id -> database id, once inserted
+        self.by_path, self.by_number, self.by_item = {}, {}, {}
+        self.paths = {}  # numeric_id -> breadcrumb path, the reverse of by_path
+        self.last_child_number = {}  # assembly numeric_id -> highest part numeric_id below it
+        self.next_assembly_number = next_assembly_number(project.id)
+        self.pending = []
+        self.report = {'dry_run': dry_run, 'row_count': 0, 'assembly_count': 0, 'part_count': 0,
+                       'error_count': 0, 'errors': []}
+        self._load_existing()
+
+    def _load_existing(self):
+        assemblies = db.session.execute(
+            select(Part.id, Part.parent_id, Part.numeric_id, Part.name, Part.part_number)
+            .where(Part.project_id == self.project.id, Part.type == 'assembly')
+        ).all()
+        by_id = {row.id: row for row in assemblies}
+        for row in assemblies:
+            names, numbers, parent, seen = [row.name], [], by_id.get(row.parent_id), {row.id}
+            while parent is not None and parent.id not in seen:
+                seen.add(parent.id)
+                names.append(parent.name)
+                numbers.append(parent.numeric_id)
+                parent = by_id.get(parent.parent_id)
+            self.breadcrumbs[row.numeric_id] = tuple(reversed(numbers))
+            self.ids[row.numeric_id] = row.id
+            self._register_path(_normalize_path(' > '.join(reversed(names))), row.numeric_id)
+            self.by_number[row.part_number] = row.numeric_id
+        numbers = {row.id: row.numeric_id for row in assemblies}
+        for parent_id, highest in db.session.execute(
+            select(Part.parent_id, db.func.max(Part.numeric_id))
+            .where(Part.project_id == self.project.id, Part.type == 'part', Part.parent_id.in_(list(numbers)))
+            .group_by(Part.parent_id)
+        ):
+            self.last_child_number[numbers[parent_id]] = highest
+
+    def _register_path(self, path, numeric_id):
+        self.paths[numeric_id] = path
+        self.by_path[path] = numeric_id
+
+    def _parent_of(self, row):
+        """numeric_id of the row's parent assembly, or None for top level."""
+        if 'parent' in row:
+            reference = row['parent']
+            parent = self.by_number.get(reference, self.by_path.get(_normalize_path(reference)))
+        elif 'path' in row:
+            segments = _normalize_path(row['path']).split(' > ')
+            reference = ' > '.join(segments[:-1])
+            if not reference:
+                return None
+            parent = self.by_path.get(reference)
+        elif 'item' in row and '.' in row['item']:
+            reference = row['item'].rsplit('.', 1)[0]
+            parent = self.by_item.get(reference)
+        else:
+            return None
+        if parent is None:
+            raise RowError(f"Parent assembly '{reference}' not found")
+        return parent
+
+    def _parse(self, row, upcoming):
+        if not row.get('name'):
+            raise RowError("'name' is required")
+        part_type = row.get('type', '').lower()
+        if not part_type:
+            is_parent = 'item' in row and upcoming is not None and upcoming.get('item', '').startswith(row['item'] + '.')
+            part_type = 'assembly' if is_parent else 'part'
+        if part_type not in ('assembly', 'part'):
+            raise RowError(f"Invalid type '{row['type']}'. Must be 'assembly' or 'part'")
+        try:
+            quantity = float(row.get('quantity', 1))
+        except ValueError:
+            raise RowError(f"Invalid quantity '{row['quantity']}'")
+        if quantity < 0 or not quantity.is_integer():
+            raise RowError(f"Invalid quantity '{row['quantity']}'")
+
+        machine_id = None
+        if row.get('machine'):
+            machine_id = self.machines.get(row['machine'].lower())
+            if machine_id is None:
+                raise RowError(f"Unknown machine '{row['machine']}'")
+        post_process_ids = []
+        for name in re.split(r'[,;]', row.get('post_processes', '')):
+            if name.strip():
+                post_process_id = self.post_processes.get(name.strip().lower())
+                if post_process_id is None:
+                    raise RowError(f"Unknown post-process '{name.strip()}'")
+                post_process_ids.append(post_process_id)
+
+        parent = self._parent_of(row)
+        if parent is None and part_type == 'part':
+            raise RowError("A part needs a parent assembly")
+        values = {
+            'name': row['name'],
+            'type': part_type,
+            'quantity': int(quantity),
+            'status': row.get('status', DEFAULT_STATUS),
+            'machine_id': machine_id,
+            'raw_material': row.get('raw_material'),
+            'material': row.get('material'),
+            'description': row.get('description'),
+            'notes': row.get('notes'),
+        }
+        for key, value in values.items():
+            length = getattr(Part.__table__.c[key].type, 'length', None)
+            if isinstance(value, str) and length is not None and len(value) > length:
+                raise RowError(f"'{key}' is longer than {length} characters")
+        return values, parent, post_process_ids
+
+    def _allocate(self, values, parent):
+        if values['type'] == 'assembly':
+            numeric_id = self.next_assembly_number
+            self.next_assembly_number += 100
+            return numeric_id
+        numeric_id = self.last_child_number.get(parent, parent) + 1
+        if numeric_id - parent > MAX_PARTS_PER_ASSEMBLY:
+            raise RowError(f"Assembly already has {MAX_PARTS_PER_ASSEMBLY} parts")
+        self.last_child_number[parent] = numeric_id
+        return numeric_id
+
+    def add(self, line, row, upcoming=None):
+        self.report['row_count'] += 1
+        try:
+            values, parent, post_process_ids = self._parse(row, upcoming)
+            numeric_id = self._allocate(values, parent)
+        except RowError as e:
+            self.report['error_count'] += 1
+            if len(self.report['errors']) < MAX_REPORTED_ERRORS:
+                self.report['errors'].append({'row': line, 'name': row.get('name'), 'error': str(e)})
+            return
+
+        breadcrumb = self.breadcrumbs[parent] + (parent,) if parent is not None else ()
+        if values['type'] == 'assembly':
+            self.breadcrumbs[numeric_id] = breadcrumb
+            name = _normalize_path(values['name'])
+            self._register_path(f"{self.paths[parent]} > {name}" if parent is not None else name, numeric_id)
+            if row.get('part_number'):
+                self.by_number[row['part_number']] = numeric_id
+            if row.get('item'):
+                self.by_item[row['item']] = numeric_id
+        self.report[f"{values['type']}_count"] += 1
+        values.update(numeric_id=numeric_id, project_id=self.project.id,
+                      part_number=format_part_number(self.project.prefix, values['type'], numeric_id))
+        self.pending.append((values, parent, breadcrumb, post_process_ids))
+        if len(self.pending) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        """Insert the pending rows: one executemany per tree depth, so every
+        parent has its id before its children go in."""
+        pending, self.pending = self.pending, []
+        if self.dry_run or not pending:
+            return
+        links = []
+        for depth in sorted({len(breadcrumb) for _, _, breadcrumb, _ in pending}):
+            level = [entry for entry in pending if len(entry[2]) == depth]
+            rows = []
+            for values, parent, breadcrumb, _ in level:
+                subteam_id, subsystem_id = derived_fields([self.ids[number] for number in breadcrumb])
+                rows.append(dict(values, parent_id=self.ids.get(parent), subteam_id=subteam_id,
+                                 subsystem_id=subsystem_id))
+            new_ids = insert_parts(rows)
+            for values, _, _, post_process_ids in level:
+                new_id = new_ids[values['numeric_id']]
+                if values['type'] == 'assembly':
+                    self.ids[values['numeric_id']] = new_id
+                links.extend({'part_id': new_id, 'post_process_id': pp_id} for pp_id in post_process_ids)
+        if links:
+            db.session.execute(insert(part_post_processes), links)
+
+    def run(self, rows):
+        """Import ``(line, row)`` pairs (see read_csv_rows) and return the report.
+        Commits unless this is a dry run."""
+        for current, upcoming in _with_next(rows):
+            if current is not None:
+                self.add(*current, upcoming=upcoming[1] if upcoming else None)
+        self.flush()
+        if not self.dry_run and (self.report['assembly_count'] or self.report['part_count']):
+            rebuild_rollups(self.project.id)  # Commits
+        return self.report
+
+
+def import_bom(project, stream, dry_run=False):
+    """Import a CSV BOM from the binary ``stream`` into ``project``."""
+    return BomImporter(project, dry_run=dry_run).run(read_csv_rows(stream))
@@ -0,0 +1,127 @@
+"""
+Project spend: order line amounts (quantity * unit_price) for the parts of a
+project, split by the order's reimbursed flag and grouped three ways:
+
+    total        the whole project
+    by_month     calendar month of Order.order_date
+    by_assembly  every assembly, including everything bought for parts below
+                 it (rolled up the hierarchy with a recursive CTE)
+
+Lines count toward the project of their part, not the order's project_id,
+so a shared vendor order is split across the robots it supplied.
+
+Everything is aggregated in SQL (two statements). Results are cached per
+worker under the ``project_spend`` cache; order and order item writes call
+``invalidate_project_spend()`` before committing (see cache.py).
+"""
+from decimal import Decimal
+
+from sqlalchemy import case, literal_column, select, union_all
+from sqlalchemy.orm import aliased
+
+from ..cache import get_cache, register_cache
+from ..models import db, Order, OrderItem, Part
+
+SPEND_CACHE = 'project_spend'
+CENTS = Decimal('0.01')
+
+
+def init_spend_cache(app):
+    register_cache(app, SPEND_CACHE, app.config.get('SPEND_CACHE_TTL', 300))
+
+
+def invalidate_project_spend():
+    """Call before committing a change to orders or order items."""
+    get_cache(SPEND_CACHE).invalidate()
+
+
+def get_project_spend(project_id):
+    """Cached spend summary for ``project_id``. Treat the result as read-only."""
+    return get_cache(SPEND_CACHE).get(project_id, compute_project_spend)
+
+
+def _money(value):
+    return Decimal(str(value or 0)).quantize(CENTS)
+
+
+def _split_sums():
+    amount = OrderItem.quantity * OrderItem.unit_price
+    reimbursed = db.func.coalesce(Order.reimbursed, False)
+    return (
+        db.func.sum(case((reimbursed, amount), else_=0)).label('reimbursed'),
+        db.func.sum(case((reimbursed, 0), else_=amount)).label('unreimbursed'),
+    )
+
+
+def _bucket(reimbursed, unreimbursed):
+    reimbursed, unreimbursed = _money(reimbursed), _money(unreimbursed)
+    return {
+        'reimbursed': str(reimbursed),
+        'unreimbursed': str(unreimbursed),
+        'total': str(reimbursed + unreimbursed),
+    }
+
+
+def _month_of(column):
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        return db.func.to_char(column, literal_column("'YYYY-MM'"))
+    if dialect == 'mysql':
+        return db.func.date_format(column, '%Y-%m')
+    return db.func.strftime('%Y-%m', column)
+
+
+def _assembly_pairs(project_id):
+    """Subquery of (part_id, assembly_id): every assembly a part sits under,
+    plus each assembly paired with itself. UNION (not UNION ALL) in the
+    recursive step stops on corrupt parent cycles."""
+    ancestors = (
+        select(Part.id.label('part_id'), Part.parent_id.label('assembly_id'))
+        .where(Part.project_id == project_id, Part.parent_id.is_not(None))
+        .cte('part_ancestors', recursive=True)
+    )
+    parent = aliased(Part)
+    ancestors = ancestors.union(
+        select(ancestors.c.part_id, parent.parent_id)
+        .join(parent, parent.id == ancestors.c.assembly_id)
+        .where(parent.parent_id.is_not(None))
+    )
+    return union_all(
+        select(ancestors.c.part_id, ancestors.c.assembly_id),
+        select(Part.id, Part.id).where(Part.project_id == project_id, Part.type == 'assembly'),
+    ).subquery('assembly_pairs')
+
+
+def compute_project_spend(project_id):
+    month = _month_of(Order.order_date).label('month')
+    month_rows = db.session.execute(
+        select(month, *_split_sums())
+        .select_from(OrderItem)
+        .join(Order, Order.id == OrderItem.order_id)
+        .join(Part, Part.id == OrderItem.part_id)
+        .where(Part.project_id == project_id)
+        .group_by(month)
+        .order_by(month)
+    ).all()
+
+    pairs = _assembly_pairs(project_id)
+    assembly = aliased(Part)
+    assembly_rows = db.session.execute(
+        select(assembly.id, assembly.part_number, assembly.name, assembly.parent_id, *_split_sums())
+        .select_from(OrderItem)
+        .join(Order, Order.id == OrderItem.order_id)
+        .join(pairs, pairs.c.part_id == OrderItem.part_id)
+        .join(assembly, assembly.id == pairs.c.assembly_id)
+        .group_by(assembly.id, assembly.part_number, assembly.name, assembly.parent_id)
+        .order_by(assembly.part_number)
+    ).all()
+
+    total_reimbursed = sum((_money(row.reimbursed) for row in month_rows), Decimal('0.00'))
+    total_unreimbursed = sum((_money(row.unreimbursed) for row in month_rows), Decimal('0.00'))
+    return {
+        'project_id': project_id,
+        'total': _bucket(total_reimbursed, total_unreimbursed),
+        'by_month': [dict(month=row.month, **_bucket(row.reimbursed, row.unreimbursed)) for row in month_rows],
+        'by_assembly': [dict(id=row.id, part_number=row.part_number, name=row.name, parent_id=row.parent_id,
+                             **_bucket(row.reimbursed, row.unreimbursed)) for row in assembly_rows],
+    }
@@ -0,0 +1,46 @@
+"""
+Live account status for the permission decorators.
+
+Access tokens carry ``enabled`` and ``permission`` claims from login time and
+live for hours. The decorators instead look the user up here: a per-worker
+cache keyed by user id, invalidated through the ``user_status`` cache version
+whenever an admin edits, approves or deletes a user. Disabling a user or
+lowering their permission therefore applies within
+CACHE_VERSION_CHECK_INTERVAL seconds, at the cost of one small version query
+per worker per interval plus one lookup per user per USER_STATUS_CACHE_TTL.
+"""
+from collections import namedtuple
+
+from sqlalchemy import select
+
+from .cache import get_cache, register_cache
+from .models import db, User
+
+USER_STATUS_CACHE = 'user_status'
+
+UserStatus = namedtuple('UserStatus', ['enabled', 'permission', 'is_approved'])
+
+
+def init_user_status_cache(app):
+    register_cache(app, USER_STATUS_CACHE, app.config.get('USER_STATUS_CACHE_TTL', 30))
+
+
+def _load_user_status(user_id):
+    row = db.session.execute(
+        select(User.enabled, User.permission, User.is_approved).where(User.id == user_id)
+    ).first()
+    return UserStatus(*row) if row else None
+
+
+def get_user_status(user_id):
+    """Return the UserStatus for ``user_id`` (the token's ``sub``), or None if there is no such user."""
+    try:
+        user_id = int(user_id)
+    except (TypeError, ValueError):
+        return None
+    return get_cache(USER_STATUS_CACHE).get(user_id, _load_user_status)
+
+
+def invalidate_user_status():
+    """Call before committing any change to a user's enabled/permission/approval or a deletion."""
+    get_cache(USER_STATUS_CACHE).invalidate()
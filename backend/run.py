@@ -64,5 +64,104 @@ def seed_admin():
     # db.session.commit()
     # print("Default machines and post-processes seeded.")
 
+@app.cli.command("prune-revoked-tokens")
+def prune_revoked_tokens_command():
+    """Deletes revoked refresh tokens that have expired anyway."""
+    from app.auth_tokens import prune_revoked_tokens
+    deleted = prune_revoked_tokens()
+    print(f"Pruned {deleted} expired revoked token(s).")
+
+@app.cli.command("reconcile-order-totals")
+@click.option('--fix', is_flag=True, help="Reset drifted totals to the sum of the order items.")
+def reconcile_order_totals_command(fix):
+    """Reports orders whose total_amount differs from the sum of their items."""
+    from app.order_totals import reconcile_order_totals
+    drift = reconcile_order_totals(fix=fix)
+    for order_id, stored, expected in drift:
+        print(f"Order {order_id}: stored {stored}, items sum to {expected}")
+    if not drift:
+        print("All order totals match their items.")
+    elif fix:
+        print(f"Fixed {len(drift)} order total(s).")
+    else:
+        print(f"{len(drift)} order total(s) drifted. Run with --fix to correct them.")
+
+@app.cli.command("rebuild-rollups")
+@click.option('--project-id', type=int, default=None, help="Only rebuild this project's assemblies.")
+def rebuild_rollups_command(project_id):
+    """Recomputes the per-assembly part counters from the parts table."""
+    from app.rollups import rebuild_rollups
+    count = rebuild_rollups(project_id)
+    print(f"Rebuilt rollups for {count} assemblies.")
+
+@app.cli.command("check-rollups")
+@click.option('--project-id', type=int, default=None, help="Only check this project's assemblies.")
+def check_rollups_command(project_id):
+    """Reports assemblies whose stored counters differ from the parts table."""
+    from app.rollups import check_rollups
+    problems = check_rollups(project_id)
+    for assembly_id, field, stored, expected in problems:
+        print(f"Assembly {assembly_id}: {field} is {stored}, expected {expected}")
+    if problems:
+        print(f"{len(problems)} rollup mismatch(es). Run 'flask rebuild-rollups' to fix them.")
+    else:
+        print("All assembly rollups are consistent.")
+
+@app.cli.command("clone-project")
+@click.argument('project_id', type=int)
+@click.option('--name', required=True, help="Name of the new project.")
+@click.option('--prefix', required=True, help="Part number prefix of the new project, e.g. BP26.")
+@click.option('--reset-status', is_flag=True, help="Start every copied part as 'In Design' without material or drawing.")
+@click.option('--reset-quantities', is_flag=True, help="Start quantity on hand/on order at 0.")
+def clone_project_command(project_id, name, prefix, reset_status, reset_quantities):
+    """Copies a project and all of its parts under a new prefix."""
+    from app.models import Project
+    from app.services.clone_service import clone_project
+    source = db.session.get(Project, project_id)
+    if source is None:
+        print(f"Project {project_id} not found.")
+        return
+    if Project.query.filter_by(prefix=prefix).first():
+        print(f"Prefix {prefix} is already in use.")
+        return
+    project = clone_project(source, name, prefix, reset_status=reset_status, reset_quantities=reset_quantities,
+                            progress=lambda copied: print(f"Copied {copied} part(s)..."))
+    print(f"Created project {project.id} ({project.prefix}) from {source.prefix}.")
+
+@app.cli.command("delete-project")
+@click.argument('project_id', type=int)
+@click.option('--chunk-size', type=int, default=None, help="Rows per DELETE statement and transaction.")
+@click.confirmation_option(prompt="This deletes the project with all of its parts and orders. Continue?")
+def delete_project_command(project_id, chunk_size):
+    """Deletes a project with its parts, orders and everything referencing them."""
+    from app.services.deletion_service import delete_project
+    try:
+        counts = delete_project(project_id, chunk_size=chunk_size,
+                                progress=lambda step, deleted: print(f"{step}: {deleted}"))
+    except ValueError as e:
+        print(e)
+        return
+    print("Deleted " + ", ".join(f"{count} {step.replace('_', ' ')}" for step, count in counts.items()) + ".")
+
+@app.cli.command("import-bom")
+@click.argument('project_id', type=int)
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--dry-run', is_flag=True, help="Validate every row and report without writing anything.")
+def import_bom_command(project_id, path, dry_run):
+    """Imports a CSV BOM (our export or an Onshape BOM) into a project."""
+    from app.models import Project
+    from app.services.import_service import import_bom
+    project = db.session.get(Project, project_id)
+    if project is None:
+        print(f"Project {project_id} not found.")
+        return
+    with open(path, 'rb') as stream:
+        report = import_bom(project, stream, dry_run=dry_run)
+    for error in report['errors']:
+        print(f"Row {error['row']} ({error['name'] or 'no name'}): {error['error']}")
+    verb = "Would import" if dry_run else "Imported"
+    print(f"{verb} {report['assembly_count']} assemblies and {report['part_count']} parts "
+          f"from {report['row_count']} rows; {report['error_count']} row(s) skipped.")
+
 if __name__ == '__main__':
     app.run(debug=True, port=5001, host='0.0.0.0') # Running on a different port than React dev server
@@ -1,9 +1,11 @@
 import pytest
+from contextlib import contextmanager
 import tempfile
 import os
 from app import create_app, db
 from app.models import User, Project, Part, Machine, PostProcess, Order, OrderItem, RegistrationLink
 from datetime import datetime, timedelta
+from app.query_detector import QueryRecorder
 from flask_jwt_extended import create_access_token
 
 
@@ -272,4 +274,52 @@ def sample_registration_link(app, admin_user):
 
 
 def get_auth_headers(token):
-    return {'Authorization': f'Bearer {token}'}
\ No newline at end of file
+    return {'Authorization': f'Bearer {token}'}
+
+@pytest.fixture
+def login_headers(app):
+    """Factory creating an enabled, approved user and returning auth headers
+    for a token that carries the same claims /api/login issues."""
+    created = []
+
+    def _make(permission='admin'):
+        suffix = len(created)
+        user = User(
+            username=f'{permission}_{suffix}',
+            email=f'{permission}_{suffix}@test.com',
+            first_name=permission.title(),
+            last_name='User',
+            permission=permission,
+            enabled=True,
+            is_approved=True
+        )
+        user.set_password('password123')
+        db.session.add(user)
+        db.session.commit()
+        created.append(user)
+        token = create_access_token(identity=str(user.id), additional_claims={
+            'username': user.username,
+            'permission': user.permission,
+            'enabled': user.enabled,
+            'is_approved': user.is_approved
+        })
+        return get_auth_headers(token)
+    return _make
+
+@pytest.fixture
+def assert_max_queries(app):
+    """Context manager failing the test when the block runs more than ``n`` SQL
+    statements, or, with ``max_repeats``, repeats one statement shape too often.
+
+        with assert_max_queries(3):
+            client.get('/api/orders/1', headers=headers)
+    """
+    @contextmanager
+    def _assert(n, max_repeats=None):
+        with QueryRecorder() as recorder:
+            yield recorder
+        assert recorder.count <= n, f'Expected at most {n} queries.\n{recorder.report()}'
+        if max_repeats is not None:
+            repeated = recorder.repeated(max_repeats)
+            assert not repeated, f'Statement repeated more than {max_repeats} times.\n{recorder.report()}'
+    return _assert
@@ -0,0 +1,39 @@
+"""Shared fixtures for the performance benchmarks."""
+import pytest
+from sqlalchemy import insert
+from app.models import Machine, Part, Project, db
+
+PART_COUNT = 5000
+
+
+@pytest.fixture
+def project_with_5k_parts(app):
+    project = Project(name='Benchmark Robot', prefix='BR')
+    db.session.add(project)
+    db.session.commit()
+    assembly = Part(name='Top Level Assembly', part_number='BR-A-0000', numeric_id=0,
+                    type='assembly', project_id=project.id, quantity=1, status='In Design')
+    db.session.add(assembly)
+    db.session.commit()
+    machine = Machine(name='Omax Waterjet')
+    db.session.add(machine)
+    db.session.commit()
+    statuses = ['In Design', 'Ready to Manufacture', 'In Progress', 'Done']
+    db.session.execute(insert(Part), [{
+        'name': f'Gusset Plate {i}',
+        'part_number': f'BR-P-{i + 1:05d}',
+        'numeric_id': i + 1,
+        'type': 'part',
+        'project_id': project.id,
+        'parent_id': assembly.id,
+        'quantity': 4,
+        'status': statuses[i % len(statuses)],
+        'raw_material': '0.25in 6061 Aluminum Plate',
+        'machine_id': machine.id,
+        'description': 'Waterjet, deburr, tap holes',
+        'priority': 1,
+        'have_material': False,
+        'drawing_created': True,
+    } for i in range(PART_COUNT)])
+    db.session.commit()
+    return project
@@ -0,0 +1,37 @@
+"""
+Per-request overhead of the permission decorators.
+
+Run with: python -m pytest tests/performance/test_auth_performance.py --benchmark-only
+Compare the decorated route against the same route without a decorator; the
+difference is the cost of JWT verification plus the permission check.
+"""
+import pytest
+from flask import jsonify
+from app.decorators import readonly_or_higher_required
+
+
+@pytest.fixture
+def auth_client(app):
+    @app.route('/api/_bench/open')
+    def _open():
+        return jsonify(message='ok')
+
+    @app.route('/api/_bench/protected')
+    @readonly_or_higher_required
+    def _protected():
+        return jsonify(message='ok')
+
+    return app.test_client()
+
+
+@pytest.mark.slow
+@pytest.mark.parametrize('path', ['/api/_bench/open', '/api/_bench/protected'])
+def test_auth_overhead(auth_client, login_headers, benchmark, path):
+    headers = login_headers('readonly')
+
+    def fetch():
+        response = auth_client.get(path, headers=headers)
+        assert response.status_code == 200
+        return response
+
+    benchmark(fetch)
@@ -0,0 +1,26 @@
+"""
+BOM explosion for 5k parts, with the numpy path and with the pure Python pass.
+
+Run with: python -m pytest tests/performance/test_bom_performance.py --benchmark-only
+"""
+import pytest
+from app.services import bom_service
+
+
+@pytest.mark.slow
+@pytest.mark.parametrize('vectorized', [False, True])
+def test_project_bom(client, login_headers, project_with_5k_parts, benchmark, monkeypatch, vectorized):
+    if vectorized and bom_service.numpy is None:
+        pytest.skip('numpy not installed')
+    if not vectorized:
+        monkeypatch.setattr(bom_service, 'numpy', None)
+    headers = login_headers('readonly')
+    url = f'/api/projects/{project_with_5k_parts.id}/bom'
+
+    def fetch():
+        response = client.get(url, headers=headers)
+        assert response.status_code == 200
+        return response
+
+    response = benchmark(fetch)
+    assert len(response.get_json()['parts']) == 5001
@@ -0,0 +1,39 @@
+"""
+Row-oriented JSON versus the columnar wire formats for 5k parts.
+
+Each benchmark measures request latency; extra_info records the body size
+and the time for the client side to decode it.
+"""
+import json
+import time
+import pytest
+from app import columnar
+
+
+@pytest.mark.slow
+@pytest.mark.parametrize('accept', [
+    'application/json',
+    columnar.COLUMNAR_JSON_MIMETYPE,
+    columnar.COLUMNAR_MSGPACK_MIMETYPE,
+])
+def test_project_parts_wire_format(client, login_headers, project_with_5k_parts, benchmark, accept):
+    if accept == columnar.COLUMNAR_MSGPACK_MIMETYPE and columnar.msgpack is None:
+        pytest.skip('msgpack not installed')
+    headers = login_headers('readonly')
+    headers['Accept'] = accept
+    url = f'/api/projects/{project_with_5k_parts.id}/parts'
+
+    def fetch():
+        response = client.get(url, headers=headers)
+        assert response.status_code == 200
+        return response
+
+    response = benchmark(fetch)
+
+    start = time.perf_counter()
+    if accept == columnar.COLUMNAR_MSGPACK_MIMETYPE:
+        columnar.msgpack.unpackb(response.data)
+    else:
+        json.loads(response.data)
+    benchmark.extra_info['decode_ms'] = round((time.perf_counter() - start) * 1000, 2)
+    benchmark.extra_info['bytes'] = len(response.data)
@@ -0,0 +1,30 @@
+"""
+Payload size and latency of /api/projects/<id>/parts at 5k parts with and
+without response compression.
+
+Run with: python -m pytest tests/performance/test_compression_performance.py --benchmark-only
+Bytes on the wire are reported in each benchmark's extra_info.
+"""
+import pytest
+from app import compression
+
+
+@pytest.mark.slow
+@pytest.mark.parametrize('accept_encoding', ['identity', 'gzip', 'br'])
+def test_project_parts_payload(client, login_headers, project_with_5k_parts, benchmark, accept_encoding):
+    if accept_encoding == 'br' and compression.brotli is None:
+        pytest.skip('brotli not installed')
+    headers = login_headers('readonly')
+    headers['Accept-Encoding'] = accept_encoding
+    url = f'/api/projects/{project_with_5k_parts.id}/parts'
+
+    def fetch():
+        response = client.get(url, headers=headers)
+        assert response.status_code == 200
+        return response
+
+    response = benchmark(fetch)
+    benchmark.extra_info['bytes'] = len(response.data)
+    benchmark.extra_info['content_encoding'] = response.headers.get('Content-Encoding', 'identity')
+    if accept_encoding != 'identity':
+        assert response.headers['Content-Encoding'] == accept_encoding
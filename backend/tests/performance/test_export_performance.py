@@ -0,0 +1,20 @@
+"""
+Streaming CSV export of 5k parts: one query, rows written as they are fetched.
+
+Run with: python -m pytest tests/performance/test_export_performance.py --benchmark-only
+"""
+import pytest
+
+
+@pytest.mark.slow
+def test_export_5k_parts_csv(client, login_headers, project_with_5k_parts, benchmark):
+    headers = login_headers('readonly')
+    url = f'/api/projects/{project_with_5k_parts.id}/export?format=csv'
+
+    def export():
+        response = client.get(url, headers=headers)
+        assert response.status_code == 200
+        return response.get_data(as_text=True)
+
+    body = benchmark(export)
+    assert body.count('\n') == 5002  # Header plus every part
@@ -0,0 +1,50 @@
+"""
+Importing a 10k-row CSV BOM: rows are parsed as they are read, validated
+against cached machine/post-process names, and inserted in chunks with one
+executemany per tree level.
+
+Run with: python -m pytest tests/performance/test_import_performance.py --benchmark-only
+"""
+import io
+import pytest
+from app.models import Machine, Part, PostProcess, Project, db
+
+ASSEMBLIES = 110
+PARTS_PER_ASSEMBLY = 90
+
+
+def _bom_csv():
+    lines = ['name,type,path,quantity,machine,post_processes']
+    for block in range(ASSEMBLIES):
+        lines.append(f'Module {block},assembly,Robot > Module {block},1,,')
+        lines.extend(f'Plate {block}.{i},part,Robot > Module {block} > Plate {block}.{i},2,Omax Waterjet,Deburr'
+                     for i in range(PARTS_PER_ASSEMBLY))
+    return ('\n'.join(lines) + '\n').encode('utf-8')
+
+
+@pytest.mark.slow
+def test_import_10k_rows(client, login_headers, app, benchmark):
+    headers = login_headers('editor')
+    db.session.add_all([Machine(name='Omax Waterjet'), PostProcess(name='Deburr')])
+    db.session.commit()
+    body = _bom_csv()
+    runs = []
+
+    def import_bom():
+        project = Project(name=f'Import Benchmark {len(runs)}', prefix=f'IB{len(runs)}')
+        db.session.add(project)
+        db.session.flush()
+        db.session.add(Part(name='Robot', part_number=f'{project.prefix}-A-0000', numeric_id=0, type='assembly',
+                            project_id=project.id, quantity=1, status='In Design'))
+        db.session.commit()
+        runs.append(project.id)
+        response = client.post(f'/api/projects/{project.id}/import', headers=headers,
+                               data={'file': (io.BytesIO(body), 'bom.csv')}, content_type='multipart/form-data')
+        assert response.status_code == 201
+        return response.get_json()['report']
+
+    report = benchmark.pedantic(import_bom, rounds=3, iterations=1)
+    assert report['error_count'] == 0
+    assert report['assembly_count'] + report['part_count'] == ASSEMBLIES * (PARTS_PER_ASSEMBLY + 1)
+    assert Part.query.filter_by(project_id=runs[-1]).count() == 1 + ASSEMBLIES * (PARTS_PER_ASSEMBLY + 1)
+    assert benchmark.stats.stats.mean < 5.0
@@ -0,0 +1,29 @@
+"""
+Creating a 500-line order: one IN query validates the parts and the items go
+in with a single bulk insert, so latency should stay flat as orders grow.
+
+Run with: python -m pytest tests/performance/test_order_performance.py --benchmark-only
+"""
+import itertools
+import pytest
+from app.models import Part
+
+ITEM_COUNT = 500
+
+
+@pytest.mark.slow
+def test_create_500_item_order(client, login_headers, project_with_5k_parts, benchmark):
+    headers = login_headers('editor')
+    part_ids = [part_id for (part_id,) in Part.query.with_entities(Part.id)
+                .filter_by(project_id=project_with_5k_parts.id, type='part').limit(ITEM_COUNT)]
+    items = [{'part_id': part_id, 'quantity': 4, 'unit_price': '3.49'} for part_id in part_ids]
+    numbers = itertools.count()
+
+    def create():
+        response = client.post('/api/orders', headers=headers,
+                               json={'order_number': f'BENCH-{next(numbers)}', 'items': items})
+        assert response.status_code == 201
+        return response
+
+    response = benchmark(create)
+    assert len(response.get_json()['order']['items']) == ITEM_COUNT
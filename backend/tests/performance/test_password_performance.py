@@ -0,0 +1,34 @@
+"""
+Login throughput at different password hash costs.
+
+Run with: python -m pytest tests/performance/test_password_performance.py --benchmark-only
+Each round is one full /api/login; compare the OPS column across methods to
+pick PASSWORD_HASH_METHOD for the deployment's CPU budget.
+"""
+import pytest
+from app import passwords
+from app.models import User, db
+
+HASH_METHODS = [
+    'pbkdf2:sha256:100000',
+    'pbkdf2:sha256:600000',
+    'scrypt:16384:8:1',
+    'scrypt:32768:8:1',
+]
+
+
+@pytest.mark.slow
+@pytest.mark.parametrize('method', HASH_METHODS)
+def test_login_throughput(app, client, benchmark, method):
+    app.config.update(PASSWORD_HASH_METHOD=method, RATE_LIMIT_ENABLED=False)
+    user = User(username='bench', email='bench@test.com', permission='readonly', enabled=True, is_approved=True)
+    user.set_password('password123')
+    db.session.add(user)
+    db.session.commit()
+
+    def login():
+        response = client.post('/api/login', json={'email': 'bench@test.com', 'password': 'password123'})
+        assert response.status_code == 200
+
+    benchmark(login)
+    benchmark.extra_info['method'] = passwords.normalize_method(method)
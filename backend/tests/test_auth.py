@@ -225,4 +225,80 @@ class TestPermissions:
         headers = get_auth_headers(token)
         response = client.get('/api/projects', headers=headers)
         # The decorators should check if user is enabled
-        assert response.status_code in [401, 403]
\ No newline at end of file
+        assert response.status_code in [401, 403]
+
+class TestRefreshTokens:
+
+    def _login(self, client, login_headers):
+        login_headers('editor')
+        response = client.post('/api/login', json={'email': 'editor_0@test.com', 'password': 'password123'})
+        assert response.status_code == 200
+        return json.loads(response.data)
+
+    @pytest.mark.auth
+    def test_login_returns_refresh_token(self, client, login_headers):
+        data = self._login(client, login_headers)
+        assert data['refresh_token']
+        assert data['refresh_token'] != data['access_token']
+
+    @pytest.mark.auth
+    def test_refresh_rotates_tokens(self, client, login_headers):
+        data = self._login(client, login_headers)
+
+        response = client.post('/api/token/refresh', headers=get_auth_headers(data['refresh_token']))
+        assert response.status_code == 200
+        renewed = json.loads(response.data)
+        assert renewed['refresh_token'] != data['refresh_token']
+        assert client.get('/api/projects', headers=get_auth_headers(renewed['access_token'])).status_code == 200
+
+        # The old refresh token was rotated away
+        response = client.post('/api/token/refresh', headers=get_auth_headers(data['refresh_token']))
+        assert response.status_code == 401
+
+        response = client.post('/api/token/refresh', headers=get_auth_headers(renewed['refresh_token']))
+        assert response.status_code == 200
+
+    @pytest.mark.auth
+    def test_access_token_cannot_refresh(self, client, login_headers):
+        data = self._login(client, login_headers)
+        response = client.post('/api/token/refresh', headers=get_auth_headers(data['access_token']))
+        assert response.status_code == 422
+
+    @pytest.mark.auth
+    def test_refresh_token_cannot_call_api(self, client, login_headers):
+        data = self._login(client, login_headers)
+        response = client.get('/api/projects', headers=get_auth_headers(data['refresh_token']))
+        assert response.status_code == 401
+
+    @pytest.mark.auth
+    def test_logout_revokes_refresh_token(self, client, login_headers):
+        data = self._login(client, login_headers)
+        headers = get_auth_headers(data['refresh_token'])
+
+        assert client.post('/api/logout', headers=headers).status_code == 200
+        assert client.post('/api/token/refresh', headers=headers).status_code == 401
+
+    @pytest.mark.auth
+    def test_refresh_rejected_for_disabled_user(self, client, login_headers):
+        data = self._login(client, login_headers)
+        user = User.query.filter_by(email='editor_0@test.com').one()
+        user.enabled = False
+        db.session.commit()
+
+        response = client.post('/api/token/refresh', headers=get_auth_headers(data['refresh_token']))
+        assert response.status_code == 403
+
+    @pytest.mark.auth
+    def test_prune_removes_only_expired(self, app):
+        import datetime
+        from app.auth_tokens import prune_revoked_tokens
+        from app.models import RevokedToken
+        now = datetime.datetime.utcnow()
+        db.session.add_all([
+            RevokedToken(jti='expired', expires_at=now - datetime.timedelta(days=1)),
+            RevokedToken(jti='live', expires_at=now + datetime.timedelta(days=1)),
+        ])
+        db.session.commit()
+
+        assert prune_revoked_tokens() == 1
+        assert [t.jti for t in RevokedToken.query.all()] == ['live']
@@ -0,0 +1,80 @@
+import random
+import pytest
+from app.models import Machine, Part, Project, db
+from app.services import bom_service
+
+
+class TestExplodeQuantities:
+
+    @pytest.mark.unit
+    def test_products_along_the_chain(self):
+        #   0 (x2) -> 1 (x3) -> 2 (x4);  3 is a root with x5
+        assert bom_service._explode_linear([-1, 0, 1, -1], [2, 3, 4, 5]) == [2, 6, 24, 5]
+
+    @pytest.mark.unit
+    def test_cycles_are_excluded(self):
+        # 1 and 2 point at each other, 3 hangs below the loop
+        parents, quantities = [-1, 2, 1, 2], [1, 2, 3, 4]
+        assert bom_service._explode_linear(parents, quantities) == [1, None, None, None]
+        if bom_service.numpy is not None:
+            assert bom_service._explode_vectorized(parents, quantities) == [1, None, None, None]
+
+    @pytest.mark.unit
+    def test_vectorized_matches_linear(self):
+        if bom_service.numpy is None:
+            pytest.skip('numpy not installed')
+        rng = random.Random(42)
+        parents, quantities = [], []
+        for node in range(3000):
+            # Parents always come earlier, except a few forward references and a loop
+            parents.append(rng.randrange(-1, node) if node else -1)
+            quantities.append(rng.randint(0, 4))
+        parents[10], parents[20] = 20, 10
+        assert bom_service._explode_vectorized(parents, quantities) == bom_service._explode_linear(parents, quantities)
+
+
+class TestBomEndpoint:
+
+    @pytest.fixture
+    def robot(self, app):
+        project = Project(name='BOM Robot', prefix='BB')
+        db.session.add(project)
+        waterjet, lathe = Machine(name='Waterjet'), Machine(name='Lathe')
+        db.session.add_all([waterjet, lathe])
+        db.session.flush()
+
+        def part(number, type_, quantity, parent=None, machine=None, material=None):
+            p = Part(numeric_id=number, part_number=f'BB-{number:04d}', name=f'Part {number}', type=type_,
+                     quantity=quantity, project_id=project.id, parent_id=parent.id if parent else None,
+                     machine_id=machine.id if machine else None, raw_material=material)
+            db.session.add(p)
+            db.session.flush()
+            return p
+
+        robot = part(0, 'assembly', 1)
+        module = part(100, 'assembly', 4, robot)       # four swerve modules
+        self.plate = part(101, 'part', 2, module, waterjet, 'Aluminum plate')
+        self.axle = part(102, 'part', 1, module, lathe, 'Hex stock')
+        self.frame_plate = part(1, 'part', 2, robot, waterjet, 'Aluminum plate')
+        db.session.commit()
+        return project
+
+    @pytest.mark.api
+    def test_exploded_quantities_and_totals(self, client, login_headers, robot, assert_max_queries):
+        url, headers = f'/api/projects/{robot.id}/bom', login_headers('readonly')
+        with assert_max_queries(4):
+            response = client.get(url, headers=headers)
+        assert response.status_code == 200
+        data = response.get_json()
+        totals = {p['part_number']: p['total_quantity'] for p in data['parts']}
+        assert totals == {'BB-0000': 1, 'BB-0100': 4, 'BB-0101': 8, 'BB-0102': 4, 'BB-0001': 2}
+        assert data['by_machine'] == [
+            {'machine': 'Lathe', 'part_count': 1, 'total_quantity': 4},
+            {'machine': 'Waterjet', 'part_count': 2, 'total_quantity': 10},
+        ]
+        assert data['by_raw_material'][0] == {'raw_material': 'Aluminum plate', 'part_count': 2, 'total_quantity': 10}
+        assert data['excluded_part_ids'] == []
+
+    @pytest.mark.api
+    def test_unknown_project(self, client, login_headers):
+        assert client.get('/api/projects/9999/bom', headers=login_headers('readonly')).status_code == 404
@@ -0,0 +1,107 @@
+import json
+import pytest
+from app import columnar
+from app.models import Machine, Part, Project, db
+
+
+@pytest.fixture
+def columnar_project(app):
+    project = Project(name='Columnar Project', prefix='CL')
+    machine = Machine(name='Lathe')
+    db.session.add_all([project, machine])
+    db.session.commit()
+    top = Part(name='Robot', part_number='CL-A-0000', numeric_id=0, type='assembly',
+               project_id=project.id, quantity=1, status='In Design')
+    db.session.add(top)
+    db.session.commit()
+    gearbox = Part(name='Gearbox', part_number='CL-A-0100', numeric_id=100, type='assembly',
+                   project_id=project.id, parent_id=top.id, quantity=2, status='In Design')
+    db.session.add(gearbox)
+    db.session.commit()
+    db.session.add_all([
+        Part(name='Shaft', part_number='CL-P-0101', numeric_id=101, type='part', project_id=project.id,
+             parent_id=gearbox.id, quantity=1, status='Done', machine_id=machine.id, raw_material='Steel'),
+        Part(name='Bearing Block', part_number='CL-P-0102', numeric_id=102, type='part', project_id=project.id,
+             parent_id=gearbox.id, quantity=2, status='In Design', machine_id=machine.id, raw_material='Aluminum'),
+        Part(name='Axle', part_number='CL-P-0103', numeric_id=103, type='part', project_id=project.id,
+             parent_id=gearbox.id, quantity=1, status='Done', raw_material='Steel'),
+    ])
+    db.session.commit()
+    return project
+
+
+def decode_rows(payload):
+    columns = payload['columns']
+    names = list(columns)
+    rows = []
+    for i in range(payload['row_count']):
+        row = {}
+        for name in names:
+            value = columns[name][i]
+            if name in payload['dictionaries'] and value is not None:
+                value = payload['dictionaries'][name][value]
+            row[name] = value
+        rows.append(row)
+    return rows
+
+
+class TestColumnarFormat:
+
+    @pytest.mark.api
+    def test_parts_default_is_row_json(self, client, login_headers, columnar_project):
+        headers = login_headers('readonly')
+        headers['Accept'] = '*/*'
+        response = client.get(f'/api/projects/{columnar_project.id}/parts', headers=headers)
+
+        assert response.mimetype == 'application/json'
+        assert len(json.loads(response.data)['parts']) == 5
+
+    @pytest.mark.api
+    def test_parts_columnar_json(self, client, login_headers, columnar_project):
+        headers = login_headers('readonly')
+        headers['Accept'] = columnar.COLUMNAR_JSON_MIMETYPE
+        response = client.get(f'/api/projects/{columnar_project.id}/parts', headers=headers)
+
+        assert response.status_code == 200
+        assert response.mimetype == columnar.COLUMNAR_JSON_MIMETYPE
+        payload = json.loads(response.data)
+        assert payload['row_count'] == 5
+        assert sorted(payload['dictionaries']['status']) == ['Done', 'In Design']
+        assert payload['dictionaries']['machine'] == ['Lathe']
+        rows = {row['part_number']: row for row in decode_rows(payload)}
+        assert rows['CL-P-0101']['machine'] == 'Lathe'
+        assert rows['CL-P-0101']['raw_material'] == 'Steel'
+        assert rows['CL-P-0103']['machine'] is None
+        assert rows['CL-A-0100']['type'] == 'assembly'
+
+    @pytest.mark.api
+    def test_parts_columnar_msgpack(self, client, login_headers, columnar_project):
+        if columnar.msgpack is None:
+            pytest.skip('msgpack not installed')
+        headers = login_headers('readonly')
+        headers['Accept'] = columnar.COLUMNAR_MSGPACK_MIMETYPE
+        response = client.get(f'/api/projects/{columnar_project.id}/parts', headers=headers)
+
+        assert response.mimetype == columnar.COLUMNAR_MSGPACK_MIMETYPE
+        payload = columnar.msgpack.unpackb(response.data)
+        assert payload['row_count'] == 5
+
+    @pytest.mark.api
+    def test_tree_columnar_parent_indexes(self, client, login_headers, columnar_project):
+        headers = login_headers('readonly')
+        headers['Accept'] = columnar.COLUMNAR_JSON_MIMETYPE
+        response = client.get(f'/api/projects/{columnar_project.id}/tree', headers=headers)
+
+        payload = json.loads(response.data)
+        assert payload['project']['prefix'] == 'CL'
+        names = payload['columns']['name']
+        parents = payload['columns']['parent']
+        # Depth-first, siblings ordered by name
+        assert names == ['Robot', 'Gearbox', 'Axle', 'Bearing Block', 'Shaft']
+        assert parents == [-1, 0, 1, 1, 1]
+
+    @pytest.mark.unit
+    def test_encode_tree_breaks_cycles(self):
+        nodes = [(1, 2, 'a'), (2, 1, 'b'), (3, None, 'c')]
+        payload = columnar.encode_tree(nodes, ('name',))
+        assert payload['columns']['name'] == ['c']
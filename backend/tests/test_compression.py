@@ -0,0 +1,97 @@
+import gzip
+import json
+import pytest
+from flask import Response
+from app.models import Part, Project, db
+from app import compression
+
+
+@pytest.fixture
+def large_project(app):
+    project = Project(name='Compression Project', prefix='CP')
+    db.session.add(project)
+    db.session.commit()
+    assembly = Part(name='Drivetrain', part_number='CP-A-0000', numeric_id=0,
+                    type='assembly', project_id=project.id, quantity=1, status='In Design')
+    db.session.add(assembly)
+    db.session.commit()
+    db.session.add_all([
+        Part(name=f'Spacer {i}', part_number=f'CP-P-{i + 1:04d}', numeric_id=i + 1, type='part',
+             project_id=project.id, parent_id=assembly.id, quantity=2, status='In Design')
+        for i in range(60)
+    ])
+    db.session.commit()
+    return project
+
+
+class TestResponseCompression:
+
+    @pytest.mark.api
+    def test_gzip_when_accepted(self, client, login_headers, large_project):
+        headers = login_headers('readonly')
+        headers['Accept-Encoding'] = 'gzip'
+        response = client.get(f'/api/projects/{large_project.id}/parts', headers=headers)
+
+        assert response.status_code == 200
+        assert response.headers['Content-Encoding'] == 'gzip'
+        assert 'Accept-Encoding' in response.headers['Vary']
+        data = json.loads(gzip.decompress(response.data))
+        assert len(data['parts']) == 61
+
+    @pytest.mark.api
+    def test_brotli_preferred_when_available(self, client, login_headers, large_project):
+        if compression.brotli is None:
+            pytest.skip('brotli not installed')
+        headers = login_headers('readonly')
+        headers['Accept-Encoding'] = 'gzip, br'
+        response = client.get(f'/api/projects/{large_project.id}/parts', headers=headers)
+
+        assert response.headers['Content-Encoding'] == 'br'
+        data = json.loads(compression.brotli.decompress(response.data))
+        assert len(data['parts']) == 61
+
+    @pytest.mark.api
+    def test_identity_without_accept_encoding(self, client, login_headers, large_project):
+        response = client.get(f'/api/projects/{large_project.id}/parts', headers=login_headers('readonly'))
+
+        assert 'Content-Encoding' not in response.headers
+        assert len(json.loads(response.data)['parts']) == 61
+
+    @pytest.mark.api
+    def test_small_bodies_not_compressed(self, client, login_headers):
+        headers = login_headers('readonly')
+        headers['Accept-Encoding'] = 'gzip'
+        response = client.get('/api/hello', headers=headers)
+
+        assert response.status_code == 200
+        assert 'Content-Encoding' not in response.headers
+
+    @pytest.mark.api
+    def test_disabled_by_config(self, app, client, login_headers, large_project):
+        app.config['COMPRESSION_ENABLED'] = False
+        headers = login_headers('readonly')
+        headers['Accept-Encoding'] = 'gzip'
+        response = client.get(f'/api/projects/{large_project.id}/parts', headers=headers)
+
+        assert 'Content-Encoding' not in response.headers
+
+    @pytest.mark.unit
+    def test_streamed_response_compressed_per_chunk(self, app, client):
+        @app.route('/api/_test/stream')
+        def _stream():
+            return Response((f'{{"row": {i}}}\n' for i in range(100)), mimetype='application/x-ndjson')
+
+        response = client.get('/api/_test/stream', headers={'Accept-Encoding': 'gzip'})
+
+        assert response.headers['Content-Encoding'] == 'gzip'
+        assert 'Content-Length' not in response.headers
+        lines = gzip.decompress(response.data).decode().splitlines()
+        assert len(lines) == 100
+        assert json.loads(lines[-1]) == {'row': 99}
+
+    @pytest.mark.unit
+    def test_negotiate_encoding_respects_q_values(self, app):
+        from werkzeug.datastructures import Accept
+        assert compression.negotiate_encoding(Accept([('gzip', 1), ('br', 0)])) == 'gzip'
+        assert compression.negotiate_encoding(Accept([('identity', 1)])) is None
+        assert compression.negotiate_encoding(Accept([('*', 1)])) in ('gzip', 'br')
@@ -0,0 +1,125 @@
+import logging
+import pytest
+from flask import jsonify
+from flask_jwt_extended import create_access_token
+from app.decorators import ROLE_RANKS, permission_required
+from app.models import User, db
+from tests.conftest import get_auth_headers
+
+
+@pytest.fixture
+def protected_client(app):
+    @app.route('/api/_test/editor-only')
+    @permission_required('editor', "Forbidden: Editor or Admin access required")
+    def _editor_only():
+        return jsonify(message='ok')
+
+    return app.test_client()
+
+
+def _headers(permission, enabled=True):
+    user = User(username=f'someone_{permission}_{enabled}', email=f'{permission}_{enabled}@test.com',
+                permission=permission, enabled=enabled, is_approved=True)
+    user.set_password('password123')
+    db.session.add(user)
+    db.session.commit()
+    token = create_access_token(identity=str(user.id), additional_claims={
+        'username': user.username, 'permission': permission, 'enabled': enabled, 'is_approved': True
+    })
+    return get_auth_headers(token)
+
+
+class TestPermissionRequired:
+
+    @pytest.mark.unit
+    def test_role_ranks_are_ordered(self):
+        assert ROLE_RANKS['readonly'] < ROLE_RANKS['editor'] < ROLE_RANKS['admin']
+
+    @pytest.mark.api
+    @pytest.mark.parametrize('permission, status', [
+        ('readonly', 403), ('editor', 200), ('admin', 200), ('unknown', 403)
+    ])
+    def test_minimum_rank_enforced(self, protected_client, permission, status):
+        response = protected_client.get('/api/_test/editor-only', headers=_headers(permission))
+        assert response.status_code == status
+        if status == 403:
+            assert response.get_json()['message'] == "Forbidden: Editor or Admin access required"
+
+    @pytest.mark.api
+    def test_disabled_account_rejected(self, protected_client):
+        response = protected_client.get('/api/_test/editor-only', headers=_headers('admin', enabled=False))
+        assert response.status_code == 403
+        assert response.get_json()['message'] == "Error: Account disabled"
+
+    @pytest.mark.api
+    def test_missing_token_is_401(self, protected_client):
+        assert protected_client.get('/api/_test/editor-only').status_code == 401
+
+    @pytest.mark.api
+    def test_no_stdout_and_denials_logged_without_payload(self, protected_client, capsys, caplog):
+        protected_client.get('/api/_test/editor-only', headers=_headers('admin'))
+        with caplog.at_level(logging.INFO, logger='app.decorators'):
+            protected_client.get('/api/_test/editor-only', headers=_headers('readonly'))
+
+        assert capsys.readouterr().out == ''
+        denial = [r for r in caplog.records if r.name == 'app.decorators']
+        assert len(denial) == 1
+        assert denial[0].auth_reason == 'insufficient_permission'
+        assert denial[0].auth_required == 'editor'
+        assert 'someone_' not in denial[0].getMessage()
+
+
+class TestLiveUserStatus:
+
+    @pytest.mark.api
+    def test_disable_applies_despite_token_claims(self, app, client, login_headers):
+        admin_headers = login_headers('admin')
+        editor_headers = login_headers('editor')
+        editor = User.query.filter_by(username='editor_1').one()
+        assert client.get('/api/projects', headers=editor_headers).status_code == 200
+
+        response = client.put(f'/api/users/{editor.id}', json={'enabled': False}, headers=admin_headers)
+        assert response.status_code == 200
+
+        response = client.get('/api/projects', headers=editor_headers)
+        assert response.status_code == 403
+        assert response.get_json()['message'] == "Error: Account disabled"
+
+    @pytest.mark.api
+    def test_permission_downgrade_applies(self, client, login_headers):
+        admin_headers = login_headers('admin')
+        editor_headers = login_headers('editor')
+        editor = User.query.filter_by(username='editor_1').one()
+        client.put(f'/api/users/{editor.id}', json={'permission': 'readonly'}, headers=admin_headers)
+
+        response = client.post('/api/projects', json={'name': 'X', 'prefix': 'X'}, headers=editor_headers)
+        assert response.status_code == 403
+
+    @pytest.mark.api
+    def test_deleted_user_rejected(self, client, login_headers):
+        admin_headers = login_headers('admin')
+        editor_headers = login_headers('editor')
+        editor = User.query.filter_by(username='editor_1').one()
+        client.delete(f'/api/users/{editor.id}', headers=admin_headers)
+
+        assert client.get('/api/projects', headers=editor_headers).status_code == 401
+
+    @pytest.mark.api
+    def test_status_cached_between_requests(self, client, login_headers, assert_max_queries):
+        headers = login_headers('readonly')
+        client.get('/api/hello', headers=headers)
+        with assert_max_queries(0):
+            for _ in range(5):
+                assert client.get('/api/hello', headers=headers).status_code == 200
+
+    @pytest.mark.api
+    def test_other_worker_sees_bump_after_check_interval(self, app):
+        from app.cache import VersionedCache, bump_cache_version
+        other_worker = VersionedCache('user_status', ttl=60, check_interval=0)
+        other_worker.get(1, lambda key: 'first')
+        assert other_worker.get(1, lambda key: 'unused') == 'first'
+
+        bump_cache_version('user_status')
+        db.session.commit()
+
+        assert other_worker.get(1, lambda key: 'reloaded') == 'reloaded'
@@ -0,0 +1,83 @@
+import csv
+import io
+import json
+import pytest
+from app.models import Machine, Part, PostProcess, Project, db
+from app.services import export_service
+
+
+class TestProjectExport:
+
+    @pytest.fixture
+    def robot(self, app, client, login_headers):
+        self.client = client
+        self.headers = login_headers('readonly')
+        project = Project(name='Export Robot', prefix='EX')
+        machine = Machine(name='Lathe')
+        deburr, anodize = PostProcess(name='Deburr'), PostProcess(name='Anodize')
+        db.session.add_all([project, machine, deburr, anodize])
+        db.session.flush()
+
+        def part(number, name, type_, parent=None, quantity=1, **fields):
+            p = Part(numeric_id=number, part_number=f'EX-{number:04d}', name=name, type=type_, quantity=quantity,
+                     project_id=project.id, parent_id=parent.id if parent else None, status='In Design', **fields)
+            db.session.add(p)
+            db.session.flush()
+            return p
+
+        robot = part(0, 'Robot', 'assembly')
+        module = part(100, 'Swerve Module', 'assembly', robot, quantity=4)
+        axle = part(101, 'Axle', 'part', module, quantity=2, machine_id=machine.id, raw_material='Steel')
+        axle.post_processes.extend([deburr, anodize])
+        db.session.commit()
+        self.project_id = project.id
+        return project
+
+    def _export(self, export_format):
+        return self.client.get(f'/api/projects/{self.project_id}/export?format={export_format}', headers=self.headers)
+
+    @pytest.mark.api
+    def test_csv_has_paths_and_exploded_quantities(self, robot):
+        response = self._export('csv')
+        assert response.status_code == 200
+        assert response.mimetype == 'text/csv'
+        assert 'EX-bom.csv' in response.headers['Content-Disposition']
+        rows = list(csv.DictReader(io.StringIO(response.get_data(as_text=True))))
+        assert [row['path'] for row in rows] == [
+            'Robot', 'Robot > Swerve Module', 'Robot > Swerve Module > Axle']
+        axle = rows[2]
+        assert (axle['quantity'], axle['total_quantity'], axle['machine']) == ('2', '8', 'Lathe')
+        assert sorted(axle['post_processes'].split(', ')) == ['Anodize', 'Deburr']
+
+    @pytest.mark.api
+    def test_ndjson_streams_one_object_per_part(self, robot, monkeypatch):
+        monkeypatch.setattr(export_service, 'EXPORT_BATCH_SIZE', 1)
+        response = self._export('ndjson')
+        assert response.status_code == 200
+        assert response.is_streamed
+        lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+        assert [line['name'] for line in lines] == ['Robot', 'Swerve Module', 'Axle']
+        assert lines[1]['total_quantity'] == 4 and lines[0]['post_processes'] is None
+
+    @pytest.mark.api
+    def test_xlsx_export(self, robot):
+        openpyxl = pytest.importorskip('openpyxl')
+        response = self._export('xlsx')
+        assert response.status_code == 200
+        sheet = openpyxl.load_workbook(io.BytesIO(response.get_data())).active
+        rows = list(sheet.values)
+        assert rows[0] == export_service.EXPORT_COLUMNS
+        assert rows[3][4:7] == ('Robot > Swerve Module > Axle', 2, 8)
+
+    @pytest.mark.api
+    def test_rejects_unknown_format(self, robot):
+        assert self._export('pdf').status_code == 400
+        assert self.client.get('/api/projects/9999/export', headers=self.headers).status_code == 404
+
+    @pytest.mark.unit
+    def test_path_column_fits_deepest_breadcrumb(self, app):
+        from sqlalchemy.dialects import mysql
+        sql = str(export_service.export_query(1).compile(dialect=mysql.dialect()))
+        width = export_service.PATH_TYPE.length
+        assert f'CAST(parts.name AS CHAR({width}))' in sql
+        assert width >= (export_service.MAX_TREE_DEPTH + 1) * (100 + len(export_service.PATH_SEPARATOR))
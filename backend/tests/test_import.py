@@ -0,0 +1,148 @@
+import io
+import pytest
+from app.models import Machine, Part, PostProcess, Project, db
+from app.rollups import check_rollups
+from app.services import import_service
+
+
+class TestBomImport:
+
+    @pytest.fixture
+    def robot(self, app, client, login_headers):
+        self.client = client
+        self.headers = login_headers('editor')
+        project = Project(name='Import Robot', prefix='IM')
+        db.session.add_all([project, Machine(name='Omax Waterjet'), PostProcess(name='Anodize'),
+                            PostProcess(name='Deburr')])
+        db.session.flush()
+        top = Part(numeric_id=0, part_number='IM-A-0000', name='Robot', type='assembly', quantity=1,
+                   project_id=project.id, status='In Design')
+        db.session.add(top)
+        db.session.commit()
+        self.project_id = project.id
+        return project
+
+    def _import(self, text, dry_run=False):
+        url = f'/api/projects/{self.project_id}/import' + ('?dry_run=true' if dry_run else '')
+        data = {'file': (io.BytesIO(text.encode('utf-8')), 'bom.csv')}
+        return self.client.post(url, headers=self.headers, data=data, content_type='multipart/form-data')
+
+    def _parts(self):
+        db.session.expire_all()
+        return {part.name: part for part in Part.query.filter_by(project_id=self.project_id)}
+
+    @pytest.mark.api
+    def test_imports_our_export_by_path(self, robot):
+        response = self._import(
+            'part_number,name,type,path,quantity,status,machine,raw_material,post_processes\n'
+            'XX-A-0100,Drivetrain,assembly,Robot > Drivetrain,1,In Design,,,\n'
+            'XX-A-0200,Gearbox,assembly,Robot > Drivetrain > Gearbox,2,In Design,,,\n'
+            'XX-P-0201,Gear,part,Robot > Drivetrain > Gearbox > Gear,3,Done,omax waterjet,Steel,"Anodize, Deburr"\n'
+        )
+        assert response.status_code == 201
+        report = response.get_json()['report']
+        assert (report['assembly_count'], report['part_count'], report['error_count']) == (2, 1, 0)
+
+        parts = self._parts()
+        drivetrain, gearbox, gear = parts['Drivetrain'], parts['Gearbox'], parts['Gear']
+        assert (drivetrain.part_number, gearbox.part_number, gear.part_number) == \
+            ('IM-A-0100', 'IM-A-0200', 'IM-P-0201')
+        assert gearbox.parent_id == drivetrain.id and gear.parent_id == gearbox.id
+        assert (gear.subteam_id, gear.subsystem_id) == (drivetrain.id, gearbox.id)
+        assert gear.quantity == 3 and gear.status == 'Done' and gear.raw_material == 'Steel'
+        assert sorted(process.name for process in gear.post_processes) == ['Anodize', 'Deburr']
+        assert check_rollups(self.project_id) == []
+
+    @pytest.mark.api
+    def test_imports_onshape_item_numbers(self, robot):
+        response = self._import(
+            'Item,Quantity,Part Number,Name,Material\n'
+            '1,1,ON-100,Intake,\n'
+            '1.1,2,ON-101,Roller,Aluminum\n'
+            '1.2,1,ON-102,Side Plate,Polycarbonate\n'
+            '2,4,ON-200,Bumper Bracket,\n'
+        )
+        report = response.get_json()['report']
+        assert report['errors'] == [{'row': 5, 'name': 'Bumper Bracket', 'error': 'A part needs a parent assembly'}]
+        parts = self._parts()
+        assert parts['Intake'].type == 'assembly' and parts['Intake'].parent_id is None
+        assert [parts[name].parent_id for name in ('Roller', 'Side Plate')] == [parts['Intake'].id] * 2
+        assert parts['Roller'].material == 'Aluminum' and parts['Roller'].quantity == 2
+
+    @pytest.mark.api
+    def test_parent_by_part_number_of_existing_assembly(self, robot):
+        response = self._import('name,type,parent\nBellypan,part,IM-A-0000\nFrame Rail,part,Robot\n')
+        assert response.status_code == 201
+        parts = self._parts()
+        assert [parts[name].part_number for name in ('Bellypan', 'Frame Rail')] == ['IM-P-0001', 'IM-P-0002']
+        assert parts['Bellypan'].parent_id == parts['Robot'].id
+
+    @pytest.mark.api
+    def test_bad_rows_are_reported_and_skipped(self, robot):
+        response = self._import(
+            'name,type,parent,quantity,machine,post processes\n'
+            'Plate,part,Robot,1,Laser Cutter,\n'
+            'Spacer,part,Robot,1,,Powder Coat\n'
+            ',part,Robot,1,,\n'
+            'Shaft,part,Nowhere,1,,\n'
+            'Bolt,widget,Robot,1,,\n'
+            'Nut,part,Robot,-2,,\n'
+            'Washer,part,Robot,10,Omax Waterjet,deburr\n'
+            f'{"x" * 101},part,Robot,1,,\n'
+        )
+        report = response.get_json()['report']
+        assert report['row_count'] == 8 and report['part_count'] == 1
+        assert [(error['row'], error['error']) for error in report['errors']] == [
+            (2, "Unknown machine 'Laser Cutter'"),
+            (3, "Unknown post-process 'Powder Coat'"),
+            (4, "'name' is required"),
+            (5, "Parent assembly 'Nowhere' not found"),
+            (6, "Invalid type 'widget'. Must be 'assembly' or 'part'"),
+            (7, "Invalid quantity '-2'"),
+            (9, "'name' is longer than 100 characters"),
+        ]
+        washer = self._parts()['Washer']
+        assert washer.machine.name == 'Omax Waterjet' and washer.post_processes[0].name == 'Deburr'
+
+    @pytest.mark.api
+    def test_dry_run_writes_nothing(self, robot):
+        response = self._import('name,type,path\nShooter,assembly,Robot > Shooter\nFlywheel,part,'
+                                'Robot > Shooter > Flywheel\n', dry_run=True)
+        assert response.status_code == 200
+        report = response.get_json()['report']
+        assert report['dry_run'] and (report['assembly_count'], report['part_count']) == (1, 1)
+        assert list(self._parts()) == ['Robot']
+
+    @pytest.mark.api
+    def test_inserts_in_chunks(self, robot, monkeypatch):
+        monkeypatch.setattr(import_service, 'IMPORT_CHUNK_SIZE', 2)
+        rows = ''.join(f'Plate {i},part,Robot\n' for i in range(5))
+        response = self._import('name,type,parent\nArm,assembly,Robot\n' + rows.replace('Robot', 'Robot > Arm'))
+        assert response.get_json()['report']['part_count'] == 5
+        parts = self._parts()
+        assert {parts[f'Plate {i}'].parent_id for i in range(5)} == {parts['Arm'].id}
+        assert check_rollups(self.project_id) == []
+
+    @pytest.mark.api
+    def test_part_number_conflict_rolls_back(self, robot, monkeypatch):
+        # Another request creates IM-A-0100 after the importer picked its numbers
+        original = import_service.BomImporter._load_existing
+
+        def load_then_race(importer):
+            original(importer)
+            db.session.add(Part(numeric_id=100, part_number='IM-A-0100', name='Racer', type='assembly', quantity=1,
+                                project_id=self.project_id, status='In Design'))
+            db.session.commit()
+
+        monkeypatch.setattr(import_service.BomImporter, '_load_existing', load_then_race)
+        response = self._import('name,type,path\nShooter,assembly,Robot > Shooter\n')
+        assert response.status_code == 409
+        assert response.get_json()['message'].startswith('Error:')
+        assert sorted(self._parts()) == ['Racer', 'Robot']
+
+    @pytest.mark.api
+    def test_requires_file_and_editor(self, robot, login_headers):
+        assert self.client.post(f'/api/projects/{self.project_id}/import', headers=self.headers).status_code == 400
+        response = self.client.post(f'/api/projects/{self.project_id}/import', headers=login_headers('readonly'),
+                                    data={'file': (io.BytesIO(b'name\n'), 'bom.csv')})
+        assert response.status_code == 403
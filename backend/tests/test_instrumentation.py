@@ -0,0 +1,99 @@
+import os
+import tempfile
+import pytest
+from app import create_app, db
+from app.instrumentation import MetricsRegistry, timed_airtable_call
+from app.models import Project
+
+
+@pytest.fixture
+def app():
+    """Same as the conftest app, with instrumentation switched on."""
+    db_fd, db_path = tempfile.mkstemp()
+    app = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{db_path}',
+        'JWT_SECRET_KEY': 'test-secret-key',
+        'METRICS_ENABLED': True,
+    })
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.drop_all()
+    os.close(db_fd)
+    os.unlink(db_path)
+
+
+class TestInstrumentation:
+
+    @pytest.mark.api
+    def test_server_timing_header_counts_queries(self, client, login_headers):
+        db.session.add_all([Project(name='A', prefix='A'), Project(name='B', prefix='B')])
+        db.session.commit()
+        response = client.get('/api/projects', headers=login_headers('readonly'))
+
+        assert response.status_code == 200
+        server_timing = response.headers['Server-Timing']
+        assert 'db;dur=' in server_timing
+        assert 'serialize;dur=' in server_timing
+        assert 'total;dur=' in server_timing
+        assert '"0 queries"' not in server_timing
+
+    @pytest.mark.api
+    def test_metrics_endpoint_exposes_prometheus_text(self, app, client, login_headers):
+        headers = login_headers('readonly')
+        client.get('/api/projects', headers=headers)
+        client.get('/api/projects', headers=headers)
+
+        registry = app.extensions['metrics']
+        assert registry.counter_value('broncoparts_http_requests_total',
+                                      endpoint='main.get_projects', method='GET', status='200') == 2
+
+        response = client.get('/metrics')
+        body = response.get_data(as_text=True)
+        assert response.status_code == 200
+        assert '# TYPE broncoparts_http_request_duration_seconds histogram' in body
+        assert 'broncoparts_http_request_duration_seconds_count{endpoint="main.get_projects"} 2' in body
+        assert 'broncoparts_db_queries_total{endpoint="main.get_projects"}' in body
+
+    @pytest.mark.api
+    def test_airtable_calls_counted_once_when_nested(self, app):
+        @timed_airtable_call
+        def inner():
+            return 'inner'
+
+        @timed_airtable_call
+        def outer():
+            return inner() + inner()
+
+        with app.test_request_context('/api/parts'):
+            app.preprocess_request()
+            outer()
+            from flask import g
+            assert g.request_timing.airtable_count == 1
+
+    @pytest.mark.api
+    def test_disabled_by_default(self):
+        plain_app = create_app({
+            'TESTING': True,
+            'SQLALCHEMY_DATABASE_URI': 'sqlite://',
+            'JWT_SECRET_KEY': 'test-secret-key',
+        })
+        client = plain_app.test_client()
+
+        assert 'metrics' not in plain_app.extensions
+        assert 'Server-Timing' not in client.get('/api/hello').headers
+        assert client.get('/metrics').status_code == 404
+
+    @pytest.mark.unit
+    def test_registry_histogram_buckets_are_cumulative(self):
+        registry = MetricsRegistry(buckets=(0.1, 1.0))
+        registry.observe('latency_seconds', {'endpoint': 'x'}, 0.05)
+        registry.observe('latency_seconds', {'endpoint': 'x'}, 0.5)
+        registry.observe('latency_seconds', {'endpoint': 'x'}, 5)
+        text = registry.render()
+
+        assert 'latency_seconds_bucket{endpoint="x",le="0.1"} 1' in text
+        assert 'latency_seconds_bucket{endpoint="x",le="1.0"} 2' in text
+        assert 'latency_seconds_bucket{endpoint="x",le="+Inf"} 3' in text
+        assert 'latency_seconds_count{endpoint="x"} 3' in text
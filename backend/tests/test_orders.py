@@ -1,7 +1,10 @@
 import pytest
 import json
+from datetime import datetime, timedelta
 from decimal import Decimal
-from app.models import Order, OrderItem, db
+from sqlalchemy import update
+from app.models import Order, OrderItem, Part, Project, db
+from app.order_totals import find_total_drift, reconcile_order_totals
 from tests.conftest import get_auth_headers
 
 
@@ -110,7 +113,6 @@ class TestOrderRoutes:
         update_data = {
             'customer_name': 'Updated Customer',
             'status': 'Shipped',
-            'total_amount': 150.75,
             'reimbursed': True
         }
         
@@ -122,7 +124,7 @@ class TestOrderRoutes:
         assert 'Order updated successfully' in data['message']
         assert data['order']['customer_name'] == 'Updated Customer'
         assert data['order']['status'] == 'Shipped'
-        assert float(data['order']['total_amount']) == 150.75
+        assert float(data['order']['total_amount']) == 100.00
         assert data['order']['reimbursed'] is True
 
     @pytest.mark.api
@@ -410,4 +412,209 @@ class TestOrderItemRoutes:
         order_data = {'customer_name': 'New Customer'}
         response = client.post('/api/orders', headers=headers, json=order_data)
         # This might be 403 if orders require editor+ permissions
-        assert response.status_code in [201, 403]  # Implementation dependent
\ No newline at end of file
+        assert response.status_code in [201, 403]  # Implementation dependent
+
+
+class TestOrderListing:
+
+    @pytest.fixture
+    def many_orders(self, app, login_headers):
+        self.admin_headers = login_headers('admin')
+        projects = [Project(name='Robot A', prefix='RA'), Project(name='Robot B', prefix='RB')]
+        db.session.add_all(projects)
+        db.session.flush()
+        part = Part(numeric_id=1, part_number='RA-P-0001', name='Bracket', type='part', quantity=1,
+                    project_id=projects[0].id)
+        db.session.add(part)
+        base = datetime(2026, 1, 1, 12)
+        for i in range(12):
+            order = Order(order_number=f'ORD-{i:03d}', project_id=projects[i % 2].id,
+                          status='Delivered' if i < 4 else 'Pending', reimbursed=i % 3 == 0,
+                          total_amount=Decimal('0.00'), order_date=base + timedelta(days=i))
+            db.session.add(order)
+            db.session.flush()
+            for j in range(i % 4):
+                db.session.add(OrderItem(order_id=order.id, part_id=part.id, quantity=j + 1, unit_price=Decimal('2.50')))
+        db.session.commit()
+        self.project_ids = [p.id for p in projects]
+
+    @pytest.mark.api
+    def test_counts_and_totals_in_constant_queries(self, client, many_orders, assert_max_queries):
+        with assert_max_queries(4):
+            data = client.get('/api/orders', headers=self.admin_headers).get_json()
+        assert [o['order_number'] for o in data['orders']] == [f'ORD-{i:03d}' for i in range(11, -1, -1)]
+        by_number = {o['order_number']: o for o in data['orders']}
+        assert by_number['ORD-003']['items_count'] == 3
+        assert by_number['ORD-003']['items_total'] == '15.00'
+        assert by_number['ORD-004']['items_count'] == 0
+        assert by_number['ORD-004']['items_total'] == '0.00'
+        assert 'next_cursor' not in data
+
+    @pytest.mark.api
+    def test_keyset_pagination(self, client, many_orders):
+        seen = []
+        url = '/api/orders?limit=5'
+        while True:
+            data = client.get(url, headers=self.admin_headers).get_json()
+            seen.extend(o['order_number'] for o in data['orders'])
+            if data['next_cursor'] is None:
+                break
+            url = f"/api/orders?limit=5&cursor={data['next_cursor']}"
+        assert seen == [f'ORD-{i:03d}' for i in range(11, -1, -1)]
+
+        assert client.get('/api/orders?cursor=garbage', headers=self.admin_headers).status_code == 400
+        assert client.get('/api/orders?limit=0', headers=self.admin_headers).status_code == 400
+
+    @pytest.mark.api
+    def test_keyset_pagination_with_undated_orders(self, client, many_orders):
+        db.session.execute(update(Order).where(Order.order_number.in_(['ORD-002', 'ORD-005', 'ORD-007']))
+                           .values(order_date=None))
+        db.session.commit()
+        seen = []
+        url = '/api/orders?limit=5'
+        while True:
+            data = client.get(url, headers=self.admin_headers).get_json()
+            seen.extend(o['order_number'] for o in data['orders'])
+            if data['next_cursor'] is None:
+                break
+            url = f"/api/orders?limit=5&cursor={data['next_cursor']}"
+        dated = [f'ORD-{i:03d}' for i in range(11, -1, -1) if i not in (2, 5, 7)]
+        assert seen == dated + ['ORD-007', 'ORD-005', 'ORD-002']
+
+    @pytest.mark.api
+    def test_filters(self, client, many_orders):
+        def numbers(query):
+            response = client.get(f'/api/orders?{query}', headers=self.admin_headers)
+            assert response.status_code == 200
+            return [o['order_number'] for o in response.get_json()['orders']]
+
+        assert numbers(f'project_id={self.project_ids[1]}&status=Delivered') == ['ORD-003', 'ORD-001']
+        assert numbers('reimbursed=true') == ['ORD-009', 'ORD-006', 'ORD-003', 'ORD-000']
+        # date_to is inclusive when given as a bare date
+        assert numbers('date_from=2026-01-03&date_to=2026-01-05') == ['ORD-004', 'ORD-003', 'ORD-002']
+        assert client.get('/api/orders?date_from=yesterday', headers=self.admin_headers).status_code == 400
+
+    @pytest.mark.api
+    def test_admin_only(self, client, many_orders, login_headers):
+        assert client.get('/api/orders', headers=login_headers('editor')).status_code == 403
+
+
+class TestCreateOrderBulk:
+
+    @pytest.fixture
+    def parts(self, app):
+        project = Project(name='Robot C', prefix='RC')
+        db.session.add(project)
+        db.session.flush()
+        parts = [Part(numeric_id=i, part_number=f'RC-P-{i:04d}', name=f'Spacer {i}', type='part', quantity=1,
+                      project_id=project.id) for i in range(1, 41)]
+        db.session.add_all(parts)
+        db.session.commit()
+        return [p.id for p in parts]
+
+    @pytest.mark.api
+    def test_items_inserted_in_constant_queries(self, client, login_headers, parts, assert_max_queries):
+        headers = login_headers('editor')
+        items = [{'part_id': part_id, 'quantity': 2, 'unit_price': '1.25'} for part_id in parts]
+        with assert_max_queries(12, max_repeats=2):
+            response = client.post('/api/orders', headers=headers, json={'order_number': 'MC-40', 'items': items})
+        assert response.status_code == 201
+        order = response.get_json()['order']
+        assert order['total_amount'] == '100.00'
+        assert [item['part_id'] for item in order['items']] == parts
+
+        stored = {item.id: item.part_id for item in OrderItem.query.filter_by(order_id=order['id'])}
+        assert {item['id']: item['part_id'] for item in order['items']} == stored
+
+    @pytest.mark.api
+    def test_without_executemany_returning(self, client, login_headers, parts, monkeypatch):
+        monkeypatch.setattr(db.engine.dialect, 'insert_executemany_returning', False)
+        items = [{'part_id': part_id, 'quantity': 1, 'unit_price': 2} for part_id in parts[:5]]
+        response = client.post('/api/orders', headers=login_headers('editor'),
+                               json={'order_number': 'MC-5', 'items': items})
+        assert response.status_code == 201
+        assert [item['part_id'] for item in response.get_json()['order']['items']] == parts[:5]
+
+    @pytest.mark.api
+    def test_unknown_part_writes_nothing(self, client, login_headers, parts):
+        headers = login_headers('editor')
+        items = [{'part_id': parts[0], 'quantity': 1, 'unit_price': 5}, {'part_id': 99999, 'quantity': 1, 'unit_price': 5}]
+        response = client.post('/api/orders', headers=headers, json={'order_number': 'MC-1', 'items': items})
+        assert response.status_code == 404
+        assert '99999' in response.get_json()['message']
+        assert Order.query.count() == 0 and OrderItem.query.count() == 0
+
+    @pytest.mark.api
+    def test_duplicate_order_number(self, client, login_headers, parts):
+        headers = login_headers('editor')
+        payload = {'order_number': 'MC-2', 'items': [{'part_id': parts[0], 'quantity': 1, 'unit_price': 5}]}
+        assert client.post('/api/orders', headers=headers, json=payload).status_code == 201
+        assert client.post('/api/orders', headers=headers, json=payload).status_code == 409
+
+
+class TestOrderTotals:
+
+    @pytest.fixture
+    def order(self, app, login_headers):
+        self.headers = login_headers('admin')
+        project = Project(name='Robot D', prefix='RD')
+        db.session.add(project)
+        db.session.flush()
+        self.part = Part(numeric_id=1, part_number='RD-P-0001', name='Hex Shaft', type='part', quantity=1,
+                         project_id=project.id)
+        db.session.add(self.part)
+        db.session.flush()
+        response = self.client.post('/api/orders', headers=self.headers, json={
+            'order_number': 'TOT-1', 'items': [{'part_id': self.part.id, 'quantity': 3, 'unit_price': '0.10'}]})
+        return response.get_json()['order']
+
+    @pytest.fixture(autouse=True)
+    def _client(self, client):
+        self.client = client
+
+    def _total(self, order_id):
+        return self.client.get(f'/api/orders/{order_id}', headers=self.headers).get_json()['order']['total_amount']
+
+    @pytest.mark.api
+    def test_item_changes_apply_deltas(self, order):
+        url = f"/api/orders/{order['id']}/items"
+        response = self.client.post(url, headers=self.headers,
+                                    json={'part_id': self.part.id, 'quantity': 7, 'unit_price': '0.70'})
+        assert response.status_code == 201
+        assert response.get_json()['new_total_amount'] == '5.20'
+        item_id = response.get_json()['item']['id']
+
+        response = self.client.put(f'{url}/{item_id}', headers=self.headers, json={'quantity': 1})
+        assert response.get_json()['new_total_amount'] == '1.00'
+        response = self.client.put(f'{url}/{item_id}', headers=self.headers, json={'unit_price': 'cheap'})
+        assert response.status_code == 400
+
+        first_item_id = order['items'][0]['id']
+        response = self.client.delete(f'{url}/{first_item_id}', headers=self.headers)
+        assert response.get_json()['new_total_amount'] == '0.70'
+        assert self._total(order['id']) == '0.70'
+        assert find_total_drift() == []
+
+    @pytest.mark.api
+    def test_item_routes_admin_only(self, order, login_headers):
+        editor = login_headers('editor')
+        url = f"/api/orders/{order['id']}/items"
+        assert self.client.post(url, headers=editor, json={'part_id': self.part.id, 'quantity': 1,
+                                                           'unit_price': 1}).status_code == 403
+        assert self.client.delete(f"{url}/{order['items'][0]['id']}", headers=editor).status_code == 403
+
+    @pytest.mark.api
+    def test_update_order_rejects_total(self, order):
+        response = self.client.put(f"/api/orders/{order['id']}", headers=self.headers, json={'total_amount': 1})
+        assert response.status_code == 400
+        assert self._total(order['id']) == '0.30'
+
+    @pytest.mark.api
+    def test_reconcile_fixes_drift(self, order):
+        db.session.execute(db.update(Order).where(Order.id == order['id']).values(total_amount=Decimal('9.99')))
+        db.session.commit()
+        assert find_total_drift() == [(order['id'], Decimal('9.99'), Decimal('0.30'))]
+
+        assert len(reconcile_order_totals(fix=True)) == 1
+        assert find_total_drift() == []
+        assert self._total(order['id']) == '0.30'
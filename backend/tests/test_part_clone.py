@@ -0,0 +1,105 @@
+import pytest
+from app.models import Part, PostProcess, Project, db
+from app.rollups import check_rollups, rebuild_rollups, rollup_for
+
+
+class TestPartClone:
+
+    @pytest.fixture
+    def robot(self, app, client, login_headers):
+        self.client = client
+        self.headers = login_headers('editor')
+        project = Project(name='Clone Robot', prefix='CL')
+        process = PostProcess(name='Anodize')
+        db.session.add_all([project, process])
+        db.session.flush()
+        self.project_id = project.id
+
+        self.top = self._add(0, 'Robot', 'assembly')
+        self.swerve = self._add(100, 'Swerve Module', 'assembly', self.top)
+        self.gearbox = self._add(200, 'Gearbox', 'assembly', self.swerve)
+        self.plate = self._add(101, 'Module Plate', 'part', self.swerve, status='Done', have_material=True)
+        self.wheel = self._add(105, 'Wheel', 'part', self.swerve)
+        self.gear = self._add(201, 'Gear', 'part', self.gearbox, drawing_created=True)
+        plate = db.session.get(Part, self.plate)
+        plate.post_processes.append(process)
+        db.session.commit()
+        self.process_id = process.id
+        rebuild_rollups(self.project_id)
+        return project
+
+    def _add(self, number, name, part_type, parent_id=None, status='In Design', **fields):
+        part = Part(numeric_id=number, name=name, type=part_type, quantity=2, status=status,
+                    part_number=f"CL-{'A' if part_type == 'assembly' else 'P'}-{number:04d}",
+                    project_id=self.project_id, parent_id=parent_id, **fields)
+        db.session.add(part)
+        db.session.flush()
+        return part.id
+
+    def _clone(self, part_id, **body):
+        return self.client.post(f'/api/parts/{part_id}/clone', headers=self.headers, json=body)
+
+    def _copies(self, root_id):
+        db.session.expire_all()
+        rows = {}
+        pending = [root_id]
+        while pending:
+            part = db.session.get(Part, pending.pop())
+            rows[part.name] = part
+            pending.extend(child.id for child in part.children)
+        return rows
+
+    @pytest.mark.api
+    def test_clone_renumbers_and_remaps(self, robot):
+        response = self._clone(self.swerve, parent_id=self.top)
+        assert response.status_code == 201
+        data = response.get_json()
+        assert data['cloned_count'] == 5
+        assert data['part']['part_number'] == 'CL-A-0300'
+
+        copies = self._copies(data['part']['id'])
+        module, gearbox = copies['Swerve Module'], copies['Gearbox']
+        assert {name: part.part_number for name, part in copies.items()} == {
+            'Swerve Module': 'CL-A-0300', 'Gearbox': 'CL-A-0400',
+            'Module Plate': 'CL-P-0301', 'Wheel': 'CL-P-0302', 'Gear': 'CL-P-0401',
+        }
+        assert gearbox.parent_id == module.id and copies['Gear'].parent_id == gearbox.id
+        assert (copies['Gear'].subteam_id, copies['Gear'].subsystem_id) == (module.id, gearbox.id)
+        assert (module.subteam_id, module.subsystem_id) == (None, None)
+        assert copies['Module Plate'].status == 'Done' and copies['Module Plate'].quantity == 2
+        assert [pp.id for pp in copies['Module Plate'].post_processes] == [self.process_id]
+
+        # Source untouched
+        assert db.session.get(Part, self.gear).parent_id == self.gearbox
+        assert rollup_for(self.top)['part_count'] == 6
+        assert rollup_for(module.id)['by_status'] == {'Done': 1, 'In Design': 2}
+        assert check_rollups() == []
+
+    @pytest.mark.api
+    def test_clone_into_another_project(self, robot):
+        other = Project(name='Next Season', prefix='NS')
+        db.session.add(other)
+        db.session.commit()
+        response = self._clone(self.swerve, project_id=other.id)
+        assert response.status_code == 201
+        copies = self._copies(response.get_json()['part']['id'])
+        assert copies['Swerve Module'].part_number == 'NS-A-0000'
+        assert copies['Gear'].part_number == 'NS-P-0101'
+        assert {part.project_id for part in copies.values()} == {other.id}
+        assert check_rollups() == []
+
+    @pytest.mark.api
+    def test_clone_single_part(self, robot):
+        response = self._clone(self.plate, parent_id=self.swerve)
+        assert response.status_code == 201
+        assert response.get_json()['part']['part_number'] == 'CL-P-0106'
+        assert rollup_for(self.swerve)['part_count'] == 4
+        assert check_rollups() == []
+
+    @pytest.mark.api
+    def test_rejects_invalid_targets(self, robot):
+        assert self._clone(self.swerve, parent_id=self.plate).status_code == 400
+        assert self._clone(self.plate).status_code == 400
+        assert self._clone(self.swerve, parent_id=999999).status_code == 404
+        assert self._clone(self.swerve, project_id=999999).status_code == 404
+        assert self._clone(self.swerve, parent_id='top').status_code == 400
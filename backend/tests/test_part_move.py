@@ -0,0 +1,110 @@
+import pytest
+from app.models import Part, Project, db
+from app.rollups import check_rollups, rebuild_rollups
+
+
+class TestPartMove:
+
+    @pytest.fixture
+    def robot(self, app, client, login_headers):
+        self.client = client
+        self.headers = login_headers('editor')
+        project = Project(name='Move Robot', prefix='MV')
+        db.session.add(project)
+        db.session.flush()
+        self.project_id = project.id
+
+        self.top = self._add('Robot', 'assembly')
+        self.drive = self._add('Drivetrain', 'assembly', self.top)
+        self.intake = self._add('Intake', 'assembly', self.top)
+        self.gearbox = self._add('Gearbox', 'assembly', self.drive)
+        self.gear = self._add('Gear', 'part', self.gearbox)
+        self.roller = self._add('Roller', 'part', self.intake)
+        db.session.commit()
+        rebuild_rollups(self.project_id)
+        db.session.commit()
+        return project
+
+    def _add(self, name, part_type, parent_id=None):
+        self.next_number = getattr(self, 'next_number', 0) + 1
+        part = Part(numeric_id=self.next_number, name=name, type=part_type, part_number=f'MV-{name}', quantity=1,
+                    project_id=self.project_id, parent_id=parent_id, status='In Design')
+        db.session.add(part)
+        db.session.flush()
+        return part.id
+
+    def _move(self, part_id, parent_id):
+        return self.client.post(f'/api/parts/{part_id}/move', headers=self.headers, json={'parent_id': parent_id})
+
+    def _derived(self, part_id):
+        db.session.expire_all()
+        part = db.session.get(Part, part_id)
+        return part.subteam_id, part.subsystem_id
+
+    @pytest.mark.api
+    def test_move_recomputes_the_whole_subtree(self, robot):
+        response = self._move(self.drive, self.intake)
+        assert response.status_code == 200
+        data = response.get_json()
+        assert data['moved_count'] == 3
+        assert data['part']['parent_id'] == self.intake
+
+        assert self._derived(self.drive) == (self.intake, None)
+        assert self._derived(self.gearbox) == (self.intake, self.drive)
+        assert self._derived(self.gear) == (self.intake, self.drive)
+        assert self._derived(self.roller) == (None, None)  # Outside the moved subtree
+        assert check_rollups() == []
+
+    @pytest.mark.api
+    def test_move_to_top_level(self, robot):
+        assert self._move(self.gearbox, None).status_code == 200
+        assert self._derived(self.gearbox) == (None, None)
+        assert self._derived(self.gear) == (None, None)
+        assert check_rollups() == []
+
+    @pytest.mark.api
+    def test_rejects_cycles_through_descendants(self, robot):
+        response = self._move(self.top, self.gearbox)
+        assert response.status_code == 400
+        assert 'descendants' in response.get_json()['message']
+        assert self._move(self.drive, self.drive).status_code == 400
+        db.session.expire_all()
+        assert db.session.get(Part, self.top).parent_id is None
+
+    @pytest.mark.api
+    def test_rejects_invalid_targets(self, robot):
+        assert self._move(self.gearbox, self.roller).status_code == 400  # Not an assembly
+        assert self._move(self.gear, None).status_code == 400  # Parts need a parent
+        assert self._move(self.gear, 999999).status_code == 404
+        assert self._move(self.gear, 'abc').status_code == 400
+
+        other = Project(name='Other Robot', prefix='OT')
+        db.session.add(other)
+        db.session.flush()
+        foreign = Part(name='Foreign', type='assembly', part_number='OT-1', numeric_id=1, quantity=1, project_id=other.id)
+        db.session.add(foreign)
+        db.session.commit()
+        assert self._move(self.gear, foreign.id).status_code == 400
+
+    @pytest.mark.api
+    def test_update_part_parent_change_uses_move(self, robot):
+        response = self.client.put(f'/api/parts/{self.gearbox}', headers=self.headers, json={'parent_id': self.intake})
+        assert response.status_code == 200
+        assert self._derived(self.gear) == (self.intake, self.gearbox)
+        assert check_rollups() == []
+
+        response = self.client.put(f'/api/parts/{self.top}', headers=self.headers, json={'parent_id': self.gear})
+        assert response.status_code == 400
+
+    @pytest.mark.unit
+    @pytest.mark.parametrize('breadcrumb', [[], [1], [1, 2], [1, 2, 3]])
+    def test_subtree_anchor_columns_are_typed_for_mysql(self, app, breadcrumb):
+        # MySQL types a recursive CTE's columns from the anchor; a bare NULL would be BINARY(0)
+        from sqlalchemy.dialects import mysql
+        from app.services.hierarchy_service import subtree_fields_query
+        sql = str(subtree_fields_query(5, breadcrumb).compile(dialect=mysql.dialect(),
+                                                              compile_kwargs={'literal_binds': True}))
+        anchor = sql.split('UNION ALL')[0]
+        for column in ('depth', 'subteam_id', 'subsystem_id'):
+            assert f'AS SIGNED INTEGER) AS {column}' in anchor
+        assert ', NULL AS' not in anchor
@@ -0,0 +1,82 @@
+import pytest
+from werkzeug.security import generate_password_hash
+from app import passwords
+from app.models import User, db
+
+
+@pytest.fixture
+def fresh_pool():
+    passwords.reset_pool()
+    yield
+    passwords.reset_pool()
+
+
+@pytest.fixture
+def legacy_user(app):
+    user = User(username='legacy', email='legacy@test.com', permission='readonly', enabled=True, is_approved=True,
+                password_hash=generate_password_hash('password123', method='pbkdf2:sha256:1000'))
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+
+class TestPasswordHashing:
+
+    @pytest.mark.unit
+    def test_needs_rehash_normalizes_defaults(self):
+        scrypt_hash = generate_password_hash('x', method='scrypt')
+        assert not passwords.needs_rehash(scrypt_hash, 'scrypt')
+        assert not passwords.needs_rehash(scrypt_hash, 'scrypt:32768:8:1')
+        assert passwords.needs_rehash(scrypt_hash, 'scrypt:16384:8:1')
+        assert passwords.needs_rehash(scrypt_hash, 'pbkdf2')
+
+    @pytest.mark.unit
+    def test_set_password_uses_configured_method(self, app):
+        app.config['PASSWORD_HASH_METHOD'] = 'pbkdf2:sha256:2000'
+        user = User()
+        user.set_password('secret')
+        assert user.password_hash.startswith('pbkdf2:sha256:2000$')
+        assert user.check_password('secret')
+        assert not user.check_password('wrong')
+
+    @pytest.mark.auth
+    def test_login_rehashes_outdated_hash(self, app, client, legacy_user):
+        app.config['PASSWORD_HASH_METHOD'] = 'pbkdf2:sha256:2000'
+        response = client.post('/api/login', json={'email': 'legacy@test.com', 'password': 'password123'})
+
+        assert response.status_code == 200
+        db.session.refresh(legacy_user)
+        assert legacy_user.password_hash.startswith('pbkdf2:sha256:2000$')
+        assert legacy_user.check_password('password123')
+
+    @pytest.mark.auth
+    def test_failed_login_does_not_rehash(self, app, client, legacy_user):
+        app.config['PASSWORD_HASH_METHOD'] = 'pbkdf2:sha256:2000'
+        client.post('/api/login', json={'email': 'legacy@test.com', 'password': 'wrong'})
+
+        db.session.refresh(legacy_user)
+        assert legacy_user.password_hash.startswith('pbkdf2:sha256:1000$')
+
+    @pytest.mark.unit
+    def test_pending_limit_stays_below_server_threads(self, app):
+        app.config.update(PASSWORD_HASH_MAX_PENDING=None, SERVER_THREADS=8)
+        assert passwords.max_pending() == 4
+        app.config.update(SERVER_THREADS=1)
+        assert passwords.max_pending() == 1
+        app.config.update(PASSWORD_HASH_MAX_PENDING=3)
+        assert passwords.max_pending() == 3
+
+    @pytest.mark.auth
+    def test_busy_pool_returns_503(self, app, client, legacy_user, fresh_pool):
+        app.config.update(PASSWORD_HASH_WORKERS=1, PASSWORD_HASH_MAX_PENDING=1, PASSWORD_HASH_WAIT_TIMEOUT=0.01)
+        _, slots = passwords._get_pool()
+        slots.acquire()
+        try:
+            response = client.post('/api/login', json={'email': 'legacy@test.com', 'password': 'password123'})
+        finally:
+            slots.release()
+
+        assert response.status_code == 503
+        assert response.headers['Retry-After'] == '1'
+        response = client.post('/api/login', json={'email': 'legacy@test.com', 'password': 'password123'})
+        assert response.status_code == 200
@@ -1,6 +1,9 @@
 import pytest
 import json
-from app.models import Project, Part, db
+from datetime import datetime
+from decimal import Decimal
+from app.models import Order, OrderItem, PostProcess, Project, Part, db
+from app.rollups import check_rollups, rebuild_rollups
 from tests.conftest import get_auth_headers
 
 
@@ -312,4 +315,304 @@ class TestProjectRoutes:
             elif method == 'DELETE':
                 response = client.delete(endpoint)
             
-            assert response.status_code == 401
\ No newline at end of file
+            assert response.status_code == 401
+
+
+class TestProjectSpend:
+
+    @pytest.fixture
+    def spend_project(self, app, login_headers):
+        self.headers = login_headers('admin')
+        project = Project(name='Spend Robot', prefix='SR')
+        other = Project(name='Other Robot', prefix='OR')
+        db.session.add_all([project, other])
+        db.session.flush()
+
+        def part(number, type_, parent=None, project_id=project.id):
+            p = Part(numeric_id=number, part_number=f'SR-{number:04d}-{project_id}', name=f'Part {number}', type=type_,
+                     quantity=1, project_id=project_id, parent_id=parent.id if parent else None)
+            db.session.add(p)
+            db.session.flush()
+            return p
+
+        self.top = part(0, 'assembly')
+        self.drive = part(100, 'assembly', self.top)
+        self.gearbox = part(200, 'assembly', self.drive)
+        self.gear = part(201, 'part', self.gearbox)
+        self.loose = part(1, 'part')
+        foreign = part(1, 'part', project_id=other.id)
+
+        def order(number, when, reimbursed, lines):
+            o = Order(order_number=number, order_date=when, reimbursed=reimbursed, total_amount=Decimal('0'))
+            db.session.add(o)
+            db.session.flush()
+            db.session.add_all(OrderItem(order_id=o.id, part_id=p.id, quantity=q, unit_price=Decimal(price))
+                               for p, q, price in lines)
+
+        order('S-1', datetime(2026, 1, 15), True, [(self.gear, 4, '2.50'), (self.loose, 1, '1.00')])
+        order('S-2', datetime(2026, 2, 3), False, [(self.gearbox, 1, '30.00'), (foreign, 9, '9.00')])
+        order('S-3', datetime(2026, 2, 20), True, [(self.drive, 2, '0.25')])
+        db.session.commit()
+        return project
+
+    @pytest.mark.api
+    def test_spend_by_month_and_rolled_up_assembly(self, client, spend_project, assert_max_queries):
+        with assert_max_queries(6):
+            response = client.get(f'/api/projects/{spend_project.id}/spend', headers=self.headers)
+        assert response.status_code == 200
+        data = response.get_json()
+        assert data['total'] == {'reimbursed': '11.50', 'unreimbursed': '30.00', 'total': '41.50'}
+        assert data['by_month'] == [
+            {'month': '2026-01', 'reimbursed': '11.00', 'unreimbursed': '0.00', 'total': '11.00'},
+            {'month': '2026-02', 'reimbursed': '0.50', 'unreimbursed': '30.00', 'total': '30.50'},
+        ]
+        by_assembly = {a['id']: (a['reimbursed'], a['unreimbursed']) for a in data['by_assembly']}
+        assert by_assembly == {
+            self.top.id: ('10.50', '30.00'),
+            self.drive.id: ('10.50', '30.00'),
+            self.gearbox.id: ('10.00', '30.00'),
+        }
+
+    @pytest.mark.api
+    def test_cached_until_order_write(self, client, spend_project):
+        url = f'/api/projects/{spend_project.id}/spend'
+        assert client.get(url, headers=self.headers).get_json()['total']['total'] == '41.50'
+
+        # A write that bypasses the routes is served from the cache...
+        db.session.execute(db.update(OrderItem).values(unit_price=Decimal('0')))
+        db.session.commit()
+        assert client.get(url, headers=self.headers).get_json()['total']['total'] == '41.50'
+
+        # ...while an order route bumps the cache version
+        order_id = Order.query.filter_by(order_number='S-1').one().id
+        response = client.post(f'/api/orders/{order_id}/items', headers=self.headers,
+                               json={'part_id': self.gear.id, 'quantity': 1, 'unit_price': '5.00'})
+        assert response.status_code == 201
+        assert client.get(url, headers=self.headers).get_json()['total']['total'] == '5.00'
+
+    @pytest.mark.api
+    def test_assembly_rename_refreshes_cached_names(self, client, spend_project):
+        url = f'/api/projects/{spend_project.id}/spend'
+        names = lambda: {a['id']: a['name'] for a in client.get(url, headers=self.headers).get_json()['by_assembly']}
+        assert names()[self.gearbox.id] == 'Part 200'
+
+        response = client.put(f'/api/parts/{self.gearbox.id}', headers=self.headers, json={'name': 'Swerve Gearbox'})
+        assert response.status_code == 200
+        assert names()[self.gearbox.id] == 'Swerve Gearbox'
+
+    @pytest.mark.api
+    def test_spend_requires_admin_and_project(self, client, spend_project, login_headers):
+        assert client.get(f'/api/projects/{spend_project.id}/spend', headers=login_headers('editor')).status_code == 403
+        assert client.get('/api/projects/9999/spend', headers=self.headers).status_code == 404
+
+    @pytest.mark.unit
+    @pytest.mark.parametrize('dialect, function', [('mysql', 'date_format'), ('postgresql', 'to_char'),
+                                                   ('sqlite', 'strftime')])
+    def test_month_expression_per_dialect(self, app, monkeypatch, dialect, function):
+        from types import SimpleNamespace
+        from app.services.spend_service import _month_of
+        monkeypatch.setattr(db.session, 'get_bind', lambda: SimpleNamespace(dialect=SimpleNamespace(name=dialect)))
+        assert _month_of(Order.order_date).name == function
+
+
+class TestTreeDepth:
+
+    @pytest.fixture
+    def deep_project(self, app, login_headers):
+        self.headers = login_headers('readonly')
+        project = Project(name='Deep Robot', prefix='DR')
+        db.session.add(project)
+        db.session.flush()
+        self.ids = {}
+
+        def part(name, type_, parent=None):
+            p = Part(numeric_id=len(self.ids), part_number=f'DR-{len(self.ids):04d}', name=name, type=type_,
+                     quantity=1, project_id=project.id, parent_id=self.ids.get(parent))
+            db.session.add(p)
+            db.session.flush()
+            self.ids[name] = p.id
+
+        part('Robot', 'assembly')
+        part('Drivetrain', 'assembly', 'Robot')
+        part('Arm', 'assembly', 'Robot')
+        part('Gearbox', 'assembly', 'Drivetrain')
+        part('Wheel', 'part', 'Drivetrain')
+        part('Pinion', 'part', 'Gearbox')
+        part('Spare Bolt', 'part')
+        db.session.commit()
+        return project
+
+    @pytest.mark.api
+    def test_full_tree_unchanged_without_depth(self, client, deep_project, assert_max_queries):
+        url = f'/api/projects/{deep_project.id}/tree'
+        with assert_max_queries(5):
+            data = client.get(url, headers=self.headers).get_json()
+        robot = data['children'][0]
+        assert [c['name'] for c in data['children']] == ['Robot', 'Spare Bolt']
+        assert [c['name'] for c in robot['children']] == ['Arm', 'Drivetrain']
+        assert 'child_count' not in robot['attributes']
+        gearbox = robot['children'][1]['children'][0]
+        assert gearbox['children'][0]['name'] == 'Pinion'
+
+    @pytest.mark.api
+    def test_depth_limits_levels_and_adds_child_counts(self, client, deep_project):
+        data = client.get(f'/api/projects/{deep_project.id}/tree?depth=2', headers=self.headers).get_json()
+        robot = data['children'][0]
+        assert robot['attributes']['child_count'] == 2
+        drivetrain = robot['children'][1]
+        assert drivetrain['attributes']['child_count'] == 2
+        assert 'children' not in drivetrain
+        assert data['children'][1]['attributes']['child_count'] == 0
+
+        assert client.get(f'/api/projects/{deep_project.id}/tree?depth=0', headers=self.headers).status_code == 400
+
+    @pytest.mark.api
+    def test_subtree_expands_one_branch(self, client, deep_project):
+        drivetrain = self.ids['Drivetrain']
+        data = client.get(f'/api/parts/{drivetrain}/subtree', headers=self.headers).get_json()
+        assert data['name'] == 'Drivetrain'
+        assert [(c['name'], c['attributes']['child_count']) for c in data['children']] == [('Gearbox', 1), ('Wheel', 0)]
+        assert 'children' not in data['children'][0]
+
+        data = client.get(f'/api/parts/{drivetrain}/subtree?depth=0', headers=self.headers).get_json()
+        assert data['attributes']['child_count'] == 2 and 'children' not in data
+        assert client.get('/api/parts/9999/subtree', headers=self.headers).status_code == 404
+
+
+class TestProjectClone:
+
+    @pytest.fixture
+    def season(self, app, login_headers, monkeypatch):
+        # Small chunks so the streaming insert and the remap run several batches
+        monkeypatch.setattr('app.services.clone_service.PROJECT_CLONE_CHUNK_SIZE', 2)
+        self.headers = login_headers('editor')
+        process = PostProcess(name='Powder Coat')
+        project = Project(name='Robot 2025', prefix='BP25', description='Last season')
+        db.session.add_all([project, process])
+        db.session.flush()
+
+        def part(number, name, type_, parent=None, subteam=None, **fields):
+            p = Part(numeric_id=number, part_number=f"BP25-{'A' if type_ == 'assembly' else 'P'}-{number:04d}",
+                     name=name, type=type_, quantity=3, project_id=project.id, status='Done',
+                     parent_id=parent.id if parent else None, subteam_id=subteam.id if subteam else None, **fields)
+            db.session.add(p)
+            db.session.flush()
+            return p
+
+        robot = part(0, 'Robot', 'assembly')
+        drive = part(100, 'Drivetrain', 'assembly', robot)
+        gearbox = part(200, 'Gearbox', 'assembly', drive, subteam=drive)
+        plate = part(101, 'Plate', 'part', drive, subteam=drive, quantity_on_hand=5, have_material=True)
+        part(201, 'Pinion', 'part', gearbox, subteam=drive)
+        plate.post_processes.append(process)
+        db.session.commit()
+        self.process_id = process.id
+        return project
+
+    def _parts(self, project_id):
+        db.session.expire_all()
+        return {p.numeric_id: p for p in Part.query.filter_by(project_id=project_id)}
+
+    @pytest.mark.api
+    def test_clone_preserves_hierarchy_under_new_prefix(self, client, season):
+        response = client.post(f'/api/projects/{season.id}/clone', headers=self.headers,
+                               json={'name': 'Robot 2026', 'prefix': 'BP26'})
+        assert response.status_code == 201
+        data = response.get_json()
+        assert data['part_count'] == 5 and data['project']['description'] == 'Last season'
+
+        old, new = self._parts(season.id), self._parts(data['project']['id'])
+        assert sorted(p.part_number for p in new.values()) == [
+            'BP26-A-0000', 'BP26-A-0100', 'BP26-A-0200', 'BP26-P-0101', 'BP26-P-0201']
+        for number, copy in new.items():
+            source = old[number]
+            assert copy.id != source.id
+            assert (copy.parent.numeric_id if copy.parent else None) == (source.parent.numeric_id if source.parent else None)
+            assert copy.subteam_id == (new[100].id if source.subteam_id else None)
+            assert (copy.status, copy.quantity) == ('Done', 3)
+        assert [pp.id for pp in new[101].post_processes] == [self.process_id]
+        assert new[101].quantity_on_hand == 5
+        assert check_rollups(data['project']['id']) == []
+
+    @pytest.mark.api
+    def test_clone_can_reset_status_and_quantities(self, client, season):
+        response = client.post(f'/api/projects/{season.id}/clone', headers=self.headers,
+                               json={'name': 'Robot 2026', 'prefix': 'BP26', 'reset_status': True,
+                                     'reset_quantities': True})
+        assert response.status_code == 201
+        new = self._parts(response.get_json()['project']['id'])
+        assert {p.status for p in new.values()} == {'In Design'}
+        assert (new[101].quantity_on_hand, new[101].have_material, new[101].quantity) == (0, False, 3)
+        assert self._parts(season.id)[101].status == 'Done'
+
+    @pytest.mark.api
+    def test_clone_validates_prefix(self, client, season):
+        url = f'/api/projects/{season.id}/clone'
+        assert client.post(url, headers=self.headers, json={'name': 'Copy', 'prefix': 'BP25'}).status_code == 409
+        assert client.post(url, headers=self.headers, json={'name': 'Copy'}).status_code == 400
+        assert client.post('/api/projects/9999/clone', headers=self.headers,
+                           json={'name': 'Copy', 'prefix': 'X'}).status_code == 404
+
+
+class TestProjectDelete:
+
+    @pytest.fixture
+    def archived(self, app, login_headers, monkeypatch):
+        monkeypatch.setattr('app.services.deletion_service.PROJECT_DELETE_CHUNK_SIZE', 2)
+        self.headers = login_headers('admin')
+        process = PostProcess(name='Tumble')
+        old, keep = Project(name='Robot 2019', prefix='BP19'), Project(name='Robot 2026', prefix='BP26')
+        db.session.add_all([old, keep, process])
+        db.session.flush()
+
+        def part(project, number, type_, parent=None):
+            p = Part(numeric_id=number, part_number=f'{project.prefix}-{number:04d}', name=f'Part {number}',
+                     type=type_, quantity=1, project_id=project.id, parent_id=parent.id if parent else None,
+                     subteam_id=parent.id if parent else None)
+            db.session.add(p)
+            db.session.flush()
+            return p
+
+        robot = part(old, 0, 'assembly')
+        drive = part(old, 100, 'assembly', robot)
+        old_parts = [part(old, 101 + i, 'part', drive) for i in range(5)]
+        old_parts[0].post_processes.append(process)
+        kept = part(keep, 1, 'part', part(keep, 0, 'assembly'))
+
+        own = Order(order_number='BP19-1', project_id=old.id, total_amount=Decimal('20.00'),
+                    items=[OrderItem(part_id=p.id, quantity=1, unit_price=Decimal('4.00')) for p in old_parts])
+        shared = Order(order_number='SHARED-1', project_id=keep.id, total_amount=Decimal('7.50'),
+                       items=[OrderItem(part_id=old_parts[1].id, quantity=2, unit_price=Decimal('2.50')),
+                              OrderItem(part_id=kept.id, quantity=1, unit_price=Decimal('2.50'))])
+        db.session.add_all([own, shared])
+        db.session.commit()
+        rebuild_rollups()
+        self.keep_id, self.shared_id = keep.id, shared.id
+        return old.id
+
+    @pytest.mark.api
+    def test_delete_removes_everything_in_chunks(self, client, archived):
+        response = client.delete(f'/api/projects/{archived}', headers=self.headers)
+        assert response.status_code == 200
+        deleted = response.get_json()['deleted']
+        assert (deleted['parts'], deleted['orders'], deleted['order_items'], deleted['shared_order_items']) == (7, 1, 5, 1)
+        assert deleted['post_process_links'] == 1
+
+        db.session.expire_all()
+        assert db.session.get(Project, archived) is None
+        assert Part.query.filter_by(project_id=archived).count() == 0
+        assert Part.query.filter_by(project_id=self.keep_id).count() == 2
+        shared = db.session.get(Order, self.shared_id)
+        assert [item.unit_price for item in shared.items] == [Decimal('2.50')]
+        assert shared.total_amount == Decimal('2.50')
+        assert check_rollups() == []
+
+    @pytest.mark.api
+    def test_delete_reports_progress(self, archived):
+        from app.services.deletion_service import delete_project
+        steps = []
+        delete_project(archived, progress=lambda step, deleted: steps.append((step, deleted)))
+        assert ('parts', 2) in steps and ('parts', 7) in steps
+        assert [step for step, _ in steps].index('order_items') < [step for step, _ in steps].index('parts')
+        with pytest.raises(ValueError):
+            delete_project(archived)
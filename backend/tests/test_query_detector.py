@@ -0,0 +1,99 @@
+import pytest
+from decimal import Decimal
+from app.models import Order, OrderItem, Part, Project, db
+from app.query_detector import NPlusOneError, fingerprint, init_query_detector
+
+
+@pytest.fixture
+def order_with_items(app):
+    project = Project(name='Query Project', prefix='QP')
+    db.session.add(project)
+    db.session.commit()
+    parts = [Part(name=f'Bracket {i}', part_number=f'QP-P-{i:04d}', numeric_id=i, type='part',
+                  project_id=project.id, quantity=1, status='In Design') for i in range(20)]
+    db.session.add_all(parts)
+    db.session.commit()
+    order = Order(order_number='QP-ORDER-1', project_id=project.id, status='Pending',
+                  total_amount=Decimal('0.00'))
+    order.items = [OrderItem(part_id=part.id, quantity=2, unit_price=Decimal('1.50')) for part in parts]
+    db.session.add(order)
+    db.session.commit()
+    order_id = order.id
+    db.session.expunge_all()
+    return order_id
+
+
+@pytest.fixture
+def nested_project(app):
+    project = Project(name='Nested Project', prefix='NP')
+    db.session.add(project)
+    db.session.commit()
+    assemblies = [Part(name=f'Assembly {i}', part_number=f'NP-A-{i:04d}', numeric_id=i * 100, type='assembly',
+                       project_id=project.id, quantity=1, status='In Design') for i in range(1, 11)]
+    db.session.add_all(assemblies)
+    db.session.commit()
+    db.session.add_all([
+        Part(name=f'Plate {a.id}', part_number=f'NP-P-{a.numeric_id + 1:04d}', numeric_id=a.numeric_id + 1,
+             type='part', project_id=project.id, parent_id=a.id, quantity=1, status='In Design')
+        for a in assemblies
+    ])
+    db.session.commit()
+    project_id = project.id
+    db.session.expunge_all()
+    return project_id
+
+
+class TestQueryDetector:
+
+    @pytest.mark.unit
+    def test_fingerprint_ignores_values(self):
+        a = fingerprint("SELECT * FROM parts WHERE parts.id = ? AND name = 'x'")
+        b = fingerprint("SELECT *   FROM parts\nWHERE parts.id = 42 AND name = 'it''s'")
+        assert a == b == 'SELECT * FROM parts WHERE parts.id = ? AND name = ?'
+        assert fingerprint('SELECT id FROM parts WHERE id IN (?, ?, ?)') == \
+            fingerprint('SELECT id FROM parts WHERE id IN (?)')
+        assert fingerprint('SELECT parts_1.id FROM parts AS parts_1') == 'SELECT parts_1.id FROM parts AS parts_1'
+
+    @pytest.mark.api
+    def test_get_order_loads_items_and_parts_in_bulk(self, client, login_headers, order_with_items, assert_max_queries):
+        headers = login_headers('readonly')
+        with assert_max_queries(6, max_repeats=1):
+            response = client.get(f'/api/orders/{order_with_items}', headers=headers)
+
+        assert response.status_code == 200
+        items = response.get_json()['order']['items']
+        assert len(items) == 20
+        assert items[0]['part_number'].startswith('QP-P-')
+
+    @pytest.mark.api
+    def test_project_parts_parent_numbers_in_one_query(self, client, login_headers, nested_project,
+                                                       assert_max_queries):
+        headers = login_headers('readonly')
+        with assert_max_queries(10, max_repeats=1):
+            response = client.get(f'/api/projects/{nested_project}/parts', headers=headers)
+
+        parts = response.get_json()['parts']
+        children = [p for p in parts if p['parent_id']]
+        assert len(children) == 10
+        assert all(p['parent_part_number'].startswith('NP-A-') for p in children)
+
+    @pytest.mark.api
+    def test_assert_max_queries_fails_when_exceeded(self, app, assert_max_queries):
+        with pytest.raises(AssertionError, match='Expected at most 1 queries'):
+            with assert_max_queries(1):
+                for _ in range(3):
+                    db.session.execute(db.select(Part.id)).all()
+
+    @pytest.mark.api
+    def test_request_hook_raises_on_repeated_shape(self, app):
+        app.config.update(NPLUSONE_ENABLED=True, NPLUSONE_THRESHOLD=2, NPLUSONE_RAISE=True)
+        init_query_detector(app)
+
+        @app.route('/api/_test/n_plus_one')
+        def _n_plus_one():
+            for part_id in range(5):
+                db.session.get(Part, part_id)
+            return 'ok'
+
+        with pytest.raises(NPlusOneError, match='5 x SELECT'):
+            app.test_client().get('/api/_test/n_plus_one')
@@ -0,0 +1,107 @@
+import pytest
+from unittest.mock import patch
+from app.models import User
+from app.rate_limit import MemoryBackend, SQLBackend, parse_limit
+
+
+class TestRateLimitBackends:
+
+    @pytest.mark.unit
+    def test_parse_limit(self):
+        assert parse_limit('10/60') == (10.0, 10.0 / 60)
+        with pytest.raises(ValueError):
+            parse_limit('0/60')
+
+    @pytest.mark.unit
+    @pytest.mark.parametrize('backend_name', ['memory', 'sql'])
+    def test_bucket_refills_over_time(self, app, backend_name):
+        from app import db
+        backend = MemoryBackend() if backend_name == 'memory' else SQLBackend(db.engine)
+        capacity, rate = parse_limit('3/30')  # one token every 10 seconds
+
+        assert [backend.consume('k', capacity, rate, now=1000)[0] for _ in range(3)] == [True, True, True]
+        allowed, retry_after = backend.consume('k', capacity, rate, now=1000)
+        assert not allowed
+        assert retry_after == 10
+        assert backend.consume('k', capacity, rate, now=1010)[0]
+        assert not backend.consume('k', capacity, rate, now=1010)[0]
+        assert backend.consume('other', capacity, rate, now=1010)[0]
+
+    @pytest.mark.unit
+    def test_sql_backend_keeps_sub_second_precision_at_real_epoch(self, app):
+        from app import db
+        from sqlalchemy.dialects import mysql
+        from app.models import RateLimitBucket
+        columns = RateLimitBucket.__table__.c
+        assert [str(column.type.compile(dialect=mysql.dialect())) for column in (columns.tokens, columns.updated_at)] \
+            == ['DOUBLE', 'DOUBLE']
+
+        backend = SQLBackend(db.engine)
+        capacity, rate = parse_limit('2/1')  # one token every half second
+        now = 1760000000.25
+        assert [backend.consume('k', capacity, rate, now=now)[0] for _ in range(3)] == [True, True, False]
+        assert not backend.consume('k', capacity, rate, now=now + 0.25)[0]
+        assert backend.consume('k', capacity, rate, now=now + 0.5)[0]
+        assert not backend.consume('k', capacity, rate, now=now + 0.5)[0]
+
+    @pytest.mark.unit
+    def test_memory_backend_bounded(self):
+        backend = MemoryBackend(max_buckets=10)
+        for i in range(25):
+            backend.consume(f'ip:{i}', 5, 1, now=i)
+        assert len(backend._buckets) <= 10
+
+
+class TestRateLimitedEndpoints:
+
+    @pytest.mark.auth
+    def test_login_per_email_limit_rejects_before_hashing(self, app, client, admin_user):
+        app.config['RATE_LIMIT_LOGIN_PER_EMAIL'] = '3/60'
+        payload = {'email': 'admin@test.com', 'password': 'wrong'}
+        for _ in range(3):
+            assert client.post('/api/login', json=payload).status_code == 401
+
+        with patch.object(User, 'check_password') as check_password:
+            response = client.post('/api/login', json=payload)
+        assert response.status_code == 429
+        assert int(response.headers['Retry-After']) >= 1
+        check_password.assert_not_called()
+
+        # The email bucket is case-insensitive
+        assert client.post('/api/login', json={'email': 'ADMIN@test.com', 'password': 'x'}).status_code == 429
+
+    @pytest.mark.auth
+    def test_login_per_ip_limit(self, app, client):
+        app.config['RATE_LIMIT_LOGIN_PER_IP'] = '2/60'
+        for i in range(2):
+            client.post('/api/login', json={'email': f'nobody{i}@test.com', 'password': 'x'})
+        response = client.post('/api/login', json={'email': 'nobody9@test.com', 'password': 'x'})
+        assert response.status_code == 429
+
+        other_ip = client.post('/api/login', json={'email': 'nobody9@test.com', 'password': 'x'},
+                               environ_base={'REMOTE_ADDR': '10.0.0.2'})
+        assert other_ip.status_code == 401
+
+    @pytest.mark.auth
+    def test_forwarded_for_used_with_trusted_proxy(self, app, client):
+        app.config.update(RATE_LIMIT_LOGIN_PER_IP='1/60', RATE_LIMIT_TRUSTED_PROXIES=1)
+        first = {'X-Forwarded-For': '203.0.113.7'}
+        client.post('/api/login', json={'email': 'a@test.com', 'password': 'x'}, headers=first)
+        assert client.post('/api/login', json={'email': 'b@test.com', 'password': 'x'},
+                           headers=first).status_code == 429
+        assert client.post('/api/login', json={'email': 'c@test.com', 'password': 'x'},
+                           headers={'X-Forwarded-For': '203.0.113.8'}).status_code == 401
+
+    @pytest.mark.auth
+    def test_register_limited(self, app, client):
+        app.config['RATE_LIMIT_REGISTER_PER_IP'] = '1/600'
+        payload = {'username': 'new', 'email': 'new@test.com', 'password': 'password123',
+                   'first_name': 'New', 'last_name': 'User'}
+        assert client.post('/api/register', json=payload).status_code == 201
+        assert client.post('/api/register', json=dict(payload, username='new2', email='new2@test.com')).status_code == 429
+
+    @pytest.mark.auth
+    def test_disabled(self, app, client):
+        app.config.update(RATE_LIMIT_ENABLED=False, RATE_LIMIT_LOGIN_PER_IP='1/60')
+        for _ in range(3):
+            assert client.post('/api/login', json={'email': 'x@test.com', 'password': 'x'}).status_code == 401
@@ -0,0 +1,103 @@
+import pytest
+from app.models import AssemblyRollup, AssemblyStatusRollup, Machine, Part, PostProcess, Project, db
+from app.rollups import check_rollups, rebuild_rollups
+
+
+class TestAssemblyRollups:
+
+    @pytest.fixture(autouse=True)
+    def no_airtable(self, monkeypatch):
+        # Part creation syncs to Airtable; keep these tests off the network
+        monkeypatch.setattr('app.routes.sync_part_to_airtable', lambda part: None)
+        monkeypatch.setattr('app.routes.add_option_to_airtable_subsystem_field', lambda name: True)
+
+    @pytest.fixture
+    def robot(self, app, client, login_headers):
+        self.client = client
+        self.headers = login_headers('admin')
+        project = Project(name='Rollup Robot', prefix='RR')
+        machine, process = Machine(name='Router'), PostProcess(name='Deburr')
+        db.session.add_all([project, machine, process])
+        db.session.commit()
+        self.project_id, self.machine_id, self.process_id = project.id, machine.id, process.id
+
+        self.top = self._create('Robot', 'assembly')
+        self.drive = self._create('Drivetrain', 'assembly', self.top)
+        self.intake = self._create('Intake', 'assembly', self.top)
+        self.plate = self._create('Side Plate', 'part', self.drive)
+        self.axle = self._create('Axle', 'part', self.drive)
+        self.roller = self._create('Roller', 'part', self.intake)
+        return project
+
+    def _create(self, name, part_type, parent_id=None):
+        payload = {'name': name, 'type': part_type, 'project_id': self.project_id, 'parent_id': parent_id}
+        if part_type == 'part':
+            payload.update(quantity=1, machine_id=self.machine_id, raw_material='6061',
+                           post_process_ids=[self.process_id])
+        response = self.client.post('/api/parts', headers=self.headers, json=payload)
+        assert response.status_code == 201, response.get_json()
+        return response.get_json()['part']['id']
+
+    def _rollup(self, assembly_id):
+        response = self.client.get(f'/api/parts/{assembly_id}/rollup', headers=self.headers)
+        assert response.status_code == 200
+        return response.get_json()['rollup']
+
+    @pytest.mark.api
+    def test_create_counts_up_the_ancestor_path(self, robot):
+        assert self._rollup(self.top)['part_count'] == 3
+        assert self._rollup(self.top)['by_status'] == {'In Design': 3}
+        assert self._rollup(self.drive)['part_count'] == 2
+        assert self._rollup(self.intake)['part_count'] == 1
+        assert check_rollups() == []
+
+    @pytest.mark.api
+    def test_field_changes_apply_deltas(self, robot):
+        response = self.client.put(f'/api/parts/{self.plate}', headers=self.headers,
+                                   json={'status': 'Done', 'have_material': True, 'drawing_created': True})
+        assert response.status_code == 200
+        top = self._rollup(self.top)
+        assert top['by_status'] == {'Done': 1, 'In Design': 2}
+        assert (top['have_material_count'], top['drawing_created_count']) == (1, 1)
+        assert self._rollup(self.intake)['have_material_count'] == 0
+        assert check_rollups() == []
+
+    @pytest.mark.api
+    def test_reparent_moves_the_subtree_counts(self, robot):
+        # Move the whole drivetrain under the intake
+        response = self.client.put(f'/api/parts/{self.drive}', headers=self.headers, json={'parent_id': self.intake})
+        assert response.status_code == 200
+        assert self._rollup(self.intake)['part_count'] == 3
+        assert self._rollup(self.top)['part_count'] == 3
+
+        self.client.put(f'/api/parts/{self.roller}', headers=self.headers, json={'parent_id': self.drive})
+        assert self._rollup(self.drive)['part_count'] == 3
+        assert check_rollups() == []
+
+    @pytest.mark.api
+    def test_delete_counts_down(self, robot):
+        assert self.client.delete(f'/api/parts/{self.roller}', headers=self.headers).status_code == 200
+        assert self.client.delete(f'/api/parts/{self.intake}', headers=self.headers).status_code == 200
+        assert self._rollup(self.top)['part_count'] == 2
+        assert self._rollup(self.top)['by_status'] == {'In Design': 2}
+        assert db.session.get(AssemblyRollup, self.intake) is None
+        assert check_rollups() == []
+
+    @pytest.mark.api
+    def test_check_and_rebuild(self, robot):
+        db.session.execute(db.update(AssemblyRollup).where(AssemblyRollup.assembly_id == self.drive)
+                           .values(part_count=40))
+        db.session.execute(db.delete(AssemblyStatusRollup).where(AssemblyStatusRollup.assembly_id == self.top))
+        db.session.commit()
+        problems = check_rollups(self.project_id)
+        assert (self.drive, 'part_count', 40, 2) in problems
+        assert (self.top, 'status:In Design', 0, 3) in problems
+
+        assert rebuild_rollups(self.project_id) == 3
+        assert check_rollups() == []
+        assert self._rollup(self.drive)['part_count'] == 2
+
+    @pytest.mark.api
+    def test_rollup_only_for_assemblies(self, robot):
+        response = self.client.get(f'/api/parts/{self.plate}/rollup', headers=self.headers)
+        assert response.status_code == 400
@@ -478,4 +478,230 @@ class TestRegistrationLinkRoutes:
             elif method == 'DELETE':
                 response = client.delete(endpoint)
             
-            assert response.status_code == 401
\ No newline at end of file
+            assert response.status_code == 401
+
+class TestRegistrationLinkClaims:
+
+    @pytest.fixture
+    def team_link(self, app, login_headers):
+        # Cheap hashes keep dozens of parallel registrations fast
+        app.config.update(PASSWORD_HASH_METHOD='pbkdf2:sha256:1000', RATE_LIMIT_ENABLED=False)
+        self.admin_headers = login_headers('admin')
+        link = RegistrationLink(custom_path='team-link', max_uses=10, default_permission='readonly',
+                                created_by_user_id=User.query.filter_by(username='admin_0').one().id)
+        db.session.add(link)
+        db.session.commit()
+        return link
+
+    @pytest.mark.unit
+    def test_find_by_identifier(self, team_link):
+        assert RegistrationLink.find_by_identifier('team-link').id == team_link.id
+        assert RegistrationLink.find_by_identifier(team_link.token).id == team_link.id
+        assert RegistrationLink.find_by_identifier('missing') is None
+
+    @pytest.mark.unit
+    def test_claim_use_deactivates_on_last_use(self, team_link):
+        team_link.max_uses = 2
+        db.session.commit()
+
+        assert RegistrationLink.claim_use(team_link.id)
+        assert RegistrationLink.claim_use(team_link.id)
+        assert not RegistrationLink.claim_use(team_link.id)
+        db.session.commit()
+        db.session.refresh(team_link)
+        assert team_link.current_uses == 2
+        assert team_link.is_active is False
+
+    @pytest.mark.unit
+    def test_unlimited_link_stays_active(self, team_link):
+        team_link.max_uses = -1
+        db.session.commit()
+
+        for _ in range(3):
+            assert RegistrationLink.claim_use(team_link.id)
+        db.session.commit()
+        db.session.refresh(team_link)
+        assert team_link.current_uses == 3
+        assert team_link.is_active is True
+
+    @pytest.mark.api
+    def test_parallel_registrations_never_over_admit(self, app, team_link):
+        from concurrent.futures import ThreadPoolExecutor
+
+        def register(i):
+            response = app.test_client().post('/api/register/team-link', json={
+                'username': f'member{i}', 'email': f'member{i}@test.com', 'password': 'password123'
+            })
+            return response.status_code
+
+        with ThreadPoolExecutor(max_workers=16) as pool:
+            statuses = list(pool.map(register, range(40)))
+
+        assert statuses.count(201) == 10
+        assert statuses.count(403) == 30
+        db.session.expire_all()
+        link = db.session.get(RegistrationLink, team_link.id)
+        assert link.current_uses == 10
+        assert link.is_active is False
+        assert User.query.filter_by(registered_via_link_id=link.id).count() == 10
+
+    @pytest.mark.api
+    def test_duplicate_username_releases_claim(self, client, team_link):
+        response = client.post('/api/register/team-link', json={
+            'username': 'admin_0', 'email': 'other@test.com', 'password': 'password123'
+        })
+        assert response.status_code == 409
+        db.session.refresh(team_link)
+        assert team_link.current_uses == 0
+
+    @pytest.mark.api
+    def test_admin_create_via_link_uses_fixed_details(self, client, team_link):
+        team_link.fixed_username = 'fixed_user'
+        team_link.fixed_email = 'fixed@test.com'
+        db.session.commit()
+
+        response = client.post('/api/admin/create_user_via_link', headers=self.admin_headers,
+                               json={'token': team_link.token, 'password': 'password123'})
+        assert response.status_code == 201
+        assert response.get_json()['user']['username'] == 'fixed_user'
+
+        response = client.post('/api/admin/create_user_via_link', headers=self.admin_headers,
+                               json={'token': 'missing', 'password': 'password123'})
+        assert response.status_code == 400
+
+
+class TestAdminListings:
+
+    @pytest.fixture
+    def many_users(self, app, login_headers):
+        self.admin_headers = login_headers('admin')
+        base = datetime(2026, 1, 1)
+        db.session.add_all([
+            User(username=f'member{i:02d}', email=f'member{i:02d}@team.org', first_name='Team', last_name=f'Player{i}',
+                 permission='editor' if i % 3 == 0 else 'readonly', enabled=i % 2 == 0, is_approved=i >= 5,
+                 requested_at=base + timedelta(hours=10 - i), password_hash='x')
+            for i in range(12)
+        ])
+        db.session.commit()
+
+    @pytest.mark.api
+    def test_unpaginated_by_default(self, client, many_users):
+        data = client.get('/api/users', headers=self.admin_headers).get_json()
+        assert len(data['users']) == 13
+        assert 'pagination' not in data
+
+    @pytest.mark.api
+    def test_pagination(self, client, many_users):
+        data = client.get('/api/users?page=2&per_page=5', headers=self.admin_headers).get_json()
+        assert [u['username'] for u in data['users']] == [f'member{i:02d}' for i in range(4, 9)]
+        assert data['pagination'] == {'page': 2, 'per_page': 5, 'total': 13, 'pages': 3}
+
+        assert client.get('/api/users?page=0', headers=self.admin_headers).status_code == 400
+
+    @pytest.mark.api
+    def test_filters_and_search(self, client, many_users):
+        data = client.get('/api/users?is_approved=true&enabled=false&permission=editor',
+                          headers=self.admin_headers).get_json()
+        assert [u['username'] for u in data['users']] == ['member09']
+
+        data = client.get('/api/users?q=member1', headers=self.admin_headers).get_json()
+        assert {u['username'] for u in data['users']} == {'member10', 'member11'}
+
+        # LIKE wildcards in the search are literal
+        assert client.get('/api/users?q=%25', headers=self.admin_headers).get_json()['users'] == []
+        assert client.get('/api/users?enabled=maybe', headers=self.admin_headers).status_code == 400
+
+    @pytest.mark.api
+    def test_pending_queue_oldest_first(self, client, many_users):
+        data = client.get('/api/users/pending', headers=self.admin_headers).get_json()
+        assert [u['username'] for u in data['users']] == ['member04', 'member03', 'member02', 'member01', 'member00']
+
+    @pytest.mark.api
+    def test_registration_links_eager_and_filtered(self, client, many_users, assert_max_queries):
+        admin = User.query.filter_by(username='admin_0').one()
+        db.session.add_all([
+            RegistrationLink(custom_path=f'link-{i}', created_by_user_id=admin.id, is_active=i % 2 == 0,
+                             expires_at=datetime.utcnow() - timedelta(days=1) if i == 0 else None)
+            for i in range(6)
+        ])
+        db.session.commit()
+        db.session.expunge_all()
+
+        with assert_max_queries(5, max_repeats=1):
+            data = client.get('/api/admin/registration-links?is_active=true&per_page=10',
+                              headers=self.admin_headers).get_json()
+        links = data['links']
+        assert sorted(link['custom_path'] for link in links) == ['link-0', 'link-2', 'link-4']
+        assert all(link['creator_username'] == 'admin_0' for link in links)
+        validity = {link['custom_path']: link['is_currently_valid'] for link in links}
+        assert validity == {'link-0': False, 'link-2': True, 'link-4': True}
+        assert data['pagination']['total'] == 3
+
+
+class TestCustomPaths:
+
+    @pytest.fixture
+    def admin_headers(self, login_headers):
+        return login_headers('admin')
+
+    def _create(self, client, headers, custom_path):
+        return client.post('/api/admin/registration-links', headers=headers, json={
+            'max_uses': 5, 'default_permission': 'readonly', 'custom_path': custom_path
+        })
+
+    @pytest.mark.unit
+    def test_validator_checks_format_without_querying(self, app, assert_max_queries):
+        with assert_max_queries(0):
+            link = RegistrationLink(custom_path='team_2026-a', created_by_user_id=1)
+        assert link.custom_path == 'team_2026-a'
+        for bad in ('has space_', 'semi;colon', 'slash/-'):
+            with pytest.raises(ValueError):
+                RegistrationLink(custom_path=bad, created_by_user_id=1)
+
+    @pytest.mark.api
+    def test_duplicate_custom_path_conflicts(self, client, admin_headers):
+        assert self._create(client, admin_headers, 'robotics').status_code == 201
+        response = self._create(client, admin_headers, 'robotics')
+        assert response.status_code == 409
+        assert 'already in use' in response.get_json()['message']
+
+    @pytest.mark.api
+    def test_insert_conflict_caught_after_precheck(self, app, client, admin_headers, monkeypatch):
+        assert self._create(client, admin_headers, 'robotics').status_code == 201
+        # Another request inserts the same path between the check and the insert
+        monkeypatch.setattr(RegistrationLink, 'custom_path_taken', classmethod(lambda cls, *args, **kwargs: False))
+
+        response = self._create(client, admin_headers, 'robotics')
+        assert response.status_code == 409
+
+    @pytest.mark.api
+    def test_public_resolution_is_one_query(self, client, admin_headers, assert_max_queries):
+        self._create(client, admin_headers, 'robotics')
+        db.session.expunge_all()
+
+        with assert_max_queries(1):
+            response = client.get('/api/register/robotics')
+        assert response.status_code == 200
+        assert response.get_json()['custom_path'] == 'robotics'
+
+    @pytest.mark.api
+    def test_token_match_wins_over_custom_path(self, client, admin_headers):
+        token_link_id = self._create(client, admin_headers, 'robotics').get_json()['link']['id']
+        token = db.session.get(RegistrationLink, token_link_id).token
+        self._create(client, admin_headers, token)
+
+        response = client.get(f'/api/register/{token}')
+        assert response.status_code == 200
+        assert response.get_json()['custom_path'] == 'robotics'
+
+    @pytest.mark.api
+    def test_renamed_and_deleted_paths_resolve_correctly(self, client, admin_headers):
+        link_id = self._create(client, admin_headers, 'robotics').get_json()['link']['id']
+        client.get('/api/register/robotics')
+
+        client.put(f'/api/admin/registration-links/{link_id}', headers=admin_headers, json={'custom_path': 'rocketry'})
+        assert client.get('/api/register/robotics').status_code == 404
+        assert client.get('/api/register/rocketry').status_code == 200
+
+        client.delete(f'/api/admin/registration-links/{link_id}', headers=admin_headers)
+        assert client.get('/api/register/rocketry').status_code == 404